@@ -0,0 +1,139 @@
+#
+# genomicsdb bgzf utilities
+#
+# The MIT License
+#
+# Copyright (c) 2025 dātma, inc™
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+"""Concatenation and indexing of bgzipped VCF shards, e.g. from parallel to_vcf() exports of consecutive genomic
+ranges. The shards are concatenated block by block without recompressing, only the block in which the header of a
+shard ends is recompressed.
+"""
+
+import logging
+import shutil
+import struct
+import subprocess
+import zlib
+
+# Empty BGZF block marking the end of a BGZF file
+BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+BGZF_HEADER_SIZE = 18
+BGZF_MAX_BLOCK_SIZE = 65536
+
+
+class BGZFError(Exception):
+    pass
+
+
+def read_blocks(f):
+    """Yields the raw BGZF blocks from the file object f"""
+    while True:
+        header = f.read(BGZF_HEADER_SIZE)
+        if not header:
+            return
+        if len(header) < BGZF_HEADER_SIZE or header[:4] != b"\x1f\x8b\x08\x04" or header[12:14] != b"BC":
+            raise BGZFError(f"Not a BGZF block at offset {f.tell() - len(header)}")
+        block_size = struct.unpack("<H", header[16:18])[0] + 1
+        remaining = f.read(block_size - BGZF_HEADER_SIZE)
+        if len(remaining) < block_size - BGZF_HEADER_SIZE:
+            raise BGZFError("Truncated BGZF block")
+        yield header + remaining
+
+
+def block_data_size(block):
+    return struct.unpack("<I", block[-4:])[0]
+
+
+def decompress_block(block):
+    return zlib.decompress(block[BGZF_HEADER_SIZE:-8], wbits=-15)
+
+
+def compress_block(data, level=6):
+    """Compresses data, at most BGZF_MAX_BLOCK_SIZE bytes, into a BGZF block"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    block_size = BGZF_HEADER_SIZE + len(compressed) + 8
+    header = b"\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00" + struct.pack("<H", block_size - 1)
+    return header + compressed + struct.pack("<II", zlib.crc32(data), len(data))
+
+
+def _header_end(data, at_line_start):
+    """Offset in data where the VCF header ends or None if it continues past data, along with whether data ends at the
+    start of a line"""
+    pos = 0
+    while pos < len(data):
+        if at_line_start and data[pos : pos + 1] != b"#":
+            return pos, True
+        newline = data.find(b"\n", pos)
+        if newline < 0:
+            return None, False
+        pos = newline + 1
+        at_line_start = True
+    return None, at_line_start
+
+
+def concatenate(inputs, output, level=6):
+    """Concatenates the bgzipped VCF files in inputs, in order, to output. The header is taken from the first input
+    and dropped from the others, which are expected to have the same header.
+    """
+    with open(output, "wb") as out:
+        for idx, input_file in enumerate(inputs):
+            with open(input_file, "rb") as f:
+                blocks = read_blocks(f)
+                if idx > 0:
+                    at_line_start = True
+                    for block in blocks:
+                        data = decompress_block(block)
+                        end, at_line_start = _header_end(data, at_line_start)
+                        if end is not None:
+                            if end < len(data):
+                                out.write(compress_block(data[end:], level))
+                            break
+                for block in blocks:
+                    # Skip the empty blocks, including the EOF markers of the inputs
+                    if block_data_size(block):
+                        out.write(block)
+        out.write(BGZF_EOF)
+
+
+def index(vcf_file, csi=False):
+    """Builds the tabix, or csi with csi=True, index for the bgzipped vcf_file with pysam if available or otherwise the
+    tabix or bcftools executables. Returns the path to the index or None if no indexer could be found.
+    """
+    suffix = ".csi" if csi else ".tbi"
+    try:
+        import pysam
+
+        pysam.tabix_index(vcf_file, preset="vcf", force=True, csi=csi)
+        return vcf_file + suffix
+    except ImportError:
+        pass
+    if shutil.which("tabix"):
+        command = ["tabix", "-f", "-p", "vcf"] + (["-C"] if csi else []) + [vcf_file]
+    elif shutil.which("bcftools"):
+        command = ["bcftools", "index", "-f", "--csi" if csi else "--tbi", vcf_file]
+    else:
+        logging.warning(f"Could not index {vcf_file}: neither pysam nor the tabix/bcftools executables are available")
+        return None
+    subprocess.run(command, check=True)
+    return vcf_file + suffix
@@ -0,0 +1,318 @@
+#
+# genomicsdb federated queries across workspaces
+#
+# The MIT License
+#
+# Copyright (c) 2025 dātma, inc™
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+"""Federated queries over several workspaces, e.g. a workspace per sequencing batch or cohort, each with its own
+callset, vid mapping and loader json, without importing them into a single workspace.
+
+The vid mappings are reconciled upfront. The attributes queried have to be defined with the same type and length in
+every workspace, and contigs found in more than one workspace have to be of the same length. The column offsets of the
+contigs are specific to a workspace, so every interval is translated to the columns and arrays of each workspace
+separately. The queries of the workspaces run in parallel and their arrow batches are merged into a single stream
+ordered by contig, position and sample.
+
+Samples found in more than one workspace are qualified by the name of their workspace, as <name>:<sample>, so that
+the samples in the merged stream are unique. All the samples are qualified with prefix_samples.
+"""
+
+import collections
+import json
+import logging
+import os
+import queue
+import threading
+from typing import Dict, List, NamedTuple
+
+import genomicsdb
+from genomicsdb import merge
+from genomicsdb.scripts import genomicsdb_common
+
+DEFAULT_ATTRIBUTES = ["REF", "GT"]
+# Attributes that are always available and not described by the fields of vid mappings
+IMPLICIT_ATTRIBUTES = ("REF", "ALT")
+# Sample column of the arrow outputs
+SAMPLE_COLUMN = "SAMPLE_NAME"
+
+
+class Workspace(NamedTuple):
+    name: str
+    workspace: str
+    callset_file: str
+    vidmap_file: str
+    loader_file: str
+    samples: Dict[str, int]
+    contigs: Dict[str, dict]
+    fields: Dict[str, tuple]
+    partitions: List[dict]
+
+
+class Query(NamedTuple):
+    interval: str
+    array: str
+    column_range: tuple
+    row_ranges: List[tuple]
+
+
+def _field_signature(field):
+    field_type = field.get("type")
+    if isinstance(field_type, list):
+        field_type = tuple(field_type)
+    return field_type, field.get("length", 1)
+
+
+def load_workspace(workspace, name=None, callset_file=None, vidmap_file=None, loader_file=None):
+    """Load the callset, vid mapping and loader json of a workspace, by default callset.json, vidmap.json and
+    loader.json in the workspace. The name, by default the basename of the workspace, qualifies its samples"""
+    workspace = genomicsdb_common.normalize_path(workspace)
+    if not name:
+        name = os.path.basename(workspace.rstrip("/"))
+    callset_file = callset_file or genomicsdb_common.join_paths(workspace, "callset.json")
+    vidmap_file = vidmap_file or genomicsdb_common.join_paths(workspace, "vidmap.json")
+    loader_file = loader_file or genomicsdb_common.join_paths(workspace, "loader.json")
+
+    callsets = json.loads(genomicsdb.read_entire_file(callset_file))["callsets"]
+    if isinstance(callsets, dict):  # Old style callset json
+        samples = {sample: callset["row_idx"] for sample, callset in callsets.items()}
+    else:
+        samples = {callset["sample_name"]: callset["row_idx"] for callset in callsets}
+    contigs, _ = genomicsdb_common.parse_vidmap_json(vidmap_file)
+    fields = json.loads(genomicsdb.read_entire_file(vidmap_file))["fields"]
+    if isinstance(fields, dict):  # Old style vidmap json
+        fields = [dict(field, name=field_name) for field_name, field in fields.items()]
+    fields = {field["name"]: _field_signature(field) for field in fields}
+    partitions = json.loads(genomicsdb.read_entire_file(loader_file))["column_partitions"]
+    return Workspace(name, workspace, callset_file, vidmap_file, loader_file, samples, contigs, fields, partitions)
+
+
+def reconcile_fields(workspaces, attributes=None):
+    """Returns the attributes to query, by default REF and GT, after checking that they are defined the same way in
+    the vid mappings of all the workspaces"""
+    attributes = list(attributes) if attributes else list(DEFAULT_ATTRIBUTES)
+    for attribute in attributes:
+        if attribute in IMPLICIT_ATTRIBUTES:
+            continue
+        signatures = {}
+        for workspace in workspaces:
+            if attribute not in workspace.fields:
+                raise ValueError(
+                    f"Attribute({attribute}) not found in vid mapping({workspace.vidmap_file}) of workspace({workspace.name})"  # noqa
+                )
+            signatures.setdefault(workspace.fields[attribute], []).append(workspace.name)
+        if len(signatures) > 1:
+            definitions = ", ".join(f"{names}={signature}" for signature, names in signatures.items())
+            raise ValueError(f"Attribute({attribute}) is defined differently across workspaces: {definitions}")
+    return attributes
+
+
+def reconcile_contigs(workspaces):
+    """Returns the contigs of all the workspaces, in the order of their columns in the first workspace they are found
+    in, after checking that contigs found in more than one workspace are of the same length"""
+    contig_order = []
+    lengths = {}
+    for workspace in workspaces:
+        for contig, contig_elem in sorted(workspace.contigs.items(), key=lambda item: item[1]["tiledb_column_offset"]):
+            if contig not in lengths:
+                lengths[contig] = (contig_elem["length"], workspace.name)
+                contig_order.append(contig)
+            elif lengths[contig][0] != contig_elem["length"]:
+                raise ValueError(
+                    f"Contig({contig}) is of length {lengths[contig][0]} in workspace({lengths[contig][1]}) and of length {contig_elem['length']} in workspace({workspace.name})"  # noqa
+                )
+    return contig_order
+
+
+def sample_ids(workspaces, prefix_samples=False):
+    """Returns the globally unique ids of the samples of every workspace, keyed by the sample names"""
+    names = [workspace.name for workspace in workspaces]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Workspace names{names} have to be unique")
+    counts = collections.Counter(sample for workspace in workspaces for sample in workspace.samples)
+    ids = [
+        {
+            sample: f"{workspace.name}:{sample}" if prefix_samples or counts[sample] > 1 else sample
+            for sample in workspace.samples
+        }
+        for workspace in workspaces
+    ]
+    counts = collections.Counter(sample_id for workspace_ids in ids for sample_id in workspace_ids.values())
+    duplicates = [sample_id for sample_id, count in counts.items() if count > 1]
+    if duplicates:
+        raise ValueError(f"Sample ids{duplicates[:10]} are not unique across workspaces, try prefix_samples")
+    return ids
+
+
+def _row_ranges(rows):
+    row_ranges = []
+    for row in sorted(rows):
+        if row_ranges and row == row_ranges[-1][1] + 1:
+            row_ranges[-1] = (row_ranges[-1][0], row)
+        else:
+            row_ranges.append((row, row))
+    return row_ranges
+
+
+def plan(workspaces, intervals=None, samples=None, prefix_samples=False):
+    """Returns the queries for each of the workspaces, ordered by contig and position. Intervals are in the
+    <CONTIG>:<START>-<END> format with START and END optional, by default all the contigs. Samples are sample ids or
+    sample names, the latter selecting the sample in every workspace it is found in, by default all the samples"""
+    contig_key = merge.contig_key_fn(reconcile_contigs(workspaces))
+    if not intervals:
+        intervals = reconcile_contigs(workspaces)
+
+    def interval_key(interval):
+        contig, start, _ = genomicsdb_common.parse_interval(interval)
+        return contig_key(contig), start
+
+    intervals = sorted(intervals, key=interval_key)
+    queries = []
+    for workspace, ids in zip(workspaces, sample_ids(workspaces, prefix_samples)):
+        if samples is None:
+            row_ranges = None
+        else:
+            selected = set(samples)
+            rows = [row for sample, row in workspace.samples.items() if sample in selected or ids[sample] in selected]
+            if not rows:
+                queries.append([])
+                continue
+            row_ranges = _row_ranges(rows)
+        workspace_queries = []
+        for interval in intervals:
+            contig, start, end = genomicsdb_common.parse_interval(interval)
+            if contig not in workspace.contigs:
+                continue
+            offset = workspace.contigs[contig]["tiledb_column_offset"]
+            length = workspace.contigs[contig]["length"]
+            if not end or end > length:
+                end = length
+            column_range = (offset + start - 1, offset + end - 1)
+            _, _, _, arrays = genomicsdb_common.get_arrays(interval, workspace.contigs, workspace.partitions)
+            workspace_queries += [Query(interval, array, column_range, row_ranges) for array in arrays]
+        # The arrays of a workspace are checked once and concurrently
+        arrays = list(dict.fromkeys(query.array for query in workspace_queries))
+        existing = dict(zip(arrays, genomicsdb.arrays_exist(workspace.workspace, arrays)))
+        for query in workspace_queries:
+            if not existing[query.array]:
+                logging.warning(
+                    f"Array({query.array}) for interval({query.interval}) not found in workspace({workspace.name})"
+                )
+        queries.append([query for query in workspace_queries if existing[query.array]])
+    return queries
+
+
+def _workspace_batches(workspace, queries, attributes, ids, batch_bytes):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    gdb = genomicsdb.connect(workspace.workspace, workspace.callset_file, workspace.vidmap_file, attributes)
+    names = pa.array(list(ids.keys()), type=pa.string())
+    qualified = pa.array(list(ids.values()), type=pa.string())
+    renamed = any(sample != sample_id for sample, sample_id in ids.items())
+    for query in queries:
+        logging.info(f"Querying workspace({workspace.name}) array({query.array}) for interval({query.interval})")
+        for output in gdb.query_variant_calls(
+            query.array,
+            [query.column_range],
+            query.row_ranges,
+            arrow_output=True,
+            batching=True,
+            batch_bytes=batch_bytes,
+        ):
+            for batch in pa.ipc.open_stream(output):
+                table = pa.Table.from_batches([batch])
+                if renamed and SAMPLE_COLUMN in table.column_names:
+                    column = table[SAMPLE_COLUMN]
+                    indices = pc.index_in(column, value_set=names)
+                    column = pc.if_else(pc.is_null(indices), column, pc.take(qualified, indices))
+                    table = table.set_column(table.schema.get_field_index(SAMPLE_COLUMN), SAMPLE_COLUMN, column)
+                yield table
+
+
+class _Prefetcher:
+    """Iterator over the items of a generator run by a separate thread, buffering at most depth items ahead of the
+    consumer, so that the queries of the workspaces run in parallel"""
+
+    _DONE = object()
+
+    def __init__(self, items, depth):
+        self._queue = queue.Queue(depth)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._produce, args=(items,), daemon=True)
+        self._thread.start()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _produce(self, items):
+        try:
+            for item in items:
+                if not self._put(item):
+                    return
+            self._put(self._DONE)
+        except Exception as e:
+            self._put(e)
+        finally:
+            items.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        item = self._queue.get()
+        if item is self._DONE:
+            raise StopIteration
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def query(workspaces, intervals=None, attributes=None, samples=None, prefix_samples=False, batch_bytes=None, depth=2):
+    """Generator for the calls of a federated query over workspaces, as loaded by load_workspace, yielding arrow tables
+    ordered by contig, position and sample id. The queries of the workspaces run in parallel with at most depth arrow
+    batches, of approximately batch_bytes bytes if specified, buffered per workspace. See plan() for intervals and
+    samples."""
+    attributes = reconcile_fields(workspaces, attributes)
+    contig_order = reconcile_contigs(workspaces)
+    ids = sample_ids(workspaces, prefix_samples)
+    queries = plan(workspaces, intervals, samples, prefix_samples)
+    streams = [
+        _Prefetcher(_workspace_batches(workspace, workspace_queries, attributes, workspace_ids, batch_bytes), depth)
+        for workspace, workspace_queries, workspace_ids in zip(workspaces, queries, ids)
+        if workspace_queries
+    ]
+    try:
+        yield from merge.merge_batches(streams, contig_order)
+    finally:
+        for stream in streams:
+            stream.close()
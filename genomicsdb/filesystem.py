@@ -0,0 +1,202 @@
+#
+# genomicsdb pyarrow filesystem
+#
+# The MIT License
+#
+# Copyright (c) 2025 dātma, inc™
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+"""Read-only pyarrow filesystem over the GenomicsDB storage layer.
+
+Files next to a workspace, local or on az://, s3:// and gs://, can be read with the credentials and the tuning of the
+GenomicsDB storage layer without separate cloud SDKs. The storage layer only exposes reads of entire objects for cloud
+URIs, so cloud files are fetched once on their first read and served from memory afterwards. Local files are read with
+positional reads of just the requested ranges. Writing and listing directories are not supported.
+
+Example
+-------
+    fs = filesystem()
+    table = pyarrow.parquet.read_table("az://container/ws/output.parquet", filesystem=fs)
+"""
+
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+import pyarrow.fs as pafs
+
+import genomicsdb
+
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+
+
+def is_local(path):
+    return "://" not in path or path.startswith("file://")
+
+
+class GenomicsDBFile(io.RawIOBase):
+    """Random access, read-only file over the GenomicsDB storage layer"""
+
+    def __init__(self, path, size=None):
+        super().__init__()
+        self.path = path
+        self._size = size
+        self._pos = 0
+        self._contents = None
+        self._lock = threading.Lock()
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def size(self):
+        if self._size is None:
+            self._size = genomicsdb.file_size(self.path)
+            if self._size < 0:
+                raise FileNotFoundError(f"{self.path} not found")
+        return self._size
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.size() + offset
+        else:
+            raise ValueError(f"Invalid whence({whence})")
+        if pos < 0:
+            raise ValueError(f"Cannot seek to negative position({pos})")
+        self._pos = pos
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+    def _load(self):
+        with self._lock:
+            if self._contents is None:
+                self._contents = genomicsdb.read_range(self.path, 0)
+                if self._contents is None:
+                    raise FileNotFoundError(f"{self.path} could not be read")
+                self._size = len(self._contents)
+        return self._contents
+
+    def read_at(self, offset, length):
+        """Read up to length bytes at offset without moving the position of the file"""
+        if is_local(self.path):
+            contents = genomicsdb.read_range(self.path, offset, length)
+            if contents is None:
+                raise FileNotFoundError(f"{self.path} could not be read")
+            return contents
+        return self._load()[offset : offset + length]
+
+    def read_ranges(self, ranges, max_workers=None):
+        """Read the (offset, length) ranges concurrently, returns the contents in the order of the ranges"""
+        ranges = list(ranges)
+        if not is_local(self.path) or len(ranges) <= 1:
+            return [self.read_at(offset, length) for offset, length in ranges]
+        workers = min(len(ranges), max_workers or genomicsdb.max_filesystem_workers)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(lambda r: self.read_at(*r), ranges))
+
+    def readinto(self, buffer):
+        contents = self.read_at(self._pos, len(buffer))
+        buffer[: len(contents)] = contents
+        self._pos += len(contents)
+        return len(contents)
+
+    def readall(self):
+        return bytes(self.read_at(self._pos, max(self.size() - self._pos, 0)))
+
+
+class GenomicsDBFileSystemHandler(pafs.FileSystemHandler):
+    """pyarrow.fs.FileSystemHandler over the GenomicsDB storage layer, see filesystem()
+
+    Parameters
+    ----------
+    buffer_size : int, optional
+        Size of the read-ahead buffer for input streams, by default DEFAULT_BUFFER_SIZE
+    """
+
+    def __init__(self, buffer_size=DEFAULT_BUFFER_SIZE):
+        self.buffer_size = buffer_size
+
+    def __eq__(self, other):
+        return isinstance(other, GenomicsDBFileSystemHandler) and self.buffer_size == other.buffer_size
+
+    def __ne__(self, other):
+        return not self == other
+
+    def get_type_name(self):
+        return "genomicsdb"
+
+    def normalize_path(self, path):
+        return path
+
+    def get_file_info(self, paths):
+        infos = []
+        for path, size in zip(paths, genomicsdb.file_sizes(paths)):
+            if size >= 0:
+                infos.append(pafs.FileInfo(path, pafs.FileType.File, size=size))
+            else:
+                infos.append(pafs.FileInfo(path, pafs.FileType.NotFound))
+        return infos
+
+    def get_file_info_selector(self, selector):
+        raise NotImplementedError("Listing directories is not supported by the GenomicsDB storage layer")
+
+    def _read_only(self, *args, **kwargs):
+        raise NotImplementedError("GenomicsDB filesystem is read-only")
+
+    create_dir = _read_only
+    delete_dir = _read_only
+    delete_dir_contents = _read_only
+    delete_root_dir_contents = _read_only
+    delete_file = _read_only
+    move = _read_only
+    copy_file = _read_only
+    open_output_stream = _read_only
+    open_append_stream = _read_only
+
+    def open_input_stream(self, path):
+        return pa.PythonFile(io.BufferedReader(GenomicsDBFile(path), self.buffer_size), mode="r")
+
+    def open_input_file(self, path):
+        return pa.PythonFile(GenomicsDBFile(path), mode="r")
+
+
+def filesystem(buffer_size=DEFAULT_BUFFER_SIZE):
+    """Returns a pyarrow.fs.PyFileSystem over the GenomicsDB storage layer"""
+    return pafs.PyFileSystem(GenomicsDBFileSystemHandler(buffer_size))
+
+
+def read_ranges(path, ranges, max_workers=None):
+    """Read the (offset, length) ranges of the file at path(local or cloud URI) concurrently"""
+    return GenomicsDBFile(path).read_ranges(ranges, max_workers)
+
+
+def open_file(path, buffer_size=DEFAULT_BUFFER_SIZE):
+    """Open the file at path(local or cloud URI) for buffered, random access reads as a python file object"""
+    return io.BufferedReader(GenomicsDBFile(path), buffer_size)
@@ -0,0 +1,181 @@
+#
+# genomicsdb batched lookups of positions
+#
+# The MIT License
+#
+# Copyright (c) 2025 dātma, inc™
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+"""Batched lookups of many positions, e.g. the 10^5 to 10^7 positions or variant ids of annotation and validation
+jobs, without an interval and a native query per position.
+
+The positions are converted in bulk to TileDB columns with the contig offsets of the vid mapping, sorted and grouped by
+the partitions(arrays) of the loader json. Every array is then queried once, with a column range per distinct position,
+and the calls are attributed back to the positions by the column range they were returned for. Calls spanning a
+position, e.g. gvcf reference blocks or deletions starting before it, are returned for that position.
+"""
+
+import json
+import logging
+import sys
+from typing import NamedTuple
+
+import genomicsdb
+from genomicsdb.scripts import genomicsdb_common
+
+DEFAULT_ATTRIBUTES = ["REF", "GT"]
+# Column of the calls holding the index of the position they were looked up for
+LOOKUP_COLUMN = "LOOKUP"
+
+
+class PositionCalls(NamedTuple):
+    calls: object
+    offsets: object
+
+
+def _partition_columns(partitions):
+    import numpy as np
+
+    begins, ends, arrays = [], [], []
+    for idx, partition in enumerate(partitions):
+        if isinstance(partition["begin"], int):  # Old style loader json
+            begins.append(partition["begin"])
+            if "end" in partition.keys():
+                ends.append(partition["end"])
+            elif idx + 1 < len(partitions):
+                ends.append(partitions[idx + 1]["begin"] - 1)
+            else:
+                ends.append(sys.maxsize)
+        else:  # Generated with vcf2genomicsdb_init
+            begins.append(partition["begin"]["tiledb_column"])
+            ends.append(partition["end"]["tiledb_column"])
+        arrays.append(partition["array_name"] if "array_name" in partition else partition["array"])
+    order = np.argsort(np.asarray(begins, dtype=np.int64), kind="stable")
+    return (
+        np.asarray(begins, dtype=np.int64)[order],
+        np.asarray(ends, dtype=np.int64)[order],
+        [arrays[i] for i in order],
+    )
+
+
+def positions_to_columns(contigs_map, contigs, positions):
+    """Returns the TileDB columns for the 1-based positions on contigs, as parsed from the vid mapping by
+    genomicsdb_common.parse_vidmap_json. contigs is a contig for all the positions or a contig per position. Positions
+    that are not on a contig of the vid mapping are -1"""
+    import numpy as np
+
+    positions = np.asarray(positions, dtype=np.int64)
+    if isinstance(contigs, str):
+        contigs = np.full(len(positions), contigs)
+    contigs = np.asarray(contigs, dtype=str)
+    if len(contigs) != len(positions):
+        raise ValueError(f"Number of contigs({len(contigs)}) does not match the number of positions({len(positions)})")
+    # Contig offsets are resolved once per distinct contig and broadcast to the positions
+    names, inverse = np.unique(contigs, return_inverse=True)
+    offsets = np.array([contigs_map[name]["tiledb_column_offset"] if name in contigs_map else -1 for name in names])
+    lengths = np.array([contigs_map[name]["length"] if name in contigs_map else 0 for name in names])
+    offsets = offsets.astype(np.int64)[inverse.reshape(-1)]
+    lengths = lengths.astype(np.int64)[inverse.reshape(-1)]
+    valid = (offsets >= 0) & (positions >= 1) & (positions <= lengths)
+    return np.where(valid, offsets + positions - 1, -1)
+
+
+def lookup_positions(
+    workspace,
+    contigs,
+    positions,
+    attributes=None,
+    row_ranges=None,
+    callset_file=None,
+    vidmap_file=None,
+    loader_file=None,
+    partitions=None,
+):
+    """Look up the calls at the 1-based positions on contigs, a contig for all the positions or a contig per
+    position, with a single query per array of the workspace.
+
+    The callset, vid mapping and loader json default to callset.json, vidmap.json and loader.json in the workspace,
+    partitions override the column partitions of the loader json. attributes default to REF and GT and row_ranges
+    select the samples.
+
+    Returns PositionCalls with calls, a pandas DataFrame of the calls as output by flatten_intervals queries for the
+    positions in their input order with the index of the position in the LOOKUP column, and offsets, so that the calls
+    for position i are calls[offsets[i]:offsets[i+1]]. Positions not found in the vid mapping have no calls.
+    """
+    import numpy as np
+    import pandas
+
+    workspace = genomicsdb_common.normalize_path(workspace)
+    callset_file = callset_file or genomicsdb_common.join_paths(workspace, "callset.json")
+    vidmap_file = vidmap_file or genomicsdb_common.join_paths(workspace, "vidmap.json")
+    if partitions is None:
+        loader_file = loader_file or genomicsdb_common.join_paths(workspace, "loader.json")
+        partitions = json.loads(genomicsdb.read_entire_file(loader_file))["column_partitions"]
+
+    contigs_map, _ = genomicsdb_common.parse_vidmap_json(vidmap_file)
+    columns = positions_to_columns(contigs_map, contigs, positions)
+    num_invalid = int(np.count_nonzero(columns < 0))
+    if num_invalid:
+        logging.warning(f"{num_invalid} of {len(columns)} positions are not on contigs of vid mapping({vidmap_file})")
+
+    # Distinct columns in sorted order, grouped by the partition they fall in
+    unique_columns = np.unique(columns[columns >= 0])
+    begins, ends, arrays = _partition_columns(partitions)
+    partition_idx = np.searchsorted(begins, unique_columns, side="right") - 1
+    in_partition = (partition_idx >= 0) & (unique_columns <= ends[np.maximum(partition_idx, 0)])
+
+    gdb = genomicsdb.connect(workspace, callset_file, vidmap_file, attributes or DEFAULT_ATTRIBUTES)
+    frames = []
+    partitions_looked_up = np.unique(partition_idx[in_partition]).tolist()
+    exists = genomicsdb.arrays_exist(workspace, [arrays[idx] for idx in partitions_looked_up])
+    for idx, array_exists in zip(partitions_looked_up, exists):
+        array = arrays[idx]
+        array_columns = unique_columns[in_partition & (partition_idx == idx)]
+        if not array_exists:
+            logging.warning(f"Array({array}) for {len(array_columns)} positions not found in workspace({workspace})")
+            continue
+        logging.info(f"Looking up {len(array_columns)} positions in array({array})")
+        calls = gdb.query_variant_calls(
+            array,
+            [(column, column) for column in array_columns.tolist()],
+            row_ranges,
+            flatten_intervals=True,
+            interval_columns=True,
+        )
+        if len(calls):
+            frames.append(calls)
+
+    offsets = np.zeros(len(columns) + 1, dtype=np.int64)
+    if not frames:
+        return PositionCalls(pandas.DataFrame({LOOKUP_COLUMN: np.empty(0, dtype=np.int64)}), offsets)
+    calls = pandas.concat(frames, ignore_index=True)
+
+    # The calls for a column are contiguous once sorted by column, and are repeated for every position at the column
+    call_columns = calls["COLUMN"].to_numpy(dtype=np.int64)
+    order = np.argsort(call_columns, kind="stable")
+    sorted_columns = call_columns[order]
+    starts = np.searchsorted(sorted_columns, columns, side="left")
+    counts = np.where(columns >= 0, np.searchsorted(sorted_columns, columns, side="right") - starts, 0)
+    np.cumsum(counts, out=offsets[1:])
+    take = order[np.repeat(starts - offsets[:-1], counts) + np.arange(offsets[-1])]
+    calls = calls.drop(columns=["COLUMN"]).iloc[take].reset_index(drop=True)
+    calls.insert(0, LOOKUP_COLUMN, np.repeat(np.arange(len(columns)), counts))
+    return PositionCalls(calls, offsets)
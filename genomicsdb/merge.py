@@ -0,0 +1,251 @@
+#
+# genomicsdb merge of query outputs
+#
+# The MIT License
+#
+# Copyright (c) 2025 dātma, inc™
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+"""Ordered merge of the outputs of separate queries, e.g. the per array and per row chunk outputs of genomicsdb_query,
+into consolidated files sorted by contig, position and sample.
+
+The calls in every input are expected to be ordered by contig and position, as returned by the queries. The csv,
+parquet and arrow batch inputs are k-way merged in a streaming fashion, holding only a batch per input and the calls at
+a position in memory. Contigs are ordered by contig_order, e.g. the contigs of the vid mapping in the order of their
+columns, and otherwise in natural order(chr2 before chr10).
+"""
+
+import csv
+import heapq
+import itertools
+import json
+import re
+
+from genomicsdb import json_output_mode
+
+SAMPLE_COLUMNS = ("Sample", "SAMPLE", "SAMPLE_NAME", "sample")
+CONTIG_COLUMNS = ("CHR", "CHROM", "contig")
+POSITION_COLUMNS = ("POS", "pos")
+
+
+def _find_column(columns, candidates, required=True):
+    for candidate in candidates:
+        if candidate in columns:
+            return candidate
+    if required:
+        raise ValueError(f"None of the columns{list(candidates)} found in {list(columns)}")
+    return None
+
+
+def _natural_key(contig):
+    return [int(token) if token.isdigit() else token for token in re.split(r"(\d+)", contig)]
+
+
+def contig_key_fn(contig_order=None):
+    """Returns the sort key for contigs, contigs in contig_order come first in that order followed by the rest in
+    natural order"""
+    ranks = {contig: rank for rank, contig in enumerate(contig_order or [])}
+    return lambda contig: (ranks.get(contig, len(ranks)), _natural_key(contig))
+
+
+def _csv_calls(reader, header, contig_key):
+    contig_idx = header.index(_find_column(header, CONTIG_COLUMNS))
+    pos_idx = header.index(_find_column(header, POSITION_COLUMNS))
+    sample_column = _find_column(header, SAMPLE_COLUMNS, required=False)
+    sample_idx = header.index(sample_column) if sample_column else None
+    # Calls at a position are ordered by row in the inputs, so they are sorted by sample here
+    for (contig, pos), calls in itertools.groupby(reader, key=lambda row: (row[contig_idx], row[pos_idx])):
+        keyed_calls = [
+            ((contig_key(contig), int(pos), call[sample_idx] if sample_idx is not None else ""), call) for call in calls
+        ]
+        keyed_calls.sort(key=lambda keyed_call: keyed_call[0])
+        yield from keyed_calls
+
+
+def merge_csv(inputs, output, contig_order=None):
+    """Merge the csv files in inputs, with the same header, into output"""
+    contig_key = contig_key_fn(contig_order)
+    files = [open(input_file, newline="") for input_file in inputs]
+    try:
+        header = None
+        streams = []
+        for f in files:
+            reader = csv.reader(f)
+            input_header = next(reader, None)
+            if not input_header:
+                continue
+            if header is None:
+                header = input_header
+            elif input_header != header:
+                raise ValueError(f"Cannot merge csv files with different headers {header} and {input_header}")
+            streams.append(_csv_calls(reader, header, contig_key))
+        with open(output, "w", newline="") as out:
+            writer = csv.writer(out)
+            if header:
+                writer.writerow(header)
+            for _, call in heapq.merge(*streams, key=lambda keyed_call: keyed_call[0]):
+                writer.writerow(call)
+    finally:
+        for f in files:
+            f.close()
+
+
+class _BatchInput:
+    """Buffered batches from an input, read in order"""
+
+    def __init__(self, batches):
+        self._batches = iter(batches)
+        self.buffer = None
+        self.exhausted = False
+
+    def read(self):
+        import pyarrow as pa
+
+        batch = next(self._batches, None)
+        if batch is None:
+            self.exhausted = True
+            return
+        table = batch if isinstance(batch, pa.Table) else pa.Table.from_batches([batch])
+        if self.buffer is None:
+            self.buffer = table
+        else:
+            self.buffer = pa.concat_tables([self.buffer, table], promote_options="default")
+
+
+def merge_batches(inputs, contig_order=None):
+    """Generator for the ordered merge of inputs, each an iterable of arrow record batches or tables ordered by contig
+    and position, e.g. the batches of arrow queries. Yields tables of the merged calls"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    contig_key = contig_key_fn(contig_order)
+    readers = [_BatchInput(batches) for batches in inputs]
+    columns = None
+
+    def last_key(table):
+        return contig_key(table[columns[0]][-1].as_py()), table[columns[1]][-1].as_py()
+
+    def first_key(table):
+        return contig_key(table[columns[0]][0].as_py()), table[columns[1]][0].as_py()
+
+    while True:
+        # Every input that is not exhausted has to buffer calls before its last position, so that the calls at
+        # a position are all emitted together
+        for reader in readers:
+            while not reader.exhausted and (
+                reader.buffer is None
+                or reader.buffer.num_rows == 0
+                or (columns and first_key(reader.buffer) == last_key(reader.buffer))
+            ):
+                reader.read()
+                if columns is None and reader.buffer is not None:
+                    names = reader.buffer.column_names
+                    columns = (
+                        _find_column(names, CONTIG_COLUMNS),
+                        _find_column(names, POSITION_COLUMNS),
+                        _find_column(names, SAMPLE_COLUMNS, required=False),
+                    )
+        active = [reader for reader in readers if reader.buffer is not None and reader.buffer.num_rows]
+        if not active:
+            break
+        bounds = [last_key(reader.buffer) for reader in active if not reader.exhausted]
+        bound = min(bounds) if bounds else None
+        pieces = []
+        for reader in active:
+            table = reader.buffer
+            if bound is None:
+                pieces.append(table)
+                reader.buffer = None
+                continue
+            # Emit the calls before the bound, i.e. on earlier contigs or before the position on its contig
+            contigs = table[columns[0]]
+            unique_contigs = pc.unique(contigs).to_pylist()
+            before = [contig for contig in unique_contigs if contig_key(contig) < bound[0]]
+            mask = pc.is_in(contigs, value_set=pa.array(before, type=contigs.type))
+            for contig in unique_contigs:
+                if contig_key(contig) == bound[0]:
+                    mask = pc.or_(mask, pc.and_(pc.equal(contigs, contig), pc.less(table[columns[1]], bound[1])))
+            pieces.append(table.filter(mask))
+            reader.buffer = table.filter(pc.invert(mask))
+        merged = pa.concat_tables(pieces, promote_options="default")
+        if merged.num_rows == 0:
+            continue
+        contigs = sorted(pc.unique(merged[columns[0]]).to_pylist(), key=contig_key)
+        ranks = pc.index_in(merged[columns[0]], value_set=pa.array(contigs, type=merged[columns[0]].type))
+        sort_keys = [("__contig_rank", "ascending"), (columns[1], "ascending")]
+        if columns[2]:
+            sort_keys.append((columns[2], "ascending"))
+        yield merged.append_column("__contig_rank", ranks).sort_by(sort_keys).drop_columns(["__contig_rank"])
+
+
+def merge_parquet(inputs, output, contig_order=None, batch_size=65536):
+    """Merge the parquet inputs into output. Each input is a path or a list of paths to parts read in order, e.g. the
+    <interval>__<i>.parquet parts of an arrow query output of genomicsdb_query"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    inputs = [[paths] if isinstance(paths, str) else list(paths) for paths in inputs]
+    batches = [(batch for path in paths for batch in pq.ParquetFile(path).iter_batches(batch_size)) for paths in inputs]
+    writer = None
+    try:
+        for merged in merge_batches(batches, contig_order):
+            if writer is None:
+                writer = pq.ParquetWriter(output, merged.schema)
+            writer.write_table(merged.cast(writer.schema))
+        if writer is None:
+            # No calls in any of the inputs
+            schema = pq.read_schema(inputs[0][0]) if inputs and inputs[0] else pa.schema([])
+            writer = pq.ParquetWriter(output, schema)
+    finally:
+        if writer:
+            writer.close()
+
+
+def _merge_json_values(merged, value, distinct_lists=False):
+    if merged is None:
+        return value
+    if isinstance(merged, dict) and isinstance(value, dict):
+        for key, item in value.items():
+            merged[key] = _merge_json_values(merged.get(key), item, distinct_lists)
+        return merged
+    if isinstance(merged, list) and isinstance(value, list):
+        if distinct_lists:
+            return sorted(set(merged).union(value))
+        return merged + value
+    if all(isinstance(item, (int, float)) and not isinstance(item, bool) for item in (merged, value)):
+        return merged + value
+    raise ValueError(f"Cannot merge json values {merged} and {value}")
+
+
+def merge_json(inputs, output, json_type):
+    """Merge the json inputs of the json_output_mode json_type into output. The lists of samples of the samples mode
+    are combined into a sorted list of the distinct samples, counts are summed up and the lists of the per call modes
+    are concatenated in the order of the inputs, so that their values stay aligned across the fields. Unlike csv and
+    parquet, the merged json is held in memory."""
+    distinct_lists = json_type == json_output_mode.SAMPLES
+    merged = None
+    for input_file in inputs:
+        with open(input_file, "rb") as f:
+            contents = f.read()
+        if contents.strip():
+            merged = _merge_json_values(merged, json.loads(contents), distinct_lists)
+    with open(output, "w") as out:
+        json.dump(merged if merged is not None else {}, out, separators=(",", ":"))
@@ -109,11 +109,7 @@ def main():
     loader_file = args.loader
     if not loader_file:
         loader_file = workspace + "/loader.json"
-    if (
-        not genomicsdb.is_file(callset_file)
-        or not genomicsdb.is_file(vidmap_file)
-        or not genomicsdb.is_file(loader_file)
-    ):
+    if not all(genomicsdb.is_files([callset_file, vidmap_file, loader_file])):
         raise RuntimeError(f"callset({callset_file}) vidmap({vidmap_file}) or loader({loader_file}) not found")
 
     if is_cloud_path(callset_file):
@@ -134,9 +130,10 @@ def main():
             for interval in intervals
             for arrays_for_interval in get_arrays(interval, contigs_map, partitions)
         }
-        for array in arrays:
+        arrays = sorted(arrays)
+        for array, exists in zip(arrays, genomicsdb.arrays_exist(workspace, arrays)):
             print(f"Caching fragments for array {array}")
-            if genomicsdb.array_exists(workspace, array):
+            if exists:
                 genomicsdb.cache_array_metadata(workspace, array)
 
 
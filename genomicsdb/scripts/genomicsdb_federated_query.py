@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+
+#
+# genomicsdb_federated_query python script
+#
+# The MIT License
+#
+# Copyright (c) 2025 dātma, inc™
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+import argparse
+import logging
+
+import genomicsdb
+from genomicsdb import federated
+from genomicsdb.scripts import genomicsdb_query
+
+
+def read_list(values, list_file):
+    if values:
+        return values
+    if list_file:
+        with open(list_file) as f:
+            return [line.rstrip() for line in f if line.strip()]
+    return None
+
+
+def per_workspace(args, name, option):
+    values = getattr(args, name)
+    if values is None:
+        return [None] * len(args.workspace)
+    if len(values) != len(args.workspace):
+        raise RuntimeError(f"{option} has to be specified once for every -w/--workspace or not at all")
+    return values
+
+
+def setup():
+    parser = argparse.ArgumentParser(
+        prog="federated_query",
+        description="GenomicsDB query over several workspaces, each with its own callset, vidmap and loader json, merged into a single output ordered by contig, position and sample",  # noqa
+        formatter_class=argparse.RawTextHelpFormatter,
+        usage="%(prog)s [options]",
+    )
+    parser.add_argument(
+        "--version",
+        action="version",
+        version=genomicsdb.version(),
+        help="print GenomicsDB native library version and exit",
+    )
+    parser.add_argument(
+        "-w",
+        "--workspace",
+        action="append",
+        required=True,
+        help="URL to GenomicsDB workspace. This argument has to be specified once for every workspace e.g -w cohort1_ws -w az://my_container/cohort2_ws",  # noqa
+    )
+    parser.add_argument(
+        "-n",
+        "--name",
+        action="append",
+        required=False,
+        help="Optional - names of the workspaces in the order of -w/--workspace, qualifying their samples as <name>:<sample> when needed. Defaults to the basenames of the workspaces",  # noqa
+    )
+    parser.add_argument(
+        "-c",
+        "--callset",
+        action="append",
+        required=False,
+        help="Optional - URLs to callset mapping files in the order of -w/--workspace. Defaults to callset.json in every workspace",  # noqa
+    )
+    parser.add_argument(
+        "-v",
+        "--vidmap",
+        action="append",
+        required=False,
+        help="Optional - URLs to vid mapping files in the order of -w/--workspace. Defaults to vidmap.json in every workspace",  # noqa
+    )
+    parser.add_argument(
+        "-l",
+        "--loader",
+        action="append",
+        required=False,
+        help="Optional - URLs to loader files in the order of -w/--workspace. Defaults to loader.json in every workspace",  # noqa
+    )
+    parser.add_argument(
+        "--list-samples",
+        action="store_true",
+        help="List the sample ids of the federated workspaces and exit",
+    )
+    parser.add_argument(
+        "--prefix-samples",
+        action="store_true",
+        help="Optional - qualify all the samples with the names of their workspaces, by default only samples found in more than one workspace are qualified",  # noqa
+    )
+    interval_group = parser.add_mutually_exclusive_group()
+    interval_group.add_argument(
+        "-i",
+        "--interval",
+        action="append",
+        required=False,
+        help="Optional - genomic intervals over which to operate. The intervals should be specified in the <CONTIG>:<START>-<END> format with START and END optional.\nThis argument may be specified 0 or more times e.g -i chr1:1-10000 -i chr2 -i chr3:1000. Defaults to all the contigs",  # noqa
+    )
+    interval_group.add_argument(
+        "-I",
+        "--interval-list",
+        required=False,
+        help="Optional - genomic intervals listed in a file over which to operate, one interval per line",
+    )
+    sample_group = parser.add_mutually_exclusive_group()
+    sample_group.add_argument(
+        "-s",
+        "--sample",
+        action="append",
+        required=False,
+        help="Optional - sample ids or names over which to operate, a name selects the sample in every workspace it is found in. This argument may be specified 0 or more times e.g -s HG00097 -s cohort2_ws:HG00090",  # noqa
+    )
+    sample_group.add_argument(
+        "-S",
+        "--sample-list",
+        required=False,
+        help="Optional - sample file containing list of sample ids or names, one per line, to operate upon",
+    )
+    parser.add_argument(
+        "-a",
+        "--attributes",
+        required=False,
+        help="Optional - comma separated list of genomic attributes(REF, ALT) and fields described in the vid mappings of all the workspaces for the query, eg. GT,AC,PL,DP... Defaults to REF,GT",  # noqa
+    )
+    parser.add_argument(
+        "-t",
+        "--output-type",
+        choices=["csv", "arrow"],
+        default="csv",
+        help="Optional - specify type of output for the query, arrow outputs are written as parquet (default: %(default)s)",  # noqa
+    )
+    parser.add_argument(
+        "-z",
+        "--max-arrow-byte-size",
+        default="64MB",
+        help="Optional - size of the arrow batches from the queries of every workspace (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="federated_output",
+        help="a prefix filename to the merged output, suffixed with .csv or .parquet (default: %(default)s)",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = setup()
+
+    workspaces = [
+        federated.load_workspace(workspace, name, callset_file, vidmap_file, loader_file)
+        for workspace, name, callset_file, vidmap_file, loader_file in zip(
+            args.workspace,
+            per_workspace(args, "name", "-n/--name"),
+            per_workspace(args, "callset", "-c/--callset"),
+            per_workspace(args, "vidmap", "-v/--vidmap"),
+            per_workspace(args, "loader", "-l/--loader"),
+        )
+    ]
+    if args.list_samples:
+        for sample_ids in federated.sample_ids(workspaces, args.prefix_samples):
+            for sample_id in sample_ids.values():
+                print(sample_id)
+        return 0
+
+    # pyarrow is only needed to write the merged output, keep it out of the startup path for --list-samples
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+
+    attributes = args.attributes.replace(" ", "").split(",") if args.attributes else None
+    calls = federated.query(
+        workspaces,
+        intervals=read_list(args.interval, args.interval_list),
+        attributes=attributes,
+        samples=read_list(args.sample, args.sample_list),
+        prefix_samples=args.prefix_samples,
+        batch_bytes=genomicsdb_query.parse_args_for_max_bytes(args.max_arrow_byte_size),
+    )
+    output = args.output + (".csv" if args.output_type == "csv" else ".parquet")
+    writer = None
+    schema = None
+    num_calls = 0
+    try:
+        for table in calls:
+            if writer is None:
+                schema = table.schema
+                if args.output_type == "csv":
+                    writer = pa_csv.CSVWriter(output, schema)
+                else:
+                    writer = pq.ParquetWriter(output, schema)
+            writer.write_table(table.cast(schema))
+            num_calls += table.num_rows
+    finally:
+        calls.close()
+        if writer:
+            writer.close()
+    if writer is None:
+        logging.info(f"No calls found in the {len(workspaces)} workspaces for the query")
+    else:
+        print(f"Wrote {num_calls} calls from {len(workspaces)} workspaces into {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
@@ -27,17 +27,17 @@
 #
 
 import argparse
+import collections
+import glob
 import json
 import logging
 import multiprocessing
 import os
 import re
 import sys
+import time
 from typing import List, NamedTuple
 
-import pyarrow as pa
-import pyarrow.parquet as pq
-
 import genomicsdb
 from genomicsdb import json_output_mode
 from genomicsdb.protobuf import genomicsdb_coordinates_pb2 as query_coords
@@ -50,6 +50,12 @@ logging.basicConfig(
     datefmt="%H:%M:%S",
 )
 
+# Number of arrow batches serialized ahead of the parquet writer for -t/--output-type arrow
+ARROW_INFLIGHT_BATCHES = 2
+
+# Positions scanned at first for the start of a call to cut the vcf shards at, doubled until one is found
+VCF_CUT_WINDOW = 1024
+
 
 def parse_callset_json(callset_file):
     callset = json.loads(genomicsdb.read_entire_file(callset_file))
@@ -250,6 +256,13 @@ def parse_loader_json(loader_file, interval_form=True):
     return [name.replace("$", ":", 1).replace("$", "-", 1) if interval_form else name for name in array_names]
 
 
+def check_shard(value):
+    match = re.fullmatch(r"(\d+)/(\d+)", value)
+    if not match or not 1 <= int(match.group(1)) <= int(match.group(2)):
+        raise argparse.ArgumentTypeError(f"{value} is not a valid shard, specify as k/N with 1 <= k <= N")
+    return int(match.group(1)), int(match.group(2))
+
+
 def check_nproc(value):
     ivalue = int(value)
     if ivalue < 1:
@@ -328,6 +341,12 @@ def setup():
         required=False,
         help="genomic intervals listed in a file over which to operate.\nThe intervals should be specified in the <CONTIG>:<START>-<END> format, with START and END optional one interval per line. \nNote: \n\t1. -i/--interval and -I/--interval-list are mutually exclusive \n\t2. either samples and/or intervals using -i/-I/-s/-S options has to be specified",  # noqa
     )
+    parser.add_argument(
+        "-P",
+        "--positions",
+        required=False,
+        help="Optional - file listing positions to look up, one <CONTIG>:<POS> or <CONTIG> <POS> per line, e.g. 1:12345. Variant ids with alleles like 1:12345:A:G are rejected as all the calls at a position are returned irrespective of their alleles. The positions are looked up with a single query per array and the calls are written to <output>.csv in the order of the positions, with the index of their position in the LOOKUP column",  # noqa
+    )
     parser.add_argument(
         "-s",
         "--sample",
@@ -368,9 +387,9 @@ def setup():
     parser.add_argument(
         "-t",
         "--output-type",
-        choices=["csv", "json", "arrow"],
+        choices=["csv", "json", "arrow", "vcf"],
         default="csv",
-        help="Optional - specify type of output for the query (default: %(default)s)",
+        help="Optional - specify type of output for the query. vcf outputs are exported as bgzipped shards in parallel and concatenated in genomic order into a single indexed <output>.vcf.gz (default: %(default)s)",  # noqa
     )
     parser.add_argument(
         "-j",
@@ -383,7 +402,24 @@ def setup():
         "-z",
         "--max-arrow-byte-size",
         default="64MB",
-        help="Optional - used in conjunction with -t/--output-type arrow as hint for buffering parquet files(default: %(default)s)",  # noqa
+        help="Optional - used in conjunction with -t/--output-type arrow as the size of the arrow batches from the query and of the parquet files they are written to(default: %(default)s)",  # noqa
+    )
+    parser.add_argument(
+        "-r",
+        "--reference-genome",
+        required=False,
+        help="URL to the reference genome fasta, required with -t/--output-type vcf",
+    )
+    parser.add_argument(
+        "--vcf-header",
+        required=False,
+        help="Optional - URL to the template vcf header used with -t/--output-type vcf. Defaults to vcfheader.vcf in workspace",  # noqa
+    )
+    parser.add_argument(
+        "--vcf-index",
+        choices=["tbi", "csi", "none"],
+        default="tbi",
+        help="Optional - index generated for the vcf with -t/--output-type vcf using pysam, tabix or bcftools, whichever is available (default: %(default)s)",  # noqa
     )
     parser.add_argument(
         "-o",
@@ -403,6 +439,61 @@ def setup():
         action="store_true",
         help="iterate only once bypassing the intersecting intervals phase (default: %(default)s)",  # noqa
     )
+    parser.add_argument(
+        "--stats",
+        nargs="?",
+        const="-",
+        help="Optional - output a json summary of the performance statistics for the queries to the specified file or to stdout if no file is specified",  # noqa
+    )
+    parser.add_argument(
+        "--plan-out",
+        required=False,
+        help="Optional - write the fully expanded plan of queries, with their estimated costs, to the specified json file and exit. The plan can be run with --plan-in, e.g. split across the jobs of a cluster job array with --shard",  # noqa
+    )
+    parser.add_argument(
+        "--plan-in",
+        required=False,
+        help="Optional - run the queries from a plan written with --plan-out instead of planning them from the intervals and samples",  # noqa
+    )
+    parser.add_argument(
+        "--shard",
+        type=check_shard,
+        required=False,
+        help="Optional - run only shard k of N, specified as k/N with 1 <= k <= N, of the queries. The queries are assigned to shards deterministically, balanced by their estimated costs, so N independent jobs together run all the queries",  # noqa
+    )
+    parser.add_argument(
+        "--merge",
+        action="store_true",
+        help="Optional - check that all the queries, planned from the arguments or read with --plan-in, completed e.g. by the jobs for all the shards and merge their outputs into a single <output>.csv/.json/.parquet/.vcf.gz sorted by contig, position and sample. The outputs of the queries are deleted once merged (default: %(default)s)",  # noqa
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Optional - resume an interrupted run with the same arguments. Queries completed by the earlier run, as recorded in <output>.manifest.json and the .done markers next to their outputs, are skipped (default: %(default)s)",  # noqa
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=0,
+        help="Optional - number of times a failed query is retried with exponential backoff (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--retry-backoff",
+        type=float,
+        default=1.0,
+        help="Optional - seconds to wait before the first retry of a failed query, doubled for every further retry (default: %(default)s)",  # noqa
+    )
+    parser.add_argument(
+        "--prefetch-depth",
+        type=int,
+        default=0,
+        help="Optional - number of arrays whose metadata is prefetched in the background ahead of their queries by each process, hides the latency of opening arrays on cloud workspaces (default: %(default)s)",  # noqa
+    )
+    parser.add_argument(
+        "--daemon",
+        required=False,
+        help="Optional - unix socket of a running genomicsdb_query_daemon. The queries are submitted to the daemon and processed by its warm workers instead of a new multiprocessing pool",  # noqa
+    )
 
     args = parser.parse_args()
 
@@ -428,11 +519,7 @@ def setup():
             loader_file = "loader.json"
         else:
             loader_file = genomicsdb_common.join_paths(workspace, "loader.json")
-    if (
-        not genomicsdb.is_file(callset_file)
-        or not genomicsdb.is_file(vidmap_file)
-        or not genomicsdb.is_file(loader_file)
-    ):
+    if not all(genomicsdb.is_files([callset_file, vidmap_file, loader_file])):
         raise RuntimeError(f"callset({callset_file}) vidmap({vidmap_file}) or loader({loader_file}) not found")
 
     # List samples
@@ -451,10 +538,10 @@ def setup():
     interval_list = args.interval_list
     samples = args.sample
     sample_list = args.sample_list
-    if not args.list_partitions and not args.list_contigs:
+    if not args.list_partitions and not args.list_contigs and not args.plan_in and not args.positions:
         if not intervals and not samples and not interval_list and not sample_list:
             raise RuntimeError(
-                "one of either -i/-interval -I/--interval-list -s/--sample -S/--sample-list has to be specified"  # noqa
+                "one of either -i/-interval -I/--interval-list -s/--sample -S/--sample-list -P/--positions has to be specified"  # noqa
             )
 
     contigs_map, intervals = genomicsdb_common.parse_vidmap_json(vidmap_file, intervals or interval_list)
@@ -502,6 +589,8 @@ def generate_output_filename(output, output_type, interval, idx):
         output_filename = output_filename + f"_{idx}"
     if output_type == "arrow":
         return output_filename
+    elif output_type == "vcf":
+        return output_filename + ".vcf.gz"
     else:
         return output_filename + "." + output_type
 
@@ -564,12 +653,17 @@ class OutputConfig(NamedTuple):
     type: str
     json_type: str
     max_arrow_bytes: int
+    reference_genome: str = None
+    vcf_header: str = None
 
 
 class Config(NamedTuple):
     export_config: GenomicsDBExportConfig
     query_config: GenomicsDBQueryConfig
     output_config: OutputConfig
+    prefetch_arrays: tuple = ()
+    retries: int = 0
+    retry_backoff: float = 1.0
 
 
 def configure_export(config: GenomicsDBExportConfig):
@@ -607,6 +701,151 @@ def configure_query(config: GenomicsDBQueryConfig):
     return query_config
 
 
+def configure_vcf_export(config: Config):
+    # generate_vcf() only accepts the query as part of the export configuration
+    export_config = configure_export(config.export_config)
+    query_config = configure_query(config.query_config)
+    export_config.array_name = query_config.array_name
+    export_config.query_contig_intervals.extend(query_config.query_contig_intervals)
+    export_config.query_row_ranges.extend(query_config.query_row_ranges)
+    export_config.reference_genome = config.output_config.reference_genome
+    export_config.vcf_header_filename = config.output_config.vcf_header
+    return export_config
+
+
+def next_vcf_cut(gdb, query_config, start):
+    """Returns the first position at or after start where a call begins or the one before it ended, i.e. where the
+    vcf export starts a new record, None if there is none in the query"""
+    window = VCF_CUT_WINDOW
+    while start <= query_config.end:
+        end = min(start + window - 1, query_config.end)
+        sites = gdb.query_variant_calls(
+            query_protobuf=configure_query(query_config._replace(start=start, end=end)),
+            flatten_intervals=True,
+            normalize_sites=True,
+        ).sites
+        # Sites intersecting the window from an earlier position keep their own start, only their end is a cut
+        cuts = [pos for pos in sites["POS"] if pos >= start] + [site_end + 1 for site_end in sites["END"]]
+        cuts = [cut for cut in cuts if cut <= end]
+        if cuts:
+            return int(min(cuts))
+        start = end + 1
+        window *= 2
+    return None
+
+
+def split_vcf_configs(configs, nproc, output):
+    """Split the queries into consecutive genomic sub-ranges so that at least nproc vcf shards can be exported in
+    parallel. Shards by samples cannot be concatenated into a vcf, so the queries are split by range instead of rows.
+
+    The export trims the calls to the queried range, so a call spanning a cut would be written to both the shards as
+    two records differing from the one of the unsplit export. Each cut is moved forward to where the unsplit export
+    starts a new record instead, so that every record is written whole by the shard it starts in. Cuts with no record
+    starting after them are dropped."""
+    num_splits = -(-nproc // len(configs))
+    split_configs = []
+    for idx, config in enumerate(configs):
+        query_config = config.query_config
+        if not array_exists(config.export_config.workspace, query_config.array_name):
+            # Left to be reported by the query
+            split_configs.append(config)
+            continue
+        step = max(-(-(query_config.end - query_config.start + 1) // num_splits), 1)
+        gdb = instantiate_genomicsdb(
+            configure_export(config.export_config._replace(attributes=["REF"], filter=None)),
+            f"the vcf cuts of interval({query_config.interval})",
+        )
+        cuts = [query_config.start]
+        for cut in range(query_config.start + step, query_config.end + 1, step):
+            cut = next_vcf_cut(gdb, query_config, max(cut, cuts[-1] + 1))
+            if cut is None:
+                break
+            cuts.append(cut)
+        del gdb
+        for start, next_start in zip(cuts, cuts[1:] + [query_config.end + 1]):
+            end = next_start - 1
+            interval = f"{query_config.contig}:{start}-{end}"
+            split_query_config = query_config._replace(interval=interval, start=start, end=end)
+            split_output_config = config.output_config._replace(
+                filename=generate_output_filename(output, "vcf", interval, idx)
+            )
+            split_configs.append(Config(config.export_config, split_query_config, split_output_config))
+    return split_configs
+
+
+def concatenate_vcf_shards(configs, output, vcf_index):
+    from genomicsdb import bgzf
+
+    vcf_file = output + ".vcf.gz"
+    shards = [config.output_config.filename for config in configs if os.path.exists(config.output_config.filename)]
+    print(f"Concatenating {len(shards)} vcf shards into {vcf_file}...")
+    bgzf.concatenate(shards, vcf_file)
+    for shard in shards:
+        os.remove(shard)
+    for config in configs:
+        if os.path.exists(done_marker(config)):
+            os.remove(done_marker(config))
+    if vcf_index != "none" and bgzf.index(vcf_file, csi=vcf_index == "csi"):
+        print(f"Indexed {vcf_file}")
+
+
+# Existence of the arrays keyed by (workspace, array), checked concurrently for all the queries upfront by main() and
+# inherited by the forked query workers
+existing_arrays = {}
+
+
+def array_exists(workspace, array):
+    if (workspace, array) not in existing_arrays:
+        existing_arrays[(workspace, array)] = genomicsdb.array_exists(workspace, array)
+    return existing_arrays[(workspace, array)]
+
+
+# Prefetchers keyed by workspace, warming the arrays of the queries that follow in this process
+prefetchers = {}
+
+
+def prefetch(config):
+    workspace = config.export_config.workspace
+    prefetcher = prefetchers.get(workspace)
+    if prefetcher is None:
+        if not config.prefetch_arrays:
+            return
+        prefetcher = prefetchers[workspace] = genomicsdb.ArrayPrefetcher(workspace, len(config.prefetch_arrays))
+    # Wait for a prefetch of this array scheduled by an earlier query, so it is not fetched twice
+    prefetcher.wait(config.query_config.array_name)
+    prefetcher.prefetch(config.prefetch_arrays)
+
+
+def pool_chunksize(num_configs, processes):
+    # Same as the default chunksize of multiprocessing.Pool.map()
+    chunksize, extra = divmod(num_configs, processes * 4)
+    return chunksize + 1 if extra else chunksize
+
+
+def plan_prefetch(configs, depth, chunksize):
+    """Each process works through consecutive chunks of chunksize configs in order, so every config is planned to
+    prefetch the next depth distinct arrays of its chunk"""
+    planned = []
+    for idx, config in enumerate(configs):
+        chunk_end = (idx // chunksize + 1) * chunksize
+        arrays = []
+        for following in configs[idx + 1 : chunk_end]:
+            array = following.query_config.array_name
+            if array != config.query_config.array_name and array not in arrays:
+                arrays.append(array)
+                if len(arrays) == depth:
+                    break
+        planned.append(config._replace(prefetch_arrays=tuple(arrays)))
+    return planned
+
+
+# genomicsdb instances keyed by the export configuration, reused by the queries processed by this process. Only the
+# MAX_GDB_INSTANCES most recently used are kept, the others are released. gdb is the instance used by the last query
+MAX_GDB_INSTANCES = 4
+gdb_instances = collections.OrderedDict()
+gdb = None
+
+
 def instantiate_genomicsdb(pb_config, msg):
     logging.info("Instantiating genomicsdb to process " + msg + "...")
     gdb = genomicsdb.connect_with_protobuf(pb_config)
@@ -614,31 +853,86 @@ def instantiate_genomicsdb(pb_config, msg):
     return gdb
 
 
+def notify_retry(query_config, exception, attempt=1):
+    genomicsdb.notify_hooks(
+        genomicsdb.hook_event.RETRY,
+        array=query_config.array_name,
+        interval=query_config.interval,
+        attempt=attempt,
+        exception=exception,
+    )
+
+
+def done_marker(config):
+    return config.output_config.filename + ".done"
+
+
+def mark_done(config):
+    # Write to a temporary file and rename, so an interrupted run never leaves a marker for an incomplete output
+    marker = done_marker(config)
+    with open(marker + ".tmp", "w") as f:
+        json.dump({"interval": config.query_config.interval, "array": config.query_config.array_name}, f)
+    os.replace(marker + ".tmp", marker)
+
+
 def process(config):
+    """Process the query, retrying failed attempts with exponential backoff. Successful queries are marked done so
+    they are skipped by --resume"""
+    attempt = 0
+    while True:
+        try:
+            result = process_query(config)
+            break
+        except OSError:
+            raise
+        except Exception as e:
+            if attempt >= config.retries:
+                raise e
+            attempt += 1
+            delay = config.retry_backoff * 2 ** (attempt - 1)
+            logging.info(
+                f"Retrying interval({config.query_config.interval}) for array({config.query_config.array_name}) in "
+                f"{delay}s, attempt {attempt} of {config.retries}"
+            )
+            notify_retry(config.query_config, e, attempt)
+            gdb_instances.pop(str(config.export_config), None)
+            time.sleep(delay)
+    if result == 0:
+        mark_done(config)
+    return result
+
+
+def process_query(config):
     export_config = config.export_config
     query_config = config.query_config
     output_config = config.output_config
     msg = f"array({query_config.array_name}) for interval({query_config.interval})"
     if query_config.row_tuples:
         msg += f" and rows({query_config.row_tuples})"
-    if not genomicsdb.array_exists(export_config.workspace, query_config.array_name):
+    if not array_exists(export_config.workspace, query_config.array_name):
         logging.error(msg + f" not imported into workspace({export_config.workspace})")
         return -1
+    prefetch(config)
     global gdb
+    gdb_key = str(export_config)
     # Allow one retry to account for expired access tokens for azure URLs
     if export_config.workspace.startswith("az://"):
         allow_retry = True
     else:
         allow_retry = False
     while True:
-        try:
-            if gdb:
-                logging.info("Found gdb to process " + msg)
-            else:
-                logging.info("Starting new gdb to process " + msg)
-                gdb = instantiate_genomicsdb(configure_export(export_config), msg)
-        except NameError:
-            gdb = instantiate_genomicsdb(configure_export(export_config), msg)
+        gdb = gdb_instances.get(gdb_key)
+        if output_config.type == "vcf":
+            # The query is part of the configuration for vcf exports, so these instances cannot be reused
+            gdb = instantiate_genomicsdb(configure_vcf_export(config), msg)
+        elif gdb:
+            logging.info("Found gdb to process " + msg)
+            gdb_instances.move_to_end(gdb_key)
+        else:
+            logging.info("Starting new gdb to process " + msg)
+            gdb = gdb_instances[gdb_key] = instantiate_genomicsdb(configure_export(export_config), msg)
+            if len(gdb_instances) > MAX_GDB_INSTANCES:
+                gdb_instances.popitem(last=False)
 
         query_protobuf = configure_query(query_config)
 
@@ -653,25 +947,27 @@ def process(config):
                 with open(output_config.filename, "wb") as f:
                     f.write(json_output)
             elif output_config.type == "arrow":
-                nbytes = 0
-                writer = None
+                # pyarrow is only needed for arrow outputs, keep it out of the startup path for the other commands
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+
+                # Remove parts left over from an earlier, interrupted attempt
+                for part in glob.glob(glob.escape(output_config.filename) + "__*.parquet"):
+                    os.remove(part)
+                # Batches are coalesced to max_arrow_bytes by the query, so every batch is written to a parquet file
                 i = 0
-                for out in gdb.query_variant_calls(query_protobuf=query_protobuf, arrow_output=True, batching=True):
-                    reader = pa.ipc.open_stream(out)
-                    for batch in reader:
-                        if nbytes > output_config.max_arrow_bytes:
-                            i += 1
-                            nbytes = 0
-                            if writer:
-                                writer.close()
-                                writer = None
-                        if not writer:
-                            writer = pq.ParquetWriter(f"{output_config.filename}__{i}.parquet", batch.schema)
-                        nbytes += batch.nbytes
-                        writer.write_batch(batch)
-                    if writer:
-                        writer.close()
-                        writer = None
+                for out in gdb.query_variant_calls(
+                    query_protobuf=query_protobuf,
+                    arrow_output=True,
+                    batching=True,
+                    batch_bytes=output_config.max_arrow_bytes,
+                    max_inflight_batches=ARROW_INFLIGHT_BATCHES,
+                ):
+                    for batch in pa.ipc.open_stream(out):
+                        pq.write_table(pa.Table.from_batches([batch]), f"{output_config.filename}__{i}.parquet")
+                        i += 1
+            elif output_config.type == "vcf":
+                gdb.to_vcf(output=output_config.filename, output_format="z", overwrite=True)
             logging.info(f"Processed {msg}")
             # exit out of the loop as the query has completed
             return 0
@@ -698,18 +994,253 @@ def process(config):
                     # genomicsdb instance is functional! Probably not an expired token, so re-raise outer exception
                     if not gdb.workspace_exists(export_config.workspace):
                         logging.info(f"Retrying after workspace check with a new instance of genomicsdb for {msg}...")
-                        gdb = None
+                        notify_retry(query_config, e)
+                        gdb_instances.pop(gdb_key, None)
                         continue
                 except Exception as ex:
                     if os.environ.get("GENOMICSDB_PRINT_EXCEPTION", None):
                         logging.info(f"Exception({ex}) encountered with genomicdb workspace check")
                     logging.info(f"Retrying query with a new instance of genomicsdb for {msg}...")
-                    gdb = None
+                    notify_retry(query_config, e)
+                    gdb_instances.pop(gdb_key, None)
                     continue
             logging.critical(f"Unexpected exception while processing {msg} : {e}")
             raise e
 
 
+def process_with_stats(config):
+    result = process(config)
+    stats = {"interval": config.query_config.interval, "array": config.query_config.array_name}
+    if config.query_config.row_tuples:
+        stats["rows"] = config.query_config.row_tuples
+    stats["status"] = result
+    query_stats = gdb and gdb.last_query_stats
+    if result == 0 and query_stats:
+        stats.update(query_stats.as_dict())
+    return result, stats
+
+
+def summarize_stats(workspace, task_stats):
+    totals = {"num_tasks": len(task_stats), "timings": {}}
+    for stats in task_stats:
+        for key in ["num_calls", "num_intervals", "bytes_produced", "num_batches", "queue_wait_time"]:
+            if stats.get(key) is not None:
+                totals[key] = totals.get(key, 0) + stats[key]
+        if stats.get("peak_buffered_bytes") is not None:
+            totals["peak_buffered_bytes"] = max(totals.get("peak_buffered_bytes", 0), stats["peak_buffered_bytes"])
+        for phase, seconds in stats.get("timings", {}).items():
+            totals["timings"][phase] = totals["timings"].get(phase, 0.0) + seconds
+    return {"workspace": workspace, "totals": totals, "tasks": task_stats}
+
+
+def output_stats(stats_file, summary):
+    if stats_file == "-":
+        print(json.dumps(summary, indent=2))
+    else:
+        with open(stats_file, "w") as f:
+            json.dump(summary, f, indent=2)
+
+
+def manifest_tasks(configs):
+    return [
+        {
+            "interval": config.query_config.interval,
+            "array": config.query_config.array_name,
+            "rows": config.query_config.row_tuples,
+            "output": config.output_config.filename,
+        }
+        for config in configs
+    ]
+
+
+def plan_resume(configs, manifest_file, resume):
+    """Write the manifest of planned queries, returns the queries still to be processed. With resume, the plan has to
+    match the manifest of the earlier run and the queries marked done by it are skipped"""
+    tasks = json.loads(json.dumps(manifest_tasks(configs)))
+    if resume and os.path.exists(manifest_file):
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+        if manifest["tasks"] != tasks:
+            raise RuntimeError(
+                f"Cannot resume as the queries differ from manifest({manifest_file}). Rerun without --resume"
+            )
+        pending = [config for config in configs if not os.path.exists(done_marker(config))]
+        print(f"Resuming with {len(pending)} of {len(configs)} queries from manifest({manifest_file})")
+        return pending
+    for config in configs:
+        if os.path.exists(done_marker(config)):
+            os.remove(done_marker(config))
+    with open(manifest_file + ".tmp", "w") as f:
+        json.dump({"tasks": tasks}, f, indent=2)
+    os.replace(manifest_file + ".tmp", manifest_file)
+    return configs
+
+
+def estimate_costs(configs, callset_file):
+    """Estimated cost of each query, proportional to the number of columns times the number of rows queried"""
+    num_samples = len(parse_callset_json(callset_file))
+    costs = []
+    for config in configs:
+        query_config = config.query_config
+        if query_config.row_tuples:
+            num_rows = sum(high - low + 1 for low, high in query_config.row_tuples)
+        else:
+            num_rows = num_samples
+        costs.append((query_config.end - query_config.start + 1) * num_rows)
+    return costs
+
+
+def save_plan(plan_file, output, output_type, configs, costs):
+    # The plan is run by jobs that need not share the working directory, so the paths are stored absolute, e.g. for
+    # the callset.json/vidmap.json of cloud workspaces cached locally by setup(). URLs are kept as they are
+    normalize_path = genomicsdb_common.normalize_path
+    tasks = []
+    for config, cost in zip(configs, costs):
+        export_config = config.export_config._replace(
+            vidmap_file=normalize_path(config.export_config.vidmap_file),
+            callset_file=normalize_path(config.export_config.callset_file),
+        )
+        output_config = config.output_config._replace(filename=normalize_path(config.output_config.filename))
+        if output_config.reference_genome:
+            output_config = output_config._replace(reference_genome=normalize_path(output_config.reference_genome))
+        if output_config.vcf_header:
+            output_config = output_config._replace(vcf_header=normalize_path(output_config.vcf_header))
+        output_config = output_config._asdict()
+        if output_config["json_type"] is not None:
+            output_config["json_type"] = output_config["json_type"].name
+        tasks.append(
+            {
+                "export_config": export_config._asdict(),
+                "query_config": config.query_config._asdict(),
+                "output_config": output_config,
+                "cost": cost,
+            }
+        )
+    with open(plan_file, "w") as f:
+        json.dump({"output": normalize_path(output), "output_type": output_type, "tasks": tasks}, f, indent=2)
+
+
+def load_plan(plan_file):
+    with open(plan_file) as f:
+        plan = json.load(f)
+    configs = []
+    for task in plan["tasks"]:
+        query_config = task["query_config"]
+        if query_config["row_tuples"]:
+            query_config["row_tuples"] = [tuple(row_tuple) for row_tuple in query_config["row_tuples"]]
+        output_config = task["output_config"]
+        if output_config["json_type"] is not None:
+            output_config["json_type"] = json_output_mode[output_config["json_type"]]
+        configs.append(
+            Config(
+                GenomicsDBExportConfig(**task["export_config"]),
+                GenomicsDBQueryConfig(**query_config),
+                OutputConfig(**output_config),
+            )
+        )
+    if len(configs) == 0:
+        raise RuntimeError(f"No queries found in plan({plan_file})")
+    return plan["output"], plan["output_type"], configs, [task["cost"] for task in plan["tasks"]]
+
+
+def shard_configs(configs, costs, shard, num_shards):
+    """Returns the queries for shard(1 based) of num_shards. The queries are assigned greedily in decreasing order of
+    cost to the least loaded shard, so every job running the same plan computes the same balanced assignment"""
+    loads = [0] * num_shards
+    assignment = [0] * len(configs)
+    for idx in sorted(range(len(configs)), key=lambda idx: (-costs[idx], idx)):
+        assignment[idx] = min(range(num_shards), key=lambda k: (loads[k], k))
+        loads[assignment[idx]] += costs[idx]
+    # Keep the queries of the shard in the order of the plan
+    return [config for idx, config in enumerate(configs) if assignment[idx] == shard - 1]
+
+
+def merge_outputs(output, output_type, configs, vcf_index, contig_order):
+    pending = [config for config in configs if not os.path.exists(done_marker(config))]
+    if pending:
+        query_config = pending[0].query_config
+        raise RuntimeError(
+            f"Cannot merge as {len(pending)} of {len(configs)} queries have not completed, e.g. "
+            f"interval({query_config.interval}) for array({query_config.array_name})"
+        )
+    if output_type == "vcf":
+        concatenate_vcf_shards(configs, output, vcf_index)
+        return
+
+    from genomicsdb import merge
+
+    filenames = [config.output_config.filename for config in configs]
+    if output_type == "csv":
+        merged_file = output + ".csv"
+        merge.merge_csv(filenames, merged_file, contig_order)
+        intermediates = filenames
+    elif output_type == "json":
+        merged_file = output + ".json"
+        merge.merge_json(filenames, merged_file, configs[0].output_config.json_type)
+        intermediates = filenames
+    else:
+        parts = [
+            sorted(glob.glob(glob.escape(filename) + "__*.parquet"), key=lambda part: int(part[:-8].rsplit("__", 1)[1]))
+            for filename in filenames
+        ]
+        merged_file = output.rstrip("/") + ".parquet"
+        merge.merge_parquet(parts, merged_file, contig_order)
+        intermediates = [part for task_parts in parts for part in task_parts]
+    for intermediate in intermediates + [done_marker(config) for config in configs]:
+        if os.path.exists(intermediate):
+            os.remove(intermediate)
+    if output_type == "arrow" and os.path.isdir(output) and not os.listdir(output):
+        os.rmdir(output)
+    print(f"Merged the outputs of {len(configs)} queries into {merged_file}")
+
+
+def parse_positions_file(positions_file):
+    contigs = []
+    positions = []
+    with open(positions_file) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            fields = line.split() if any(c.isspace() for c in line) else line.split(":")
+            if len(fields) > 2:
+                raise RuntimeError(
+                    f"Position({line}) in {positions_file} is not in the <CONTIG>:<POS> format. Variant ids with "
+                    "alleles are not supported as the calls at a position are not filtered by REF/ALT"
+                )
+            if len(fields) < 2 or not fields[1].isdigit():
+                raise RuntimeError(f"Position({line}) in {positions_file} is not in the <CONTIG>:<POS> format")
+            contigs.append(fields[0])
+            positions.append(int(fields[1]))
+    return contigs, positions
+
+
+def lookup_positions(args, workspace, callset_file, vidmap_file, partitions, row_tuples, attributes):
+    from genomicsdb import lookup
+
+    if args.output_type != "csv":
+        raise RuntimeError("-P/--positions only supports -t/--output-type csv")
+    if args.filter:
+        raise RuntimeError("-f/--filter is not supported with -P/--positions")
+    contigs, positions = parse_positions_file(args.positions)
+    print(f"Starting genomicsdb_query for workspace({workspace}) to look up {len(positions)} positions")
+    if args.dryrun:
+        return
+    result = lookup.lookup_positions(
+        workspace,
+        contigs,
+        positions,
+        attributes=attributes,
+        row_ranges=row_tuples,
+        callset_file=callset_file,
+        vidmap_file=vidmap_file,
+        partitions=partitions,
+    )
+    output = check_output(args.output) + ".csv"
+    result.calls.to_csv(output, index=False)
+    print(f"Looked up {len(positions)} positions with {len(result.calls)} calls into {output}")
+
+
 def check_output(output):
     parent_dir = os.path.dirname(output)
     if parent_dir and not os.path.isdir(parent_dir):
@@ -725,14 +1256,32 @@ def check_output(output):
         return output
 
 
-def main():
-    workspace, callset_file, vidmap_file, partitions, contigs_map, intervals, row_tuples, attributes, args = setup()
-
-    if row_tuples is not None and len(row_tuples) == 0:
-        return
+def plan_queries(
+    args, workspace, callset_file, vidmap_file, partitions, contigs_map, intervals, row_tuples, attributes
+):
+    """Returns the output, output type, queries and their estimated costs read from --plan-in or planned from the
+    arguments"""
+    if args.plan_in:
+        output, output_type, configs, costs = load_plan(args.plan_in)
+        if workspace != configs[0].export_config.workspace:
+            raise RuntimeError(
+                f"plan({args.plan_in}) is for workspace({configs[0].export_config.workspace}), not {workspace}"
+            )
+        if output_type == "arrow":
+            os.makedirs(output, exist_ok=True)
+        print(
+            f"Starting genomicsdb_query for workspace({workspace}) with {len(configs)} queries from "
+            f"plan({args.plan_in})"
+        )
+        return output, output_type, configs, costs
 
     output_type = args.output_type
     output = check_output(args.output)
+    if args.daemon:
+        # The daemon does not share the working directory of this process
+        output = os.path.abspath(output)
+        callset_file = genomicsdb_common.normalize_path(callset_file)
+        vidmap_file = genomicsdb_common.normalize_path(vidmap_file)
     json_type = None
     if output_type == "json":
         json_type = parse_args_for_json_type(args.json_output_type)
@@ -741,7 +1290,19 @@ def main():
         if not os.path.exists(output):
             os.mkdir(output)
         max_arrow_bytes = parse_args_for_max_bytes(args.max_arrow_byte_size)
-        print(f"Using {args.max_arrow_byte_size} number of bytes as hint for writing out parquet files")
+        print(f"Using {args.max_arrow_byte_size} number of bytes for the arrow batches and parquet files")
+    reference_genome = None
+    vcf_header = None
+    if output_type == "vcf":
+        if not args.reference_genome:
+            raise RuntimeError("-r/--reference-genome is required with -t/--output-type vcf")
+        reference_genome = genomicsdb_common.normalize_path(args.reference_genome)
+        vcf_header = args.vcf_header or genomicsdb_common.join_paths(workspace, "vcfheader.vcf")
+        if not all(genomicsdb.is_files([reference_genome, vcf_header])):
+            raise RuntimeError(f"reference genome({reference_genome}) or vcf header({vcf_header}) not found")
+        # All the fields in the vid mapping are exported unless attributes are specified
+        if not args.attributes:
+            attributes = None
 
     print(f"Starting genomicsdb_query for workspace({workspace}) and intervals({intervals})")
 
@@ -765,6 +1326,8 @@ def main():
                 output_type,
                 json_type,
                 max_arrow_bytes,
+                reference_genome,
+                vcf_header,
             )
             configs.append(Config(export_config, query_config, output_config))
 
@@ -774,7 +1337,13 @@ def main():
 
     # Check if there is room for row_tuples to be parallelized
     chunk_size = int(args.chunk_size)
-    if row_tuples is None and len(configs) < args.nproc and chunk_size > 1:
+    if output_type == "vcf":
+        # The shards are concatenated in order, so they have to follow the genomic order of the columns
+        offsets = {contig: contig_elem["tiledb_column_offset"] for contig, contig_elem in contigs_map.items()}
+        configs.sort(key=lambda config: offsets[config.query_config.contig] + config.query_config.start)
+        if len(configs) < args.nproc:
+            configs = split_vcf_configs(configs, args.nproc, output)
+    elif row_tuples is None and len(configs) < args.nproc and chunk_size > 1:
         row_tuples = parse_callset_json_for_split_row_ranges(callset_file, chunk_size)
         if row_tuples:
             new_configs = []
@@ -800,33 +1369,101 @@ def main():
                     )
                     new_configs.append(Config(export_config, split_query_config, split_output_config))
             configs = new_configs
+    costs = estimate_costs(configs, callset_file)
+    return output, output_type, configs, costs
+
+
+def main():
+    workspace, callset_file, vidmap_file, partitions, contigs_map, intervals, row_tuples, attributes, args = setup()
+
+    if row_tuples is not None and len(row_tuples) == 0:
+        return
+
+    if args.positions:
+        return lookup_positions(args, workspace, callset_file, vidmap_file, partitions, row_tuples, attributes)
+
+    output, output_type, configs, costs = plan_queries(
+        args, workspace, callset_file, vidmap_file, partitions, contigs_map, intervals, row_tuples, attributes
+    )
+
+    if args.merge:
+        contig_order = sorted(contigs_map, key=lambda contig: contigs_map[contig]["tiledb_column_offset"])
+        merge_outputs(output, output_type, configs, args.vcf_index, contig_order)
+        return
+
+    if args.plan_out:
+        save_plan(args.plan_out, output, output_type, configs, costs)
+        print(f"Wrote plan with {len(configs)} queries to {args.plan_out}")
+        sys.exit(0)
+
+    manifest_file = output + ".manifest.json"
+    if args.shard:
+        shard, num_shards = args.shard
+        configs = shard_configs(configs, costs, shard, num_shards)
+        manifest_file = output + f".shard{shard}of{num_shards}.manifest.json"
+        print(f"Processing shard {shard}/{num_shards} with {len(configs)} queries")
 
     if args.dryrun:
-        print(f"Query configurations for {export_config}:")
+        print(f"Query configurations for {configs[0].export_config}:")
         for config in configs:
             print(config.query_config)
         sys.exit(0)
 
-    if min(len(configs), args.nproc) == 1:
+    planned_configs = configs
+    configs = plan_resume(configs, manifest_file, args.resume)
+    configs = [config._replace(retries=args.retries, retry_backoff=args.retry_backoff) for config in configs]
+
+    arrays = sorted({config.query_config.array_name for config in configs})
+    existing_arrays.update(zip([(workspace, array) for array in arrays], genomicsdb.arrays_exist(workspace, arrays)))
+
+    processes = min(len(configs), args.nproc)
+    chunksize = pool_chunksize(len(configs), processes) if processes > 1 else len(configs)
+    if args.prefetch_depth > 0:
+        if "://" not in workspace or args.no_cache:
+            logging.warning("Ignoring --prefetch-depth as prefetching only applies to cloud workspaces with caching")
+        else:
+            configs = plan_prefetch(configs, args.prefetch_depth, chunksize)
+
+    process_fn = process_with_stats if args.stats else process
+    if len(configs) == 0:
+        results = []
+    elif args.daemon:
+        from genomicsdb.scripts import genomicsdb_query_daemon
+
+        try:
+            results = genomicsdb_query_daemon.submit(args.daemon, configs, args.stats)
+        except Exception as e:
+            raise RuntimeError(f"genomicsdb_query_daemon at {args.daemon} could not process the queries: {e}")
+    elif processes == 1:
         try:
-            results = list(map(process, configs))
+            results = list(map(process_fn, configs))
         except Exception as e:
             raise RuntimeError(f"genomicsdb_query returned unexpectedly: {e}")
     else:
-        with multiprocessing.Pool(processes=min(len(configs), args.nproc)) as pool:
+        with multiprocessing.Pool(processes=processes) as pool:
             try:
-                results = list(pool.map(process, configs))
+                results = list(pool.map(process_fn, configs, chunksize=chunksize))
             except Exception as e:
                 pool.terminate()
                 pool.join()
                 raise RuntimeError(f"Terminating as a query in the multiprocessing pool returned unexpectedly: {e}")
 
+    if args.stats:
+        results, task_stats = zip(*results) if results else ([], [])
+        output_stats(args.stats, summarize_stats(workspace, list(task_stats)))
+
     msg = "successfully"
     for result in results:
         if result != 0:
             msg = "unsuccessfully for some arrays. Check output for errors"
             break
 
+    if output_type == "vcf" and msg == "successfully":
+        if args.shard:
+            print("Run with --plan-in and --merge once all the shards have completed to concatenate the vcf")
+        else:
+            concatenate_vcf_shards(planned_configs, output, args.vcf_index)
+
     print(f"genomicsdb_query for workspace({workspace}) and intervals({intervals}) completed {msg}")
 
 
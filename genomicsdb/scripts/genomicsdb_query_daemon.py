@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+
+#
+# genomicsdb_query_daemon python script
+#
+# The MIT License
+#
+# Copyright (c) 2025 dātma, inc™
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+# Keeps a pool of pre-forked genomicsdb_query workers alive between invocations. Each worker keeps its genomicsdb
+# instances, one per export configuration, so queries against the same workspace skip the interpreter startup and the
+# loading of the workspace metadata. genomicsdb_query --daemon <socket> submits its query configurations to the daemon
+# over a local unix socket.
+
+import argparse
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+from multiprocessing.connection import Client, Listener
+
+import genomicsdb
+from genomicsdb.scripts import genomicsdb_query
+
+
+def submit(socket_path, configs, stats=False):
+    """Submit the query configurations to the daemon and return the results in the order of the configurations"""
+    with Client(socket_path, family="AF_UNIX") as conn:
+        conn.send({"command": "query", "configs": configs, "stats": bool(stats)})
+        response = conn.recv()
+    if response["status"] != "ok":
+        raise RuntimeError(response["message"])
+    return response["results"]
+
+
+def send_command(socket_path, command):
+    with Client(socket_path, family="AF_UNIX") as conn:
+        conn.send({"command": command})
+        return conn.recv()
+
+
+def is_listening(socket_path):
+    try:
+        send_command(socket_path, "ping")
+        return True
+    except (ConnectionError, FileNotFoundError, EOFError):
+        return False
+
+
+def create_listener(socket_path):
+    if os.path.exists(socket_path):
+        if is_listening(socket_path):
+            raise RuntimeError(f"genomicsdb_query_daemon is already listening on {socket_path}")
+        # Stale socket from a daemon that did not exit cleanly
+        os.remove(socket_path)
+    # Only the owner can connect to the socket
+    umask = os.umask(0o177)
+    try:
+        return Listener(socket_path, family="AF_UNIX")
+    finally:
+        os.umask(umask)
+
+
+def serve_connection(conn, pool, nproc):
+    with conn:
+        try:
+            request = conn.recv()
+        except EOFError:
+            return
+        command = request.get("command")
+        if command == "query":
+            process_fn = genomicsdb_query.process_with_stats if request["stats"] else genomicsdb_query.process
+            try:
+                results = pool.map(process_fn, request["configs"])
+                conn.send({"status": "ok", "results": results})
+            except Exception as e:
+                logging.error(f"Query in the genomicsdb_query_daemon pool returned unexpectedly: {e}")
+                conn.send({"status": "error", "message": str(e)})
+        elif command == "ping":
+            conn.send({"status": "ok", "pid": os.getpid(), "nproc": nproc})
+        elif command == "shutdown":
+            conn.send({"status": "ok"})
+            os.kill(os.getpid(), signal.SIGTERM)
+        else:
+            conn.send({"status": "error", "message": f"Unknown command {command}"})
+
+
+def shutdown_handler(signum, frame):
+    raise SystemExit(0)
+
+
+def serve(socket_path, nproc):
+    listener = create_listener(socket_path)
+    pool = multiprocessing.Pool(processes=nproc)
+    signal.signal(signal.SIGTERM, shutdown_handler)
+    print(f"genomicsdb_query_daemon listening on {socket_path} with {nproc} workers", flush=True)
+    try:
+        while True:
+            conn = listener.accept()
+            threading.Thread(target=serve_connection, args=(conn, pool, nproc), daemon=True).start()
+    finally:
+        listener.close()
+        pool.terminate()
+        pool.join()
+        print(f"genomicsdb_query_daemon on {socket_path} stopped", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="query_daemon",
+        description="Keep warm genomicsdb_query workers for queries submitted with genomicsdb_query --daemon <socket>",
+        formatter_class=argparse.RawTextHelpFormatter,
+        usage="%(prog)s [options]",
+    )
+    parser.add_argument(
+        "--version",
+        action="version",
+        version=genomicsdb.version(),
+        help="print GenomicsDB native library version and exit",
+    )
+    parser.add_argument(
+        "-s",
+        "--socket",
+        required=True,
+        help="path to the unix socket the daemon listens on",
+    )
+    parser.add_argument(
+        "-n",
+        "--nproc",
+        type=genomicsdb_query.check_nproc,
+        default=8,
+        help="Optional - number of pre-forked query workers (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not use cached metadata and files with the genomicsdb queries",
+    )
+    parser.add_argument(
+        "--ping",
+        action="store_true",
+        help="check if a daemon is listening on the socket and exit",
+    )
+    parser.add_argument(
+        "--shutdown",
+        action="store_true",
+        help="stop the daemon listening on the socket and exit",
+    )
+
+    args = parser.parse_args()
+
+    socket_path = os.path.abspath(args.socket)
+    if args.ping or args.shutdown:
+        if not is_listening(socket_path):
+            raise RuntimeError(f"No genomicsdb_query_daemon listening on {socket_path}")
+        if args.shutdown:
+            send_command(socket_path, "shutdown")
+        return
+
+    if args.no_cache:
+        os.environ.pop("TILEDB_CACHE", None)
+    else:
+        os.environ["TILEDB_CACHE"] = "1"
+    serve(socket_path, args.nproc)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except RuntimeError as e:
+        logging.error(e)
+        sys.exit(1)
@@ -0,0 +1,193 @@
+#
+# genomicsdb arrow flight server
+#
+# The MIT License
+#
+# Copyright (c) 2025 dātma, inc™
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+
+"""Serve variant calls from a GenomicsDB workspace over Arrow Flight.
+
+The tickets are serialized genomicsdb.protobuf.genomicsdb_export_config_pb2.QueryConfiguration messages and the
+results are streamed as the arrow record batches imported from the batching arrow query path, encoded only once by
+Flight. This module is optional and needs pyarrow built with flight support.
+
+Example
+-------
+    server = GenomicsDBFlightServer(export_config, "grpc://localhost:8815", max_concurrent_queries=4)
+    server.serve()
+
+    # From another process
+    table = query("grpc://localhost:8815", query_config)
+"""
+
+import logging
+import queue
+import threading
+
+import pyarrow as pa
+import pyarrow.flight as flight
+
+import genomicsdb
+from genomicsdb.protobuf import genomicsdb_export_config_pb2 as query_pb
+
+
+class ConnectionPool:
+    """Pool of GenomicsDB instances for an export configuration. GenomicsDB instances cannot be shared by concurrent
+    queries, so each query checks out its own instance. At most max_size instances are created, lazily.
+    """
+
+    def __init__(self, export_config: query_pb.ExportConfiguration, max_size):
+        self.export_config = export_config
+        self.max_size = max_size
+        self._available = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._size = 0
+
+    def acquire(self, timeout=None):
+        try:
+            return self._available.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._size < self.max_size:
+                self._size += 1
+                create = True
+            else:
+                create = False
+        if create:
+            try:
+                return genomicsdb.connect_with_protobuf(self.export_config)
+            except Exception:
+                with self._lock:
+                    self._size -= 1
+                raise
+        return self._available.get(timeout=timeout)
+
+    def release(self, gdb):
+        self._available.put(gdb)
+
+    def discard(self, gdb):
+        with self._lock:
+            self._size -= 1
+
+
+class GenomicsDBFlightServer(flight.FlightServerBase):
+    """Arrow Flight server for a GenomicsDB workspace
+
+    Parameters
+    ----------
+    export_config : genomicsdb.protobuf.genomicsdb_export_config_pb2.ExportConfiguration
+        The GenomicsDB Export Configuration used to connect to the workspace
+    location : str, optional
+        Location to listen on, by default "grpc://localhost:8815"
+    max_concurrent_queries : int, optional
+        Maximum number of queries processed concurrently, by default 4. This is also the size of the connection pool
+    queue_timeout : float, optional
+        Time in seconds a query waits for a free slot before failing with FlightUnavailableError, by default 60
+    compress : str, optional
+        Compression, e.g. lz4 or zstd, used by Flight for the ipc encoding of the streamed batches, by default None
+    """
+
+    def __init__(
+        self,
+        export_config: query_pb.ExportConfiguration,
+        location="grpc://localhost:8815",
+        max_concurrent_queries=4,
+        queue_timeout=60,
+        compress=None,
+        **kwargs,
+    ):
+        super().__init__(location, **kwargs)
+        self._location = location
+        self._pool = ConnectionPool(export_config, max_concurrent_queries)
+        self._slots = threading.BoundedSemaphore(max_concurrent_queries)
+        self._queue_timeout = queue_timeout
+        self._write_options = pa.ipc.IpcWriteOptions(compression=compress)
+
+    def get_flight_info(self, context, descriptor):
+        # The schema depends on the attributes of the query and is only known once the query starts streaming
+        query_config = parse_query_config(descriptor.command)
+        endpoint = flight.FlightEndpoint(query_config.SerializeToString(), [self._location])
+        return flight.FlightInfo(pa.schema([]), descriptor, [endpoint], -1, -1)
+
+    def do_get(self, context, ticket):
+        query_config = parse_query_config(ticket.ticket)
+        if not self._slots.acquire(timeout=self._queue_timeout):
+            raise flight.FlightUnavailableError("Too many concurrent queries, try again later")
+        try:
+            gdb = self._pool.acquire(timeout=self._queue_timeout)
+        except Exception as e:
+            self._slots.release()
+            raise flight.FlightUnavailableError(f"No GenomicsDB connection available: {e}")
+
+        batches = self._stream_batches(gdb, query_config, context)
+        try:
+            first_batch = next(batches, None)
+        except Exception as e:
+            raise flight.FlightServerError(f"GenomicsDB query failed: {e}")
+        if first_batch is None:
+            return flight.RecordBatchStream(pa.schema([]).empty_table(), options=self._write_options)
+        return flight.GeneratorStream(first_batch.schema, _chain(first_batch, batches), options=self._write_options)
+
+    def _stream_batches(self, gdb, query_config, context=None):
+        healthy = False
+        batches = gdb.query_variant_calls(
+            query_protobuf=query_config, arrow_output=True, batching=True, record_batches=True
+        )
+        try:
+            for batch in batches:
+                if context is not None and context.is_cancelled():
+                    logging.info("Stopping GenomicsDB query cancelled by the client")
+                    return
+                yield batch
+            healthy = True
+        finally:
+            # Closing the query stops its producer, the remaining native batches are drained and the query thread is
+            # joined, so a stream abandoned midway, e.g. by a client disconnect, never leaves the query blocked
+            batches.close()
+            # Do not return instances to the pool if the query was aborted midway
+            if healthy:
+                self._pool.release(gdb)
+            else:
+                logging.info("Discarding GenomicsDB connection after an incomplete query")
+                self._pool.discard(gdb)
+            self._slots.release()
+
+
+def _chain(first_batch, batches):
+    yield first_batch
+    yield from batches
+
+
+def parse_query_config(serialized):
+    query_config = query_pb.QueryConfiguration()
+    try:
+        query_config.ParseFromString(serialized)
+    except Exception as e:
+        raise flight.FlightServerError(f"Ticket is not a serialized QueryConfiguration protobuf: {e}")
+    return query_config
+
+
+def query(location, query_config: query_pb.QueryConfiguration, **kwargs):
+    """Query a GenomicsDBFlightServer at location and return the results as a pyarrow Table"""
+    with flight.connect(location, **kwargs) as client:
+        return client.do_get(flight.Ticket(query_config.SerializeToString())).read_all()
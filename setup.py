@@ -129,6 +129,8 @@ genomicsdb_extension = Extension(
         run_cythonize("src/genomicsdb.pyx"),
         "src/genomicsdb_processor.cpp",
         "src/genomicsdb_processor_columnar.cpp",
+        "src/genomicsdb_processor_variants.cpp",
+        "src/genomicsdb_processor_wide.cpp",
         "src/genomicsdb_arrow_utils.cpp",
     ],
     libraries=["tiledbgenomicsdb"],
@@ -167,6 +169,8 @@ setup(
         "console_scripts": [
             "genomicsdb_query=genomicsdb.scripts.genomicsdb_query:main",
             "genomicsdb_cache=genomicsdb.scripts.genomicsdb_cache:main",
+            "genomicsdb_query_daemon=genomicsdb.scripts.genomicsdb_query_daemon:main",
+            "genomicsdb_federated_query=genomicsdb.scripts.genomicsdb_federated_query:main",
         ],
     },
     classifiers=[
@@ -32,6 +32,7 @@
 from cpython cimport PyList_New, PyObject
 from libc.stdint cimport INT64_MAX, int32_t, int64_t, uint32_t, uint64_t, uintptr_t
 from libc.stdlib cimport free, malloc
+from libcpp cimport bool as cpp_bool
 from libcpp.functional cimport function
 from libcpp.pair cimport pair
 from libcpp.string cimport string
@@ -116,7 +117,7 @@ cdef extern from "genomicsdb.h":
         GenomicsDB(string, query_config_type_t) except +
         GenomicsDB(string) except +
         GenomicsDBVariants query_variants(string, genomicsdb_ranges_t, genomicsdb_ranges_t) except +
-        GenomicsDBVariants query_variants()
+        GenomicsDBVariants query_variants() except +
 
         # query_variant_calls(const std::string& array, genomicsdb_ranges_t column_ranges=SCAN_FULL, genomicsdb_ranges_t row_ranges={});
         GenomicsDBVariantCalls query_variant_calls(string, genomicsdb_ranges_t, genomicsdb_ranges_t) except + nogil
@@ -134,37 +135,44 @@ cdef extern from "genomicsdb.h":
         #                                                                const query_config_type_t query_configuration_type);
         GenomicsDBVariantCalls query_variant_calls(GenomicsDBVariantCallProcessor, string, query_config_type_t) except + nogil
 
-        void generate_vcf(string, genomicsdb_ranges_t, genomicsdb_ranges_t, string, string, string, string, bool) except +
-        void generate_vcf(string, genomicsdb_ranges_t, genomicsdb_ranges_t, string, string, string, string) except +
-        void generate_vcf(string, genomicsdb_ranges_t, genomicsdb_ranges_t, string, string, string) except +
-        void generate_vcf(string, genomicsdb_ranges_t, genomicsdb_ranges_t, string, string) except +
-        void generate_vcf(string, genomicsdb_ranges_t, genomicsdb_ranges_t, string) except +
-        void generate_vcf(string, genomicsdb_ranges_t, genomicsdb_ranges_t) except +
-        void generate_vcf(string, string, bool) except +
-        void generate_vcf(string, string) except +
-        void generate_vcf(string) except +
-        void generate_vcf() except +
-        pass
+        void generate_vcf(string, genomicsdb_ranges_t, genomicsdb_ranges_t, string, string, string, string, cpp_bool) except + nogil
+        void generate_vcf(string, genomicsdb_ranges_t, genomicsdb_ranges_t, string, string, string, string) except + nogil
+        void generate_vcf(string, genomicsdb_ranges_t, genomicsdb_ranges_t, string, string, string) except + nogil
+        void generate_vcf(string, genomicsdb_ranges_t, genomicsdb_ranges_t, string, string) except + nogil
+        void generate_vcf(string, genomicsdb_ranges_t, genomicsdb_ranges_t, string) except + nogil
+        void generate_vcf(string, genomicsdb_ranges_t, genomicsdb_ranges_t) except + nogil
+        void generate_vcf(string, string, cpp_bool) except + nogil
+        void generate_vcf(string, string) except + nogil
+        void generate_vcf(string) except + nogil
+        void generate_vcf() except + nogil
 
 #   GenomicsDB Helper Utilities
 
-    cdef interval_t get_interval(genomicsdb_variant_t*)
-    cdef interval_t get_interval(genomicsdb_variant_call_t*)
-    cdef genomic_interval_t get_genomic_interval(genomicsdb_variant_t*)
-    cdef genomic_interval_t get_genomic_interval(genomicsdb_variant_call_t*)
-    cdef vector[genomic_field_t] get_genomic_fields(string, genomicsdb_variant_t*)
-    cdef vector[genomic_field_t] get_genomic_fields(string, genomicsdb_variant_call_t*)
-    cdef GenomicsDBVariantCalls get_variant_calls(genomicsdb_variant_t*)
-    cdef int64_t get_row(genomicsdb_variant_call_t*)
-    pass
+        interval_t get_interval(genomicsdb_variant_t*)
+        interval_t get_interval(genomicsdb_variant_call_t*)
+        genomic_interval_t get_genomic_interval(genomicsdb_variant_t*) except +
+        genomic_interval_t get_genomic_interval(genomicsdb_variant_call_t*) except +
+        vector[genomic_field_t] get_genomic_fields(string, genomicsdb_variant_t*) except +
+        vector[genomic_field_t] get_genomic_fields(string, genomicsdb_variant_call_t*) except +
+        GenomicsDBVariantCalls get_variant_calls(string, genomicsdb_variant_t*) except +
+        int64_t get_row(genomicsdb_variant_call_t*)
+        pass
 
 cdef extern from "genomicsdb_processor.h":
+    ctypedef void (*interval_hook_t)(void*, uint64_t, uint64_t, uint64_t) noexcept
+    ctypedef void (*spill_hook_t)(void*, PyObject*) noexcept
+
     cdef cppclass VariantCallProcessor(GenomicsDBVariantCallProcessor):
         VariantCallProcessor() except +
         void set_root(object)
         void process(interval_t) except +
         void process(uint32_t, genomic_interval_t, vector[genomic_field_t]) except +
         void finalize() except +
+        void set_memory_limit(uint64_t, spill_hook_t, void*)
+        uint64_t num_calls()
+        uint64_t num_intervals()
+        double process_time()
+        void set_interval_hook(interval_hook_t, void*)
         pass
 
     cdef cppclass ColumnarVariantCallProcessor(GenomicsDBVariantCallProcessor):
@@ -172,6 +180,49 @@ cdef extern from "genomicsdb_processor.h":
         void process(interval_t) except +
         void process(uint32_t, genomic_interval_t, vector[genomic_field_t]) except +
         object construct_data_frame() except +
+        void set_memory_limit(uint64_t, spill_hook_t, void*)
+        void spill() except +
+        void set_encode_gt(bool)
+        void set_normalize_sites(bool)
+        void set_interval_columns(bool)
+        object construct_sites() except +
+        uint64_t num_calls()
+        uint64_t num_intervals()
+        double process_time()
+        void set_interval_hook(interval_hook_t, void*)
+        pass
+
+    cdef cppclass WideVariantCallProcessor(GenomicsDBVariantCallProcessor):
+        WideVariantCallProcessor() except +
+        void set_row_ranges(genomicsdb_ranges_t)
+        void set_fields(vector[string])
+        void process(interval_t) except +
+        void process(uint32_t, genomic_interval_t, vector[genomic_field_t]) except +
+        object construct_sites() except +
+        object construct_samples() except +
+        object construct_field(string) except +
+        uint64_t num_calls()
+        uint64_t num_sites()
+        uint64_t num_intervals()
+        double process_time()
+        void set_interval_hook(interval_hook_t, void*)
+        pass
+
+    cdef cppclass VariantProcessor(GenomicsDBVariantCallProcessor):
+        VariantProcessor() except +
+        void query_variants(GenomicsDB*, string, genomicsdb_ranges_t, genomicsdb_ranges_t) except + nogil
+        uint64_t num_variants()
+        object construct_sites() except +
+        object construct_calls(uint64_t) except +
+        pass
+
+    cdef cppclass VariantCallCursorProcessor(GenomicsDBVariantCallProcessor):
+        VariantCallCursorProcessor() except +
+        void query_variant_calls(GenomicsDB*, string, genomicsdb_ranges_t, genomicsdb_ranges_t) except + nogil
+        uint64_t num_calls()
+        object construct_call(uint64_t) except +
+        object construct_block(uint64_t, uint64_t, vector[string]) except +
+        void release()
         pass
 
 #   Apache Arrow C data structures so we do not have to import (nano)arrow_c
@@ -249,12 +300,12 @@ cdef extern from "genomicsdb_processor.h":
 # Filesystem and other Utilities
 cdef extern from "genomicsdb_utils.h":
     cdef string c_version "genomicsdb::version"()
-    cdef bint c_is_file "genomicsdb::is_file"(string)
-    cdef ssize_t c_file_size "genomicsdb::file_size"(string)
-    cdef int c_read_entire_file "genomicsdb::read_entire_file"(string, void**, size_t*)
-    cdef bint c_workspace_exists "genomicsdb::workspace_exists"(string)
-    cdef bint c_array_exists "genomicsdb::array_exists"(string, string)
+    cdef bint c_is_file "genomicsdb::is_file"(string) except + nogil
+    cdef ssize_t c_file_size "genomicsdb::file_size"(string) except + nogil
+    cdef int c_read_entire_file "genomicsdb::read_entire_file"(string, void**, size_t*) except + nogil
+    cdef bint c_workspace_exists "genomicsdb::workspace_exists"(string) except + nogil
+    cdef bint c_array_exists "genomicsdb::array_exists"(string, string) except + nogil
     cdef vector[string] c_get_array_names "genomicsdb::get_array_names"(string)
-    cdef int c_cache_fragment_metadata "genomicsdb::cache_fragment_metadata"(string, string)
+    cdef int c_cache_fragment_metadata "genomicsdb::cache_fragment_metadata"(string, string) nogil
     pass
 
@@ -30,14 +30,19 @@
 # cython: language_level=3
 
 include "utils.pxi"
+include "spill.pxi"
 
+import os
+import queue
 import threading
+import time
+import warnings
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 
-import numpy as np
-import pandas
-import pyarrow as pa
-
+# numpy, pandas and pyarrow are imported lazily by the query paths that need them to keep the import of this module
+# and the metadata only operations fast
 from genomicsdb.protobuf import genomicsdb_export_config_pb2 as query_pb
 
 
@@ -65,6 +70,168 @@ class json_output_mode(Enum):
     SAMPLES = 4
 
 
+class QueryStats:
+    """Statistics for a query, available as last_query_stats from the GenomicsDB instance after the query
+
+    Attributes
+    ----------
+    query_type : str
+        One of by_interval, columnar, json, arrow, variants, cursor or wide
+    timings : dict
+        Wall clock time in seconds spent in each phase of the query. The phases are query(native read including
+        processor callbacks), processor(time in the processor callbacks), construct(construction of python objects),
+        arrow_export(import of the native arrow arrays) and ipc_serialization
+    num_calls : int
+        Number of variant calls processed, for variants queries the number of calls at the sites, None if not
+        tracked for the query type
+    num_intervals : int
+        Number of query intervals processed, None if not tracked for the query type
+    bytes_produced : int
+        Size of the results in bytes
+    num_batches : int
+        Number of arrow batches emitted
+    peak_buffered_bytes : int
+        Peak size of the arrow batches buffered between the native producer and the consumer
+    queue_wait_time : float
+        Time in seconds the consumer waited on the native producer, or on the read ahead thread with
+        max_inflight_batches, for arrow batches
+    """
+
+    def __init__(self, query_type):
+        self.query_type = query_type
+        self.timings = {}
+        self.num_calls = None
+        self.num_intervals = None
+        self.bytes_produced = 0
+        self.num_batches = 0
+        self.peak_buffered_bytes = 0
+        self.queue_wait_time = 0.0
+
+    def add_time(self, phase, start):
+        self.timings[phase] = self.timings.get(phase, 0.0) + time.perf_counter() - start
+
+    def as_dict(self):
+        return dict(self.__dict__, timings=dict(self.timings))
+
+    def __repr__(self):
+        return f"QueryStats({self.as_dict()})"
+
+
+class NormalizedVariantCalls(namedtuple("NormalizedVariantCalls", ["sites", "calls"])):
+    """Results of flatten_intervals queries with normalize_sites
+
+    Attributes
+    ----------
+    sites : pandas.DataFrame
+        CHR, POS, END, REF and ALT for each distinct site, indexed by the site index
+    calls : pandas.DataFrame or pyarrow.Table
+        Sample, SITE and the other fields for each call, a pyarrow Table if the results were spilled with memory_limit
+    """
+
+    def wide(self):
+        """Returns the calls as a pandas DataFrame with the site columns instead of the SITE index"""
+        import pandas
+
+        calls = self.calls if isinstance(self.calls, pandas.DataFrame) else self.calls.to_pandas()
+        wide = calls.join(self.sites, on="SITE").drop(columns="SITE")
+        columns = ["Sample", "CHR", "POS", "END", "REF", "ALT"]
+        return wide[columns + [column for column in wide.columns if column not in columns]]
+
+
+class WideVariantCalls(namedtuple("WideVariantCalls", ["sites", "samples", "fields"])):
+    """Results of query_variant_calls_wide with output="numpy"
+
+    Attributes
+    ----------
+    sites : dict
+        CHR, POS, END, REF and ALT numpy arrays with an entry per site
+    samples : list
+        Sample names in the order of the sample columns
+    fields : dict
+        numpy structured array with an entry per site and a column per sample for each of the fields
+    """
+
+
+class hook_event(Enum):
+    CONNECT = 0
+    QUERY_START = 1
+    QUERY_END = 2
+    INTERVAL = 3
+    BATCH = 4
+    RETRY = 5
+
+
+# Registered hooks keyed by hook_event. Events are only dispatched when there are hooks registered for them.
+_hooks = {}
+
+
+def register_hook(event, callback):
+    """Register a callback for tracing/profiling the native query phases.
+
+    The callback is invoked as callback(event, **info) where info depends on the event
+        CONNECT : instance, duration
+        QUERY_START : instance, query_type
+        QUERY_END : instance, query_type, stats(QueryStats for the query)
+        INTERVAL : instance, query_type, begin, end, num_calls(calls processed so far). Only dispatched for
+            by_interval and columnar queries as the native processor calls back at the start of every interval
+        BATCH : instance, query_type, batch_index, num_rows, nbytes, wait_time
+        RETRY : array, interval, attempt, exception. Dispatched by genomicsdb_query before retrying a query
+
+    Exceptions raised by callbacks are reported as warnings and do not interrupt the query.
+
+    Parameters
+    ----------
+    event : hook_event
+        Event to register the callback for
+    callback : callable
+        Callback invoked with the event and keyword arguments describing the event
+    """
+    if not isinstance(event, hook_event):
+        raise GenomicsDBException(f"Unknown hook event {event}")
+    if not callable(callback):
+        raise GenomicsDBException("Hook callback has to be callable")
+    _hooks.setdefault(event, []).append(callback)
+
+
+def unregister_hook(event, callback):
+    """Unregister a callback registered with register_hook. Unknown callbacks are ignored."""
+    callbacks = _hooks.get(event)
+    if callbacks and callback in callbacks:
+        callbacks.remove(callback)
+        if not callbacks:
+            del _hooks[event]
+
+
+def clear_hooks(event=None):
+    """Unregister all callbacks for the event or for all events if event is None."""
+    if event is None:
+        _hooks.clear()
+    else:
+        _hooks.pop(event, None)
+
+
+def has_hooks(event=None):
+    """Returns True if there are callbacks registered for the event or for any event if event is None."""
+    if event is None:
+        return bool(_hooks)
+    return event in _hooks
+
+
+def notify_hooks(event, **info):
+    """Dispatch the event to the registered callbacks, a no-op if there are none."""
+    for callback in list(_hooks.get(event, ())):
+        try:
+            callback(event, **info)
+        except Exception as e:
+            warnings.warn(f"Hook {callback} for {event} raised exception: {e}", RuntimeWarning)
+
+
+cdef void _notify_interval_hooks(void* context, uint64_t begin, uint64_t end, uint64_t num_calls) noexcept with gil:
+    instance, query_type = <object>context
+    notify_hooks(hook_event.INTERVAL, instance=instance, query_type=query_type, begin=begin, end=end,
+                 num_calls=num_calls)
+
+
 def connect(workspace,
             callset_mapping_file = "callset.json",
             vid_mapping_file = "vidmap.json",
@@ -155,10 +322,161 @@ def connect_with_json(query_json, loader_json = None):
         raise GenomicsDBException("Failed to connect to the native GenomicsDB library using json", e)
 
 
+cdef class VariantSites:
+    """Results of query_variants(), the calls grouped natively into sites(variants)
+
+    Attributes
+    ----------
+    sites : pandas.DataFrame or pyarrow.Table
+        CHR, POS, END, REF, ALT and NUM_CALLS for each site followed by the fields GenomicsDB returns for the variants.
+        A pyarrow Table with arrow_output
+    """
+    cdef VariantProcessor* _processor
+    cdef object _instance
+    cdef readonly object sites
+
+    def __cinit__(self):
+        self._processor = new VariantProcessor()
+
+    def __len__(self):
+        return self._processor.num_variants()
+
+    def calls(self, index):
+        """Variant calls at the site at index, materialized on request as a list of dictionaries with ROW, CHR, POS,
+        END and the fields of the call. ROW is the row of the sample in the callset mapping.
+        """
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("VariantSites index out of range")
+        return self._processor.construct_calls(index)
+
+    def __dealloc__(self):
+        if self._processor != NULL:
+            del self._processor
+
+
+def _as_numpy_column(column):
+    import numpy as np
+
+    if isinstance(column, np.ndarray):
+        return column
+    if column and (all(type(value) is int for value in column) or all(type(value) is float for value in column)):
+        return np.array(column)
+    # Strings, lists and fields missing for some of the calls
+    array = np.empty(len(column), dtype=object)
+    array[:] = column
+    return array
+
+
+def _as_arrow_column(column, mask_missing=True):
+    """Converts a numpy column from the processors to a pyarrow array with the missing values, None for strings, NaN
+    for floats and -99999 for integers with mask_missing, as nulls"""
+    import pyarrow as pa
+
+    if column.dtype.kind == "O":
+        return pa.array(column, type=pa.string())
+    elif column.dtype.kind == "i" and mask_missing:
+        return pa.array(column, mask=column == -99999)
+    else:
+        return pa.array(column, from_pandas=True)
+
+
+def _rebatch(batches, batch_rows=None, batch_bytes=None):
+    """Coalesces or slices the record batches to batch_rows rows and/or approximately batch_bytes bytes, the last
+    batch may be smaller. Batches are passed through as is without either.
+    """
+    if not batch_rows and not batch_bytes:
+        yield from batches
+        return
+    pending = []
+    num_rows = 0
+    nbytes = 0
+    for batch in batches:
+        row_bytes = batch.nbytes / batch.num_rows if batch.num_rows else 0
+        offset = 0
+        while offset < batch.num_rows:
+            length = batch.num_rows - offset
+            if batch_rows:
+                length = min(length, batch_rows - num_rows)
+            if batch_bytes and row_bytes:
+                length = min(length, max(1, int((batch_bytes - nbytes) // row_bytes)))
+            pending.append(batch.slice(offset, length))
+            offset += length
+            num_rows += length
+            nbytes += length * row_bytes
+            if (batch_rows and num_rows >= batch_rows) or (batch_bytes and nbytes >= batch_bytes):
+                yield _combine_batches(pending)
+                pending = []
+                num_rows = 0
+                nbytes = 0
+    if pending:
+        yield _combine_batches(pending)
+
+
+def _combine_batches(batches):
+    import pyarrow as pa
+
+    if len(batches) == 1:
+        return batches[0]
+    return pa.Table.from_batches(batches).combine_chunks().to_batches()[0]
+
+
+cdef class VariantCallCursor:
+    """Random access cursor over the results of query_variant_calls_cursor(). The calls are only materialized
+    on request, cursor[i] as a dictionary with ROW, CHR, POS, END and the fields of the call and cursor[start:stop]
+    as a block of columns, see fetch(). ROW is the row of the sample in the callset mapping.
+    """
+    cdef VariantCallCursorProcessor* _processor
+    cdef object _instance
+
+    def __cinit__(self):
+        self._processor = new VariantCallCursorProcessor()
+
+    def __len__(self):
+        return self._processor.num_calls()
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                raise ValueError("VariantCallCursor slices do not support steps")
+            return self.fetch(start, stop)
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("VariantCallCursor index out of range")
+        return self._processor.construct_call(index)
+
+    def fetch(self, start, stop, fields=None):
+        """Block of the calls in [start, stop) as a dictionary of numpy arrays with ROW, CHR, POS, END and only the
+        requested fields, all the fields of the calls if fields is None. Fields missing for some of the calls are
+        output as object arrays with None for the missing values.
+        """
+        block = self._processor.construct_block(max(start, 0), max(stop, 0), as_vector(fields))
+        return {name: _as_numpy_column(column) for name, column in block.items()}
+
+    def close(self):
+        """Release the native results, the cursor is empty afterwards"""
+        self._processor.release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __dealloc__(self):
+        if self._processor != NULL:
+            del self._processor
+
+
 cdef class _GenomicsDB:
     cdef GenomicsDB* _genomicsdb
+    cdef public object last_query_stats
 
     def __init__(self, **kwargs):
+        start = time.perf_counter()
         if 'query_protobuf' in kwargs and kwargs.get('loader_json', None) is not None:
             self._genomicsdb = new GenomicsDB(as_protobuf_string(kwargs['query_protobuf']),
                                               GENOMICSDB_PROTOBUF_BINARY_STRING,
@@ -197,6 +515,55 @@ cdef class _GenomicsDB:
                                                   as_string(vid_mapping_file),
                                                   as_vector(attributes),
                                                   segment_size)
+        if _hooks:
+            notify_hooks(hook_event.CONNECT, instance=self, duration=time.perf_counter() - start)
+
+    cdef _start_query(self, query_type):
+        self.last_query_stats = QueryStats(query_type)
+        if _hooks:
+            notify_hooks(hook_event.QUERY_START, instance=self, query_type=query_type)
+        return self.last_query_stats
+
+    cdef _end_query(self, stats):
+        if _hooks:
+            notify_hooks(hook_event.QUERY_END, instance=self, query_type=stats.query_type, stats=stats)
+
+    cdef _query_variant_calls(self,
+                              GenomicsDBVariantCallProcessor* processor,
+                              array,
+                              column_ranges,
+                              row_ranges,
+                              query_protobuf,
+                              attributes,
+                              bint release_gil):
+        cdef string configstring
+        cdef query_config_type_t config_type
+        cdef genomicsdb_ranges_t columns, rows
+        if query_protobuf and (array or column_ranges or row_ranges):
+            raise GenomicsDBException("Cannot specify query_protobuf and array/column_ranges/row_ranges together")
+        if attributes is not None:
+            query_protobuf = as_query_protobuf(array, column_ranges, row_ranges, query_protobuf, attributes)
+        if query_protobuf or array is None:
+            if query_protobuf:
+                configstring = as_protobuf_string(query_protobuf.SerializeToString())
+                config_type = GENOMICSDB_PROTOBUF_BINARY_STRING
+            else:
+                configstring = as_string("")
+                config_type = GENOMICSDB_NONE
+            if release_gil:
+                with nogil:
+                    self._genomicsdb.query_variant_calls(deref(processor), configstring, config_type)
+            else:
+                self._genomicsdb.query_variant_calls(deref(processor), configstring, config_type)
+        else:
+            configstring = as_string(array)
+            columns = scan_full() if column_ranges is None else as_ranges(column_ranges)
+            rows = as_ranges(row_ranges)
+            if release_gil:
+                with nogil:
+                    self._genomicsdb.query_variant_calls(deref(processor), configstring, columns, rows)
+            else:
+                self._genomicsdb.query_variant_calls(deref(processor), configstring, columns, rows)
 
     def query_variant_calls(self,
                             array=None,
@@ -206,29 +573,66 @@ cdef class _GenomicsDB:
                             flatten_intervals=False,
                             json_output=None,
                             arrow_output=None,
-                            # batching/compress only used with arrow_output
+                            # batching/compress/batch_rows/batch_bytes/max_inflight_batches/record_batches only used
+                            # with arrow_output
                             batching=False,
-                            compress=None):
+                            compress=None,
+                            attributes=None,
+                            # memory_limit/spill_dir only used with the by interval and flatten_intervals outputs
+                            memory_limit=None,
+                            spill_dir=None,
+                            # encode_gt/normalize_sites/interval_columns only used with flatten_intervals
+                            encode_gt=False,
+                            normalize_sites=False,
+                            batch_rows=None,
+                            batch_bytes=None,
+                            max_inflight_batches=None,
+                            interval_columns=False,
+                            record_batches=False):
         """ Query for variant calls from the GenomicsDB workspace using array, column_ranges
-        and row_ranges for subsetting
+        and row_ranges for subsetting. The attributes, if specified, override the attributes
+        the GenomicsDB instance was connected with for this query only.
+
+        With memory_limit, results buffered beyond approximately memory_limit bytes are spilled to
+        temporary arrow ipc files in spill_dir. If the results were spilled, flatten_intervals queries
+        return a memory mapped pyarrow Table with missing values as nulls instead of a pandas DataFrame
+        and by interval queries return SpilledIntervals loading the calls lazily.
+
+        With encode_gt, flatten_intervals queries output the genotypes as GT_0..GT_<ploidy-1> int16
+        columns of allele indices, with -1 for missing alleles and -2 padding calls of a lower ploidy,
+        and a GT_PHASED bool column instead of the resolved GT strings.
+
+        With normalize_sites, flatten_intervals queries return NormalizedVariantCalls with a sites
+        table holding CHR, POS, END, REF and ALT once per distinct site and the calls referencing
+        their site by the SITE index. NormalizedVariantCalls.wide() produces the usual layout.
+
+        With interval_columns, flatten_intervals queries output a COLUMN column with the begin of the
+        column range each call was returned for, to attribute the calls of queries with many column ranges.
         """
 
         if json_output is not None:
-            return self.query_variant_calls_json(array, column_ranges, row_ranges, query_protobuf, json_output)
+            return self.query_variant_calls_json(array, column_ranges, row_ranges, query_protobuf, json_output,
+                                                 attributes)
         elif arrow_output is not None:
-            return self.query_variant_calls_arrow(array, column_ranges, row_ranges, query_protobuf, batching, compress)
+            return self.query_variant_calls_arrow(array, column_ranges, row_ranges, query_protobuf, batching, compress,
+                                                  attributes, batch_rows, batch_bytes, max_inflight_batches,
+                                                  record_batches)
         elif flatten_intervals is True:
-            return self.query_variant_calls_columnar(array, column_ranges, row_ranges, query_protobuf)
+            return self.query_variant_calls_columnar(array, column_ranges, row_ranges, query_protobuf, attributes,
+                                                     memory_limit, spill_dir, encode_gt, normalize_sites,
+                                                     interval_columns)
         else:
-            return self.query_variant_calls_by_interval(array, column_ranges, row_ranges, query_protobuf)
+            return self.query_variant_calls_by_interval(array, column_ranges, row_ranges, query_protobuf, attributes,
+                                                        memory_limit, spill_dir)
 
     def query_variant_calls_json(self,
                                  array=None,
                                  column_ranges=None,
                                  row_ranges=None,
                                  query_protobuf: query_pb.QueryConfiguration = None,
-                                 json_output=json_output_mode.ALL):
-        cdef payload_mode
+                                 json_output=json_output_mode.ALL,
+                                 attributes=None):
+        cdef payload_t payload_mode
         if json_output == json_output_mode.ALL:
             payload_mode = PAYLOAD_ALL
         elif json_output == json_output_mode.ALL_BY_CALLS:
@@ -242,89 +646,188 @@ cdef class _GenomicsDB:
         else:
             raise RuntimeError("Unknown json_output_mode")
         cdef JSONVariantCallProcessor processor
-        cdef string configstring
-        cdef genomicsdb_ranges_t rows, columns
         processor.set_payload_mode(payload_mode)
-        if query_protobuf:
-            if array or column_ranges or row_ranges:
-                raise GenomicsDBException("Cannot specify query_protobuf and array/column_ranges/row_ranges together")
-            configstring = as_protobuf_string(query_protobuf.SerializeToString())
-            with nogil:
-                self._genomicsdb.query_variant_calls(processor, configstring, GENOMICSDB_PROTOBUF_BINARY_STRING)
-        elif array is None:
-            configstring = as_string("")
-            with nogil:
-                self._genomicsdb.query_variant_calls(processor, configstring, GENOMICSDB_NONE)
-        elif column_ranges is None:
-            configstring = as_string(array)
-            rows = scan_full()
-            with nogil:
-                self._genomicsdb.query_variant_calls(processor, configstring, rows)
-        elif row_ranges is None:
-            configstring = as_string(array)
-            columns = as_ranges(column_ranges)
-            with nogil:
-                self._genomicsdb.query_variant_calls(processor, configstring, columns)
-        else:
-            configstring = as_string(array)
-            columns = as_ranges(column_ranges)
-            rows = as_ranges(row_ranges)
-            with nogil:
-                self._genomicsdb.query_variant_calls(processor, configstring,
-                                                     columns, rows)
-        return processor.construct_json_output()
+        stats = self._start_query("json")
+        start = time.perf_counter()
+        self._query_variant_calls(&processor, array, column_ranges, row_ranges, query_protobuf, attributes, True)
+        stats.add_time("query", start)
+        start = time.perf_counter()
+        json_output = processor.construct_json_output()
+        stats.add_time("construct", start)
+        stats.bytes_produced = len(json_output)
+        self._end_query(stats)
+        return json_output
 
     def query_variant_calls_by_interval(self,
                                         array=None,
                                         column_ranges=None,
                                         row_ranges=None,
-                                        query_protobuf: query_pb.QueryConfiguration = None):
+                                        query_protobuf: query_pb.QueryConfiguration = None,
+                                        attributes=None,
+                                        memory_limit=None,
+                                        spill_dir=None):
         cdef list variant_calls = []
         cdef VariantCallProcessor processor
         processor.set_root(variant_calls)
-        if query_protobuf:
-            if array or column_ranges or row_ranges:
-                raise GenomicsDBException("Cannot specify query_protobuf and array/column_ranges/row_ranges together")
-            self._genomicsdb.query_variant_calls(processor, as_protobuf_string(query_protobuf.SerializeToString()),
-                                                 GENOMICSDB_PROTOBUF_BINARY_STRING)
-        elif array is None:
-            self._genomicsdb.query_variant_calls(processor, as_string(""), GENOMICSDB_NONE)
-        elif column_ranges is None:
-            self._genomicsdb.query_variant_calls(processor, as_string(array), scan_full())
-        elif row_ranges is None:
-            self._genomicsdb.query_variant_calls(processor, as_string(array), as_ranges(column_ranges))
-        else:
-            self._genomicsdb.query_variant_calls(processor, as_string(array),
-                                                 as_ranges(column_ranges),
-                                                 as_ranges(row_ranges))
+        stats = self._start_query("by_interval")
+        if hook_event.INTERVAL in _hooks:
+            hook_context = (self, stats.query_type)
+            processor.set_interval_hook(_notify_interval_hooks, <void*>hook_context)
+        spill_files = _SpillFiles(spill_dir)
+        if memory_limit:
+            processor.set_memory_limit(memory_limit, _spill_intervals, <void*>spill_files)
+        start = time.perf_counter()
+        try:
+            self._query_variant_calls(&processor, array, column_ranges, row_ranges, query_protobuf, attributes, False)
+            processor.finalize()
+        except BaseException:
+            spill_files.remove()
+            raise
+        stats.add_time("query", start)
+        stats.timings["processor"] = processor.process_time()
+        stats.num_calls = processor.num_calls()
+        stats.num_intervals = processor.num_intervals()
+        if spill_files.files:
+            start = time.perf_counter()
+            if variant_calls:
+                spill_files.spill_intervals(variant_calls)
+            spill_files.raise_if_failed()
+            variant_calls = SpilledIntervals(spill_files.load())
+            stats.add_time("construct", start)
+        self._end_query(stats)
         return variant_calls
 
     def query_variant_calls_columnar(self,
                                      array=None,
                                      column_ranges=None,
                                      row_ranges=None,
-                                     query_protobuf: query_pb.QueryConfiguration = None):
+                                     query_protobuf: query_pb.QueryConfiguration = None,
+                                     attributes=None,
+                                     memory_limit=None,
+                                     spill_dir=None,
+                                     encode_gt=False,
+                                     normalize_sites=False,
+                                     interval_columns=False):
         """ Query for variant calls from the GenomicsDB workspace using array, column_ranges and
         row_ranges for subsetting
         """
 
         cdef ColumnarVariantCallProcessor processor
-        if query_protobuf:
-            if array or column_ranges or row_ranges:
-                raise GenomicsDBException("Cannot specify query_protobuf and array/column_ranges/row_ranges together")
-            self._genomicsdb.query_variant_calls(processor, as_protobuf_string(query_protobuf.SerializeToString()),
-                                                 GENOMICSDB_PROTOBUF_BINARY_STRING)
-        elif array is None:
-            self._genomicsdb.query_variant_calls(processor, as_string(""), GENOMICSDB_NONE)
-        elif column_ranges is None:
-            self._genomicsdb.query_variant_calls(processor, as_string(array), scan_full())
-        elif row_ranges is None:
-            self._genomicsdb.query_variant_calls(processor, as_string(array), as_ranges(column_ranges))
+        processor.set_encode_gt(encode_gt)
+        processor.set_normalize_sites(normalize_sites)
+        processor.set_interval_columns(interval_columns)
+        stats = self._start_query("columnar")
+        if hook_event.INTERVAL in _hooks:
+            hook_context = (self, stats.query_type)
+            processor.set_interval_hook(_notify_interval_hooks, <void*>hook_context)
+        spill_files = _SpillFiles(spill_dir)
+        if memory_limit:
+            processor.set_memory_limit(memory_limit, _spill_columns, <void*>spill_files)
+        start = time.perf_counter()
+        try:
+            self._query_variant_calls(&processor, array, column_ranges, row_ranges, query_protobuf, attributes, False)
+        except BaseException:
+            spill_files.remove()
+            raise
+        stats.add_time("query", start)
+        stats.timings["processor"] = processor.process_time()
+        stats.num_calls = processor.num_calls()
+        stats.num_intervals = processor.num_intervals()
+        import numpy as np
+        import pandas
+
+        start = time.perf_counter()
+        if spill_files.files:
+            import pyarrow as pa
+
+            processor.spill()
+            spill_files.raise_if_failed()
+            calls = _concat_spilled_columns(spill_files.load())
+            stats.bytes_produced = calls.nbytes
+        else:
+            calls = pandas.DataFrame(processor.construct_data_frame()).replace(np.nan, '').replace(-99999, '')
+            stats.bytes_produced = int(calls.memory_usage(index=False).sum())
+        if normalize_sites:
+            sites = pandas.DataFrame(processor.construct_sites())
+            stats.bytes_produced += int(sites.memory_usage(index=False).sum())
+            calls = NormalizedVariantCalls(sites, calls)
+        stats.add_time("construct", start)
+        self._end_query(stats)
+        return calls
+
+    def query_variant_calls_wide(self,
+                                 array=None,
+                                 column_ranges=None,
+                                 row_ranges=None,
+                                 query_protobuf: query_pb.QueryConfiguration = None,
+                                 attributes=None,
+                                 fields=None,
+                                 output="arrow"):
+        """ Query for variant calls from the GenomicsDB workspace using array, column_ranges and
+        row_ranges for subsetting as a site-major(wide) matrix, with a row per site and a column per
+        sample for each of the fields(GT by default). The calls are written in place into the sample
+        columns by the processor, so there is no long to wide pivot. Sites are distinct by CHR, POS,
+        END, REF and ALT. Samples are ordered by the row ranges they are selected with and then by row,
+        samples without calls in the queried region have no columns.
+
+        With output="arrow", returns a pyarrow Table with CHR, POS, END, REF and ALT followed by a
+        <field>:<sample> column for each field and sample with missing values as nulls. With
+        output="numpy", returns WideVariantCalls with a numpy structured array per field instead.
+        The int and float fields have to be single valued, multi-valued fields like AD or PL are rejected.
+        """
+
+        cdef WideVariantCallProcessor processor
+        if output not in ("arrow", "numpy"):
+            raise GenomicsDBException(f"Unsupported output({output}) for wide queries, use arrow or numpy")
+        fields = list(fields or ["GT"])
+        processor.set_fields(as_vector(fields))
+        sample_ranges = row_ranges
+        if query_protobuf is not None and query_protobuf.query_row_ranges:
+            sample_ranges = [(row_range.low, row_range.high)
+                             for row_range in query_protobuf.query_row_ranges[0].range_list]
+        processor.set_row_ranges(as_ranges(sample_ranges))
+        stats = self._start_query("wide")
+        if hook_event.INTERVAL in _hooks:
+            hook_context = (self, stats.query_type)
+            processor.set_interval_hook(_notify_interval_hooks, <void*>hook_context)
+        start = time.perf_counter()
+        self._query_variant_calls(&processor, array, column_ranges, row_ranges, query_protobuf, attributes, False)
+        stats.add_time("query", start)
+        stats.timings["processor"] = processor.process_time()
+        stats.num_calls = processor.num_calls()
+        stats.num_intervals = processor.num_intervals()
+
+        import numpy as np
+
+        start = time.perf_counter()
+        # The columns are views over the buffers of the processor, which are freed when this returns
+        sites = processor.construct_sites()
+        samples = processor.construct_samples()
+        if output == "arrow":
+            import pyarrow as pa
+
+            # pyarrow wraps numeric numpy arrays without a copy, so the views are copied first
+            columns = {name: _as_arrow_column(np.array(column), mask_missing=False) for name, column in sites.items()}
+            for field in fields:
+                for sample, column in zip(samples, processor.construct_field(as_string(field))):
+                    columns[f"{field}:{sample}"] = _as_arrow_column(np.array(column))
+            calls = pa.table(columns)
+            stats.bytes_produced = calls.nbytes
         else:
-            self._genomicsdb.query_variant_calls(processor, as_string(array),
-                                                 as_ranges(column_ranges),
-                                                 as_ranges(row_ranges))
-        return pandas.DataFrame(processor.construct_data_frame()).replace(np.nan, '').replace(-99999, '')
+            sites = {name: np.array(column) for name, column in sites.items()}
+            matrices = {}
+            for field in fields:
+                columns = processor.construct_field(as_string(field))
+                matrix = np.empty(processor.num_sites(),
+                                  dtype=[(sample, column.dtype) for sample, column in zip(samples, columns)])
+                for sample, column in zip(samples, columns):
+                    matrix[sample] = column
+                matrices[field] = matrix
+            calls = WideVariantCalls(sites, samples, matrices)
+            stats.bytes_produced = sum(matrix.nbytes for matrix in matrices.values())
+        stats.add_time("construct", start)
+        self._end_query(stats)
+        return calls
 
     def query_variant_calls_arrow(self,
                                   array=None,
@@ -332,45 +835,46 @@ cdef class _GenomicsDB:
                                   row_ranges=None,
                                   query_protobuf: query_pb.QueryConfiguration = None,
                                   batching=False,
-                                  compress=None):
+                                  compress=None,
+                                  attributes=None,
+                                  batch_rows=None,
+                                  batch_bytes=None,
+                                  max_inflight_batches=None,
+                                  record_batches=False):
         """ Query for variant calls from the GenomicsDB workspace using array, column_ranges and
         row_ranges for subsetting
+
+        The arrow batches from the native processor are coalesced or sliced to batch_rows rows and/or
+        approximately batch_bytes bytes if specified and are serialized with the compress codec, e.g. lz4
+        or zstd. With batching and max_inflight_batches, batches are pulled from the native processor and
+        serialized by a separate thread, with at most max_inflight_batches serialized batches buffered
+        ahead of the consumer.
+
+        With record_batches, the pyarrow RecordBatches imported from the native processor are yielded as is
+        instead of being serialized to ipc streams, for consumers that encode the batches themselves.
         """
 
         cdef ArrowVariantCallProcessor processor
 
+        import pyarrow as pa
+
+        for name, value in [("batch_rows", batch_rows), ("batch_bytes", batch_bytes),
+                            ("max_inflight_batches", max_inflight_batches)]:
+            if value is not None and value <= 0:
+                raise GenomicsDBException(f"{name}({value}) has to be positive")
+        if record_batches and compress:
+            raise GenomicsDBException("compress is not supported with record_batches, the batches are not serialized")
+
         if batching:
             processor.set_batching(1)
 
+        stats = self._start_query("arrow")
+        stats.num_calls = 0
+
         def query_calls():
-            if query_protobuf:
-                if array or column_ranges or row_ranges:
-                    raise GenomicsDBException("Cannot specify query_protobuf and " +
-                                              "array/column_ranges/row_ranges together")
-                configstring = as_protobuf_string(query_protobuf.SerializeToString())
-                with nogil:
-                    self._genomicsdb.query_variant_calls(processor, configstring, GENOMICSDB_PROTOBUF_BINARY_STRING)
-            elif array is None:
-                configstring = as_string("")
-                with nogil:
-                    self._genomicsdb.query_variant_calls(processor, configstring, GENOMICSDB_NONE)
-            elif column_ranges is None:
-                configstring = as_string(array)
-                rows = scan_full()
-                with nogil:
-                    self._genomicsdb.query_variant_calls(processor, configstring, rows)
-            elif row_ranges is None:
-                configstring = as_string(array)
-                columns = as_ranges(column_ranges)
-                with nogil:
-                    self._genomicsdb.query_variant_calls(processor, configstring, columns)
-            else:
-                configstring = as_string(array)
-                columns = as_ranges(column_ranges)
-                rows = as_ranges(row_ranges)
-                with nogil:
-                    self._genomicsdb.query_variant_calls(processor, configstring,
-                                                         columns, rows)
+            start = time.perf_counter()
+            self._query_variant_calls(&processor, array, column_ranges, row_ranges, query_protobuf, attributes, True)
+            stats.add_time("query", start)
 
         if batching:
             query_thread = threading.Thread(target=query_calls)
@@ -378,36 +882,196 @@ cdef class _GenomicsDB:
         else:
             query_calls()
 
+        start = time.perf_counter()
         cdef void* arrow_schema = processor.arrow_schema()
         if arrow_schema:
             schema_capsule = pycapsule_get_arrow_schema(arrow_schema)
             schema_obj = _ArrowSchemaWrapper._import_from_c_capsule(schema_capsule)
-            schema = pa.schema(schema_obj.children_schema)
+            schema = schema_obj.arrow_schema
         else:
             raise GenomicsDBException("Failed to retrieve arrow schema for query_variant_calls()")
+        stats.add_time("arrow_export", start)
+
+        # Set when the consumer stops, the remaining native arrays are then released without importing them
+        stop = threading.Event()
+        native_wait_time = [0.0]
+        buffered_bytes = [0]
+        buffered_lock = threading.Lock()
+
+        def native_batches():
+            cdef void* arrow_array = NULL
+            while True:
+                start = time.perf_counter()
+                with nogil:
+                    arrow_array = processor.arrow_array()
+                native_wait_time[0] += time.perf_counter() - start
+                if not arrow_array:
+                    return
+                array_capsule = pycapsule_get_arrow_array(arrow_array)
+                if stop.is_set():
+                    continue
+                start = time.perf_counter()
+                array_obj = _ArrowArrayWrapper._import_from_c_capsule(schema_capsule, array_capsule)
+                batch = array_obj.record_batch(schema)
+                stats.add_time("arrow_export", start)
+                yield batch
 
-        cdef void* arrow_array = NULL
         w_opts = pa.ipc.IpcWriteOptions(allow_64bit=True, compression=compress)
-        while True:
-            try:
-                arrow_array = processor.arrow_array()
-                if arrow_array:
-                    array_capsule = pycapsule_get_arrow_array(arrow_array)
-                    array_obj = _ArrowArrayWrapper._import_from_c_capsule(schema_capsule, array_capsule)
-                    arrays = [pa.array(array_obj.child(i)) for i in range(array_obj.n_children)]
-                    batch = pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+        def serialized_batches(batches):
+            for batch in _rebatch(batches, batch_rows, batch_bytes):
+                if record_batches:
+                    output = batch
+                else:
+                    start = time.perf_counter()
                     sink = pa.BufferOutputStream()
                     writer = pa.RecordBatchStreamWriter(sink, schema, options=w_opts)
                     writer.write_batch(batch)
                     writer.close()
-                    yield sink.getvalue().to_pybytes()
+                    output = sink.getvalue().to_pybytes()
+                    stats.add_time("ipc_serialization", start)
+                with buffered_lock:
+                    buffered_bytes[0] += batch.nbytes
+                    stats.peak_buffered_bytes = max(stats.peak_buffered_bytes, buffered_bytes[0])
+                yield batch.num_rows, batch.nbytes, output
+
+        native = native_batches()
+        outputs = serialized_batches(native)
+        read_ahead = None
+        if batching and max_inflight_batches:
+            buffered = queue.Queue(max_inflight_batches)
+
+            def offer(item):
+                while not stop.is_set():
+                    try:
+                        buffered.put(item, timeout=0.1)
+                        return True
+                    except queue.Full:
+                        pass
+                return False
+
+            def read_batches():
+                try:
+                    for item in outputs:
+                        if not offer(item):
+                            break
+                    else:
+                        offer(None)
+                except Exception as e:
+                    offer(e)
+                # Run the native query to completion if the consumer stopped early
+                for _ in native:
+                    pass
+
+            read_ahead = threading.Thread(target=read_batches)
+            read_ahead.start()
+
+        try:
+            while True:
+                start = time.perf_counter()
+                if read_ahead:
+                    item = buffered.get()
+                    wait_time = time.perf_counter() - start
                 else:
+                    native_wait_time[0] = 0.0
+                    item = next(outputs, None)
+                    wait_time = native_wait_time[0]
+                if isinstance(item, Exception):
+                    raise item
+                if item is None:
                     break
-            except Exception as e:
-                raise GenomicsDBException("Exception from processing of arrow arrays", e)
+                num_rows, nbytes, output = item
+                with buffered_lock:
+                    buffered_bytes[0] -= nbytes
+                stats.queue_wait_time += wait_time
+                stats.num_calls += num_rows
+                stats.num_batches += 1
+                stats.bytes_produced += nbytes if record_batches else len(output)
+                if _hooks:
+                    notify_hooks(hook_event.BATCH, instance=self, query_type=stats.query_type,
+                                 batch_index=stats.num_batches - 1, num_rows=num_rows, nbytes=nbytes,
+                                 wait_time=wait_time)
+                yield output
+        except Exception as e:
+            raise GenomicsDBException("Exception from processing of arrow arrays", e)
+        finally:
+            stop.set()
+            if read_ahead:
+                read_ahead.join()
+            else:
+                for _ in native:
+                    pass
+            if batching:
+                query_thread.join()
 
-        if batching:
-            query_thread.join()
+        self._end_query(stats)
+
+    def query_variant_calls_cursor(self,
+                                   array,
+                                   column_ranges=None,
+                                   row_ranges=None):
+        """ Query for variant calls from the GenomicsDB workspace using array, column_ranges and
+        row_ranges for subsetting without a processor. Returns a VariantCallCursor pulling the calls
+        or blocks of columns from the native results on request.
+        """
+
+        cdef VariantCallCursor cursor = VariantCallCursor()
+        cdef VariantCallCursorProcessor* processor = cursor._processor
+        cdef string array_name = as_string(array)
+        cdef genomicsdb_ranges_t columns = scan_full() if column_ranges is None else as_ranges(column_ranges)
+        cdef genomicsdb_ranges_t rows = as_ranges(row_ranges)
+        # The calls reference the results of the native GenomicsDB instance
+        cursor._instance = self
+        stats = self._start_query("cursor")
+        start = time.perf_counter()
+        with nogil:
+            processor.query_variant_calls(self._genomicsdb, array_name, columns, rows)
+        stats.add_time("query", start)
+        stats.num_calls = processor.num_calls()
+        self._end_query(stats)
+        return cursor
+
+    def query_variants(self,
+                       array,
+                       column_ranges=None,
+                       row_ranges=None,
+                       arrow_output=False):
+        """ Query for the variants(sites) from the GenomicsDB workspace using array, column_ranges and
+        row_ranges for subsetting. Calls are grouped into sites by the native library, so site centric
+        queries do not have to pull and group all the calls. Returns VariantSites with the sites as a
+        pandas DataFrame, or a pyarrow Table with arrow_output, and the calls at a site available lazily
+        from VariantSites.calls().
+        """
+
+        cdef VariantSites variants = VariantSites()
+        cdef VariantProcessor* processor = variants._processor
+        cdef string array_name = as_string(array)
+        cdef genomicsdb_ranges_t columns = scan_full() if column_ranges is None else as_ranges(column_ranges)
+        cdef genomicsdb_ranges_t rows = as_ranges(row_ranges)
+        # The variants reference the results of the native GenomicsDB instance
+        variants._instance = self
+        stats = self._start_query("variants")
+        start = time.perf_counter()
+        with nogil:
+            processor.query_variants(self._genomicsdb, array_name, columns, rows)
+        stats.add_time("query", start)
+
+        start = time.perf_counter()
+        sites = processor.construct_sites()
+        stats.num_calls = int(sites["NUM_CALLS"].sum())
+        if arrow_output:
+            import pyarrow as pa
+
+            variants.sites = pa.table(sites)
+            stats.bytes_produced = variants.sites.nbytes
+        else:
+            import pandas
+
+            variants.sites = pandas.DataFrame(sites)
+            stats.bytes_produced = int(variants.sites.memory_usage(index=False).sum())
+        stats.add_time("construct", start)
+        self._end_query(stats)
+        return variants
 
     def to_vcf(self,
                array=None,
@@ -418,25 +1082,93 @@ cdef class _GenomicsDB:
                output=None,
                output_format=None,
                overwrite=False):
-        """ Generate vcf from the GenomicsDB workspace using array, column_ranges and row_ranges for subsetting """
+        """ Generate vcf from the GenomicsDB workspace using array, column_ranges and row_ranges for subsetting. The
+        GIL is released while the vcf is generated, so exports of different ranges can run concurrently from threads.
+        """
 
-        if output is None:
-            output = ""
-        if output_format is None:
-            output_format = ""
+        cdef string c_output = as_string("" if output is None else output)
+        cdef string c_output_format = as_string("" if output_format is None else output_format)
+        cdef cpp_bool c_overwrite = overwrite
+        cdef string c_array, c_reference_genome, c_vcf_header
+        cdef genomicsdb_ranges_t columns, rows
         if array is None:
-            self._genomicsdb.generate_vcf(as_string(output),
-                                          as_string(output_format),
-                                          overwrite)
+            with nogil:
+                self._genomicsdb.generate_vcf(c_output, c_output_format, c_overwrite)
         else:
-            self._genomicsdb.generate_vcf(as_string(array),
-                                          as_ranges(column_ranges),
-                                          as_ranges(row_ranges),
-                                          as_string(reference_genome),
-                                          as_string(vcf_header),
-                                          as_string(output),
-                                          as_string(output_format),
-                                          overwrite)
+            c_array = as_string(array)
+            columns = as_ranges(column_ranges)
+            rows = as_ranges(row_ranges)
+            c_reference_genome = as_string(reference_genome)
+            c_vcf_header = as_string(vcf_header)
+            with nogil:
+                self._genomicsdb.generate_vcf(c_array, columns, rows, c_reference_genome, c_vcf_header, c_output,
+                                              c_output_format, c_overwrite)
+
+    def to_vcf_stream(self,
+                      array=None,
+                      column_ranges=None,
+                      row_ranges=None,
+                      reference_genome=None,
+                      vcf_header=None,
+                      output_format=None,
+                      chunk_size=65536):
+        """ Generate vcf like to_vcf(), but yield the output as chunks of bytes instead of writing it to a file.
+
+        The native writer runs in a background thread and writes into a fifo that is read as chunks are requested, so
+        the writer blocks while the consumer is busy and the output is never buffered in full. The chunks are vcf text
+        for the default output_format and BGZF blocks for output_format="z", ready to be sent to a socket, an http
+        response or any other sink. Closing the generator early stops the export.
+
+        Parameters
+        ----------
+        array, column_ranges, row_ranges, reference_genome, vcf_header, output_format
+            See to_vcf()
+        chunk_size : int, optional
+            Maximum size of the chunks, by default 65536
+
+        Yields
+        ------
+        bytes
+            Consecutive chunks of the vcf output
+        """
+
+        fifo_dir = tempfile.mkdtemp(prefix="genomicsdb_vcf_")
+        fifo = os.path.join(fifo_dir, "output")
+        os.mkfifo(fifo)
+        # An extra write end keeps reads from returning EOF before the native writer opens the fifo. It is closed once
+        # the writer is done, successfully or not, so the reader always sees EOF after the last chunk
+        read_fd = os.open(fifo, os.O_RDONLY | os.O_NONBLOCK)
+        write_fd = os.open(fifo, os.O_WRONLY | os.O_NONBLOCK)
+        os.set_blocking(read_fd, True)
+        errors = []
+
+        def generate():
+            try:
+                self.to_vcf(array, column_ranges, row_ranges, reference_genome, vcf_header, fifo, output_format, True)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                os.close(write_fd)
+
+        writer = threading.Thread(target=generate, name="genomicsdb_vcf_stream", daemon=True)
+        writer.start()
+        try:
+            while True:
+                chunk = os.read(read_fd, chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            # Writes fail with EPIPE once the read end is closed, which ends an export abandoned by the consumer. A
+            # writer that has yet to open the fifo is blocked until there is a reader, so briefly reopen the read end
+            os.close(read_fd)
+            while writer.is_alive():
+                os.close(os.open(fifo, os.O_RDONLY | os.O_NONBLOCK))
+                writer.join(0.1)
+            os.remove(fifo)
+            os.rmdir(fifo_dir)
+        if errors:
+            raise errors[0]
 
     def __dealloc__(self):
         if self._genomicsdb != NULL:
@@ -444,6 +1176,20 @@ cdef class _GenomicsDB:
 
 
 # Filesystem Utilities
+# The native filesystem calls release the GIL, so the batched versions check or fetch the paths concurrently from a
+# pool of threads. On cloud URIs, each call is at least one network round trip.
+
+# Default number of threads for the batched filesystem utilities
+max_filesystem_workers = 16
+
+
+def _map_concurrently(fn, items, max_workers):
+    items = list(items)
+    if len(items) <= 1:
+        return [fn(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(len(items), max_workers or max_filesystem_workers)) as executor:
+        return list(executor.map(fn, items))
+
 
 def is_file(filename):
     """
@@ -457,7 +1203,28 @@ def is_file(filename):
     -------
     true/false
     """
-    return c_is_file(as_string(filename))
+    cdef string c_filename = as_string(filename)
+    cdef bint exists
+    with nogil:
+        exists = c_is_file(c_filename)
+    return exists
+
+
+def is_files(filenames, max_workers=None):
+    """
+    Check concurrently if the given filenames(local or cloud URIs) exist as files
+
+    Parameters
+    ----------
+    filenames : list of str
+    max_workers : int, optional
+        Number of concurrent checks, by default max_filesystem_workers
+
+    Returns
+    -------
+    list of true/false in the order of filenames
+    """
+    return _map_concurrently(is_file, filenames, max_workers)
 
 
 def file_size(filename):
@@ -472,39 +1239,232 @@ def file_size(filename):
     -------
     size or -1 if file is not found
     """
-    return c_file_size(as_string(filename))
+    cdef string c_filename = as_string(filename)
+    cdef ssize_t size
+    with nogil:
+        size = c_file_size(c_filename)
+    return size
 
 
-def read_entire_file(filename):
+def file_sizes(filenames, max_workers=None):
     """
-    Retrieve the contents of the file referenced by filename(local or cloud URI). Use with relatively small, text files
+    Get concurrently the sizes of the files referenced by filenames(local or cloud URIs)
+
+    Parameters
+    ----------
+    filenames : list of str
+    max_workers : int, optional
+        Number of concurrent requests, by default max_filesystem_workers
+
+    Returns
+    -------
+    list of sizes, -1 for files not found, in the order of filenames
+    """
+    return _map_concurrently(file_size, filenames, max_workers)
+
+
+cdef class _NativeBuffer:
+    """Exposes a buffer allocated by the native library through the buffer protocol and frees it once released"""
+    cdef char* _data
+    cdef Py_ssize_t _length
+
+    def __getbuffer__(self, Py_buffer* buffer, int flags):
+        PyBuffer_FillInfo(buffer, self, self._data, self._length, 1, flags)
+
+    def __releasebuffer__(self, Py_buffer* buffer):
+        pass
+
+    def __dealloc__(self):
+        free(self._data)
+
+
+cdef _NativeBuffer _read_native(filename):
+    cdef string c_filename = as_string(filename)
+    cdef char* contents = NULL
+    cdef size_t length
+    cdef int p
+    with nogil:
+        p = c_read_entire_file(c_filename, <void**>&contents, &length)
+    if p != 0:
+        return None
+    cdef _NativeBuffer buffer = _NativeBuffer()
+    buffer._data = contents
+    buffer._length = length
+    return buffer
+
+
+def read_entire_file(filename, decode=True):
+    """
+    Retrieve the contents of the file referenced by filename(local or cloud URI). Use with relatively small files
 
     Parameters
     ----------
     filename : str
+    decode : bool, optional
+        Decode the contents with utf-8, by default True. Otherwise the contents are returned as bytes
 
     Returns
     -------
     contents of file decoded with utf-8 if the file could be found and read, otherwise return None
 
     """
-    cdef char* contents = NULL
-    cdef size_t length
-    cdef int p = c_read_entire_file(as_string(filename), <void**>&contents, &length)
-    if p == 0:
-        contents_string = contents.decode("utf-8")
-        free(contents)
-        return contents_string
+    buffer = _read_native(filename)
+    if buffer is not None:
+        if decode:
+            return str(memoryview(buffer), "utf-8")
+        return bytes(memoryview(buffer))
+
+
+def read_entire_files(filenames, decode=True, max_workers=None):
+    """
+    Retrieve concurrently the contents of the files referenced by filenames(local or cloud URIs)
+
+    Parameters
+    ----------
+    filenames : list of str
+    decode : bool, optional
+        Decode the contents with utf-8, by default True. Otherwise the contents are returned as bytes
+    max_workers : int, optional
+        Number of concurrent reads, by default max_filesystem_workers
+
+    Returns
+    -------
+    list of contents, None for files that could not be found or read, in the order of filenames
+    """
+    return _map_concurrently(lambda filename: read_entire_file(filename, decode), filenames, max_workers)
+
+
+def read_range(filename, offset, length=None):
+    """
+    Retrieve length bytes starting at offset from the file referenced by filename(local or cloud URI), or the bytes
+    until the end of the file if length is None
+
+    Local files are read with a positional read of just the range. The native library does not expose ranged reads
+    for cloud URIs, so these are read natively in their entirety and the range is returned without a copy.
+
+    Parameters
+    ----------
+    filename : str
+    offset : int
+    length : int, optional
+
+    Returns
+    -------
+    bytes for local files or a memoryview over the native buffer for cloud URIs, None if the file could not be found
+    or read. Fewer than length bytes are returned if the range extends past the end of the file
+    """
+    if offset < 0 or (length is not None and length < 0):
+        raise ValueError("offset and length cannot be negative")
+    if "://" not in filename or filename.startswith("file://"):
+        path = filename[len("file://"):] if filename.startswith("file://") else filename
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return None
+        try:
+            if length is None:
+                length = max(os.fstat(fd).st_size - offset, 0)
+            return os.pread(fd, length, offset)
+        finally:
+            os.close(fd)
+    buffer = _read_native(filename)
+    if buffer is not None:
+        contents = memoryview(buffer)
+        return contents[offset:] if length is None else contents[offset:offset + length]
 
 
 def workspace_exists(workspace):
-    return c_workspace_exists(as_string(workspace))
+    cdef string c_workspace = as_string(workspace)
+    cdef bint exists
+    with nogil:
+        exists = c_workspace_exists(c_workspace)
+    return exists
+
+
+def workspaces_exist(workspaces, max_workers=None):
+    """Check concurrently if the given workspaces exist, returns a list of true/false in the order of workspaces"""
+    return _map_concurrently(workspace_exists, workspaces, max_workers)
 
 
 def array_exists(workspace, array):
-    return c_array_exists(as_string(workspace), as_string(array))
+    cdef string c_workspace = as_string(workspace)
+    cdef string c_array = as_string(array)
+    cdef bint exists
+    with nogil:
+        exists = c_array_exists(c_workspace, c_array)
+    return exists
+
+
+def arrays_exist(workspace, arrays, max_workers=None):
+    """Check concurrently if the given arrays exist in the workspace, returns a list of true/false in the order of
+    arrays"""
+    return _map_concurrently(lambda array: array_exists(workspace, array), arrays, max_workers)
 
 
 def cache_array_metadata(workspace, array):
-    if c_cache_fragment_metadata(as_string(workspace), as_string(array)) != 0:
-        print(f"Could not cache fragment metadata for array={array.decode()} in {workspace}")
+    """Cache the fragment metadata of the array locally, returns True if successful. The cache is used by queries when
+    the TILEDB_CACHE environment variable is set"""
+    cdef string c_workspace = as_string(workspace)
+    cdef string c_array = as_string(array)
+    cdef int rc
+    with nogil:
+        rc = c_cache_fragment_metadata(c_workspace, c_array)
+    if rc != 0:
+        print(f"Could not cache fragment metadata for array={array} in {workspace}")
+    return rc == 0
+
+
+class ArrayPrefetcher:
+    """
+    Caches the fragment metadata of arrays from background threads ahead of their queries, so the latency of fetching
+    the metadata from object stores is hidden behind the processing of the arrays before them. Needs TILEDB_CACHE to
+    be set for the queries to pick up the cached metadata.
+
+    Parameters
+    ----------
+    workspace : str
+    max_workers : int, optional
+        Number of arrays prefetched concurrently, by default 1
+    """
+
+    def __init__(self, workspace, max_workers=1):
+        self.workspace = workspace
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="genomicsdb_prefetch")
+        self._futures = {}
+
+    def prefetch(self, arrays):
+        """Schedule the arrays for prefetching, arrays already scheduled are skipped"""
+        for array in arrays:
+            if array not in self._futures:
+                self._futures[array] = self._executor.submit(cache_array_metadata, self.workspace, array)
+
+    def wait(self, array):
+        """Wait for the prefetch of array if one was scheduled, returns True if the metadata was cached"""
+        future = self._futures.get(array)
+        return future.result() if future else False
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def prefetch_arrays(workspace, arrays, depth=1):
+    """
+    Iterate over arrays, prefetching the metadata of the next depth arrays while the current one is processed
+
+    Example
+    -------
+        for array in genomicsdb.prefetch_arrays(workspace, arrays, depth=2):
+            gdb.query_variant_calls(array=array, ...)
+    """
+    arrays = list(arrays)
+    with ArrayPrefetcher(workspace, max(depth, 1)) as prefetcher:
+        for idx, array in enumerate(arrays):
+            prefetcher.wait(array)
+            prefetcher.prefetch(arrays[idx + 1:idx + 1 + depth])
+            yield array
@@ -47,8 +47,18 @@ void VariantCallProcessor::set_root(PyObject *intervals_list) {
 }
 
 void VariantCallProcessor::process(const interval_t& interval) {
+  auto start = std::chrono::steady_clock::now();
   finalize_interval();
   _current_interval = interval;
+  _num_intervals++;
+  _process_time += std::chrono::steady_clock::now() - start;
+  if (_memory_limit && _buffered_bytes >= _memory_limit && _intervals_list) {
+    _spill_hook(_spill_hook_context, _intervals_list);
+    _buffered_bytes = 0;
+  }
+  if (_interval_hook) {
+    _interval_hook(_interval_hook_context, interval.first, interval.second, _num_calls);
+  }
 }
 
 void VariantCallProcessor::initialize_interval() {
@@ -79,10 +89,36 @@ PyObject* wrap_field(genomic_field_t field, genomic_field_type_t field_type, uin
   return py_object;
 }
 
+// Rough estimate of the memory used by the python objects for a call, only used to decide when to spill
+static uint64_t estimated_size(const std::string& sample_name,
+                               const genomic_interval_t& genomic_interval,
+                               const std::vector<genomic_field_t>& fields) {
+  const uint64_t py_object_size = 64;
+  uint64_t size = sizeof(PyDictObject) + 3*py_object_size + sample_name.size() + genomic_interval.contig_name.size();
+  for (auto& field: fields) {
+    size += py_object_size*(field.num_elements+1);
+  }
+  return size;
+}
+
+// Calls at the same site share the python strings for CHR, REF and ALT instead of materializing them per sample
+PyObject* VariantCallProcessor::site_value(const std::string& name, const std::string& value) {
+  auto& cached = _site_values[name];
+  if (!cached.second || cached.first != value) {
+    Py_XDECREF(cached.second);
+    cached = std::make_pair(value, PyUnicode_FromString(value.c_str()));
+  }
+  Py_INCREF(cached.second);
+  return cached.second;
+}
+
 int VariantCallProcessor::wrap_fields(PyObject* call, std::vector<genomic_field_t> fields) {
   int rc = 0;
   for (auto field: fields) {
-    if (field.num_elements == 1 || get_genomic_field_type(field.name).is_string()) {
+    if (field.name == "REF" || field.name == "ALT") {
+      rc = rc || PyDict_SetItem(call, PyUnicode_FromString(field.name.c_str()),
+                                site_value(field.name, field.to_string(get_genomic_field_type(field.name))));
+    } else if (field.num_elements == 1 || get_genomic_field_type(field.name).is_string()) {
       rc = rc || PyDict_SetItem(call, PyUnicode_FromString(field.name.c_str()), wrap_field(field, get_genomic_field_type(field.name), 0));
     } else if (field.name.compare("GT") == 0) {
       // Treat genotypes separately
@@ -103,10 +139,11 @@ void VariantCallProcessor::process(const std::string& sample_name,
                const genomic_interval_t& genomic_interval,
                const std::vector<genomic_field_t>& fields) {
   errno = 0;
+  auto start = std::chrono::steady_clock::now();
   PyObject *call = PyDict_New();
   if (call) {
     int rc = PyDict_SetItem(call, PyUnicode_FromString("Sample"), PyUnicode_FromString(sample_name.c_str())) ||
-        PyDict_SetItem(call, PyUnicode_FromString("CHR"), PyUnicode_FromString(genomic_interval.contig_name.c_str())) ||
+        PyDict_SetItem(call, PyUnicode_FromString("CHR"), site_value("CHR", genomic_interval.contig_name)) ||
         PyDict_SetItem(call, PyUnicode_FromString("POS"), PyLong_FromLong(genomic_interval.interval.first)) ||
         wrap_fields(call, fields);
     if (rc ) {
@@ -120,6 +157,11 @@ void VariantCallProcessor::process(const std::string& sample_name,
     
     // Decrement refcount as PyList_Append does not steal the reference from call
     Py_DECREF(call);
+    _num_calls++;
+    if (_memory_limit) {
+      _buffered_bytes += estimated_size(sample_name, genomic_interval, fields);
+    }
+    _process_time += std::chrono::steady_clock::now() - start;
   } else {
     THROW_GENOMICSDB_EXCEPTION("Could not instantiate Python Dictionary for calls");
   }
@@ -37,10 +37,12 @@
 #include "genomicsdb.h"
 
 #include <algorithm>
+#include <chrono>
 #include <cstring>
 #include <iostream>
 #include <cmath>
 #include <semaphore>
+#include <unordered_map>
 
 #include <Python.h>
 
@@ -61,6 +63,14 @@ do {                                                         \
   } while (false)
 
 
+// Optional hook invoked natively at the start of every query interval with the interval's column range and the number
+// of calls processed so far. Only set when a python hook is registered, so processors never call back otherwise.
+typedef void (*interval_hook_t)(void* context, uint64_t begin, uint64_t end, uint64_t num_calls);
+
+// Optional hook invoked when the data buffered by a processor exceeds its memory limit, so the data can be spilled to
+// disk. The buffered data is released by the processor after the hook returns.
+typedef void (*spill_hook_t)(void* context, PyObject* data);
+
 class VariantCallProcessor : public GenomicsDBVariantCallProcessor {
  public:
   VariantCallProcessor();
@@ -72,13 +82,66 @@ class VariantCallProcessor : public GenomicsDBVariantCallProcessor {
                const int64_t* coordinates,
                const genomic_interval_t& genomic_interval,
                const std::vector<genomic_field_t>& genomic_fields);
+  // Statistics for the query
+  uint64_t num_calls() { return _num_calls; }
+  uint64_t num_intervals() { return _num_intervals; }
+  double process_time() { return _process_time.count(); }
+  void set_interval_hook(interval_hook_t hook, void* context) {
+    _interval_hook = hook;
+    _interval_hook_context = context;
+  }
+  // Completed intervals are handed over to the spill hook, which is expected to empty the root list, once the
+  // estimated size of the buffered calls exceeds memory_limit bytes
+  void set_memory_limit(uint64_t memory_limit, spill_hook_t hook, void* context) {
+    _memory_limit = memory_limit;
+    _spill_hook = hook;
+    _spill_hook_context = context;
+  }
+  void finalize() {
+    finalize_interval();
+  }
  private:
   void initialize_interval();
   void finalize_interval();
   int wrap_fields(PyObject* dict, std::vector<genomic_field_t> fields);
+  PyObject* site_value(const std::string& name, const std::string& value);
+  std::map<std::string, std::pair<std::string, PyObject*>> _site_values;
   interval_t _current_interval;
   PyObject* _current_calls_list = NULL;
   PyObject* _intervals_list = NULL;
+  uint64_t _num_calls = 0;
+  uint64_t _num_intervals = 0;
+  std::chrono::duration<double> _process_time{0};
+  interval_hook_t _interval_hook = NULL;
+  void* _interval_hook_context = NULL;
+  uint64_t _memory_limit = 0;
+  uint64_t _buffered_bytes = 0;
+  spill_hook_t _spill_hook = NULL;
+  void* _spill_hook_context = NULL;
+};
+
+#define GT_MISSING_ALLELE -1
+#define GT_PADDING -2
+
+// Distinct sites, keyed by contig, interval, REF and ALT, with their CHR, POS, END, REF and ALT. Shared by the
+// processors that output every site once and reference it from the calls. The python strings of the sites are owned
+// by the index until release()
+class SiteIndex {
+ public:
+  int64_t site_id(const genomic_interval_t& genomic_interval, const std::vector<genomic_field_t>& genomic_fields,
+                  const std::map<std::string, genomic_field_type_t>& genomic_field_types);
+  uint64_t size() { return m_pos.size(); }
+  // CHR, POS, END, REF and ALT for each of the sites as numpy arrays, views over the index
+  PyObject* construct_sites();
+  void release();
+
+ private:
+  std::unordered_map<std::string, int64_t> m_ids;
+  std::vector<PyObject *> m_chrom;
+  std::vector<uint64_t> m_pos;
+  std::vector<uint64_t> m_end;
+  std::vector<PyObject *> m_ref;
+  std::vector<PyObject *> m_alt;
 };
 
 class ColumnarVariantCallProcessor : public GenomicsDBVariantCallProcessor {
@@ -95,32 +158,74 @@ class ColumnarVariantCallProcessor : public GenomicsDBVariantCallProcessor {
   void process_str_field(const std::string& field_name, PyObject *calls, int dims, npy_intp *sizes) {
     auto found = std::find(m_field_names.begin(), m_field_names.end(), field_name);
     if (found != m_field_names.end()) {
-        PyDict_SetItem(calls, PyUnicode_FromString(field_name.c_str()),
-                       PyArray_SimpleNewFromData(dims, sizes, NPY_OBJECT, m_string_fields[field_name].data()));
+        set_column(calls, field_name, PyArray_SimpleNewFromData(dims, sizes, NPY_OBJECT, m_string_fields[field_name].data()));
+    }
+  }
+  // The numpy arrays are views over the buffered columns and are only valid until the columns are released
+  static void set_column(PyObject *calls, const std::string& field_name, PyObject *column) {
+    PyObject *key = PyUnicode_FromString(field_name.c_str());
+    PyDict_SetItem(calls, key, column);
+    Py_DECREF(key);
+    Py_DECREF(column);
+  }
+  // Encoded genotypes are output as GT_0..GT_<max ploidy-1> int16 columns of allele indices and a GT_PHASED bool
+  // column. Missing alleles are GT_MISSING_ALLELE and calls with a lower ploidy are padded with GT_PADDING
+  void process_encoded_gt(PyObject *calls, int dims, npy_intp *sizes) {
+    if (std::find(m_field_names.begin(), m_field_names.end(), "GT") == m_field_names.end()) {
+      return;
+    }
+    std::vector<int16_t*> alleles;
+    for (auto i=0; i<std::max(m_max_ploidy, (uint8_t)1); i++) {
+      PyObject *column = PyArray_SimpleNew(dims, sizes, NPY_INT16);
+      alleles.push_back(static_cast<int16_t*>(PyArray_DATA(reinterpret_cast<PyArrayObject*>(column))));
+      set_column(calls, "GT_" + std::to_string(i), column);
+    }
+    auto offset = 0ul;
+    for (auto call=0ul; call<m_gt_ploidy.size(); call++) {
+      auto ploidy = m_gt_ploidy[call];
+      for (auto i=0ul; i<alleles.size(); i++) {
+        if (i < ploidy) {
+          alleles[i][call] = m_gt_alleles[offset+i];
+        } else {
+          alleles[i][call] = ploidy ? GT_PADDING : GT_MISSING_ALLELE;
+        }
+      }
+      offset += ploidy;
     }
+    PyObject *phased = PyArray_SimpleNew(dims, sizes, NPY_BOOL);
+    std::copy(m_gt_phased.begin(), m_gt_phased.end(), static_cast<npy_bool*>(PyArray_DATA(reinterpret_cast<PyArrayObject*>(phased))));
+    set_column(calls, "GT_PHASED", phased);
   }
   PyObject* construct_data_frame() {
     int dims = 1;
     npy_intp sizes[1] = { static_cast<npy_intp>(m_sample_names.size()) };
     PyObject *calls = PyDict_New();
-    PyDict_SetItem(calls, PyUnicode_FromString("Sample"), PyArray_SimpleNewFromData(dims, sizes, NPY_OBJECT, m_sample_names.data()));
-    PyDict_SetItem(calls, PyUnicode_FromString("CHR"), PyArray_SimpleNewFromData(dims, sizes, NPY_OBJECT, m_chrom.data()));
-    PyDict_SetItem(calls, PyUnicode_FromString("POS"), PyArray_SimpleNewFromData(dims, sizes, NPY_INT64, m_pos.data()));
-    // Process REF, ALT and GT first.
-    process_str_field("REF", calls, dims, sizes);
-    process_str_field("ALT", calls, dims, sizes);
-    process_str_field("GT", calls, dims, sizes);
+    set_column(calls, "Sample", PyArray_SimpleNewFromData(dims, sizes, NPY_OBJECT, m_sample_names.data()));
+    if (m_interval_columns) {
+      set_column(calls, "COLUMN", PyArray_SimpleNewFromData(dims, sizes, NPY_INT64, m_interval_column.data()));
+    }
+    if (m_normalize_sites) {
+      set_column(calls, "SITE", PyArray_SimpleNewFromData(dims, sizes, NPY_INT64, m_site.data()));
+    } else {
+      set_column(calls, "CHR", PyArray_SimpleNewFromData(dims, sizes, NPY_OBJECT, m_chrom.data()));
+      set_column(calls, "POS", PyArray_SimpleNewFromData(dims, sizes, NPY_INT64, m_pos.data()));
+      // Process REF, ALT and GT first.
+      process_str_field("REF", calls, dims, sizes);
+      process_str_field("ALT", calls, dims, sizes);
+    }
+    if (m_encode_gt) {
+      process_encoded_gt(calls, dims, sizes);
+    } else {
+      process_str_field("GT", calls, dims, sizes);
+    }
     for (auto field_name: m_field_names) {
       if (field_name == "REF" || field_name == "ALT" || field_name == "GT") continue;
       if (m_string_fields.find(field_name) != m_string_fields.end()) {
-        PyDict_SetItem(calls, PyUnicode_FromString(field_name.c_str()),
-                       PyArray_SimpleNewFromData(dims, sizes, NPY_OBJECT, m_string_fields[field_name].data()));
+        set_column(calls, field_name, PyArray_SimpleNewFromData(dims, sizes, NPY_OBJECT, m_string_fields[field_name].data()));
       } else if (m_int_fields.find(field_name) != m_int_fields.end()) {
-        PyDict_SetItem(calls, PyUnicode_FromString(field_name.c_str()),
-                       PyArray_SimpleNewFromData(dims, sizes, NPY_INT, m_int_fields[field_name].data()));
+        set_column(calls, field_name, PyArray_SimpleNewFromData(dims, sizes, NPY_INT, m_int_fields[field_name].data()));
       } else if (m_float_fields.find(field_name) != m_float_fields.end()) {
-        PyDict_SetItem(calls, PyUnicode_FromString(field_name.c_str()),
-                       PyArray_SimpleNewFromData(dims, sizes, NPY_FLOAT, m_float_fields[field_name].data()));
+        set_column(calls, field_name, PyArray_SimpleNewFromData(dims, sizes, NPY_FLOAT, m_float_fields[field_name].data()));
       } else {
         std::string msg = "Genomic field type for " + field_name + " not supported";
         THROW_GENOMICSDB_EXCEPTION(msg.c_str());
@@ -128,9 +233,77 @@ class ColumnarVariantCallProcessor : public GenomicsDBVariantCallProcessor {
     }
     return calls;
   }
+  // Statistics for the query
+  uint64_t num_calls() { return m_num_spilled_calls + m_sample_names.size(); }
+  uint64_t num_intervals() { return m_num_intervals; }
+  double process_time() { return m_process_time.count(); }
+  void set_interval_hook(interval_hook_t hook, void* context) {
+    m_interval_hook = hook;
+    m_interval_hook_context = context;
+  }
+  // The buffered columns are handed over to the spill hook as a dictionary of numpy arrays and released once their
+  // estimated size exceeds memory_limit bytes
+  void set_memory_limit(uint64_t memory_limit, spill_hook_t hook, void* context) {
+    m_memory_limit = memory_limit;
+    m_spill_hook = hook;
+    m_spill_hook_context = context;
+  }
+  void set_encode_gt(bool encode_gt) {
+    m_encode_gt = encode_gt;
+  }
+  // With normalized sites, CHR, POS, END, REF and ALT are output once per distinct site by construct_sites() and
+  // the calls only reference their site with a SITE index
+  void set_normalize_sites(bool normalize_sites) {
+    m_normalize_sites = normalize_sites;
+  }
+  // With interval columns, every call is output with the begin COLUMN of the queried column range it was returned
+  // for, so the calls of a query with many column ranges, e.g. a range per position looked up, can be attributed
+  void set_interval_columns(bool interval_columns) {
+    m_interval_columns = interval_columns;
+  }
+  PyObject* construct_sites() {
+    return m_sites.construct_sites();
+  }
+  void spill() {
+    if (m_spill_hook && m_sample_names.size()) {
+      PyObject *calls = construct_data_frame();
+      m_spill_hook(m_spill_hook_context, calls);
+      Py_DECREF(calls);
+      release_columns();
+    }
+  }
 
  private:
   bool m_is_initialized = false;
+  uint64_t m_num_intervals = 0;
+  std::chrono::duration<double> m_process_time{0};
+  interval_hook_t m_interval_hook = NULL;
+  void* m_interval_hook_context = NULL;
+  uint64_t m_memory_limit = 0;
+  uint64_t m_buffered_bytes = 0;
+  spill_hook_t m_spill_hook = NULL;
+  void* m_spill_hook_context = NULL;
+  uint64_t m_num_spilled_calls = 0;
+  bool m_encode_gt = false;
+  std::vector<int16_t> m_gt_alleles;
+  std::vector<uint8_t> m_gt_ploidy;
+  std::vector<npy_bool> m_gt_phased;
+  uint8_t m_max_ploidy = 0;
+  void encode_gt(const genomic_field_t* gt, const genomic_field_type_t& gt_type);
+  bool m_interval_columns = false;
+  int64_t m_interval_begin = 0;
+  std::vector<int64_t> m_interval_column;
+  bool m_normalize_sites = false;
+  std::vector<int64_t> m_site;
+  SiteIndex m_sites;
+  std::unordered_map<std::string, PyObject *> m_sample_cache;
+  PyObject* sample_object(const std::string& sample_name);
+  void release_columns();
+  // Accounts for python strings added to the buffered columns
+  PyObject* buffered(PyObject* str) {
+    m_buffered_bytes += sizeof(PyObject*) + sizeof(PyASCIIObject) + PyUnicode_GET_LENGTH(str);
+    return str;
+  }
   
   std::vector<PyObject *> m_sample_names;
   std::vector<PyObject *> m_chrom;
@@ -141,6 +314,138 @@ class ColumnarVariantCallProcessor : public GenomicsDBVariantCallProcessor {
   std::map<std::string, std::vector<float>> m_float_fields;
 };
 
+// Site-major(wide) output with a row per distinct site and a column per sample for each of the requested fields, GT
+// if none are requested. Multi-valued int and float fields, e.g. AD or PL, are not supported. The calls are written in place into the sample columns at the row of their site. Samples are
+// ordered by the row ranges they are selected with and then by row, only samples with calls get a column.
+class WideVariantCallProcessor : public GenomicsDBVariantCallProcessor {
+ public:
+  WideVariantCallProcessor() {
+    _import_array();
+  }
+  ~WideVariantCallProcessor();
+  void set_row_ranges(const genomicsdb_ranges_t& row_ranges) {
+    m_row_ranges = row_ranges;
+  }
+  void set_fields(const std::vector<std::string>& field_names) {
+    m_field_names = field_names;
+  }
+  void process(const interval_t& interval);
+  void process(const std::string& sample_name,
+               const int64_t* coordinates,
+               const genomic_interval_t& genomic_interval,
+               const std::vector<genomic_field_t>& genomic_fields);
+  // CHR, POS, END, REF and ALT for each of the sites as numpy arrays
+  PyObject* construct_sites() {
+    return m_sites.construct_sites();
+  }
+  // Sample names in the order of the sample columns
+  PyObject* construct_samples();
+  // List of numpy columns over the sites, one per sample in order, for the field. Missing values are None for
+  // strings, NaN for floats and -99999 for integers
+  PyObject* construct_field(const std::string& field_name);
+  // Statistics for the query
+  uint64_t num_calls() { return m_num_calls; }
+  uint64_t num_sites() { return m_sites.size(); }
+  uint64_t num_intervals() { return m_num_intervals; }
+  double process_time() { return m_process_time.count(); }
+  void set_interval_hook(interval_hook_t hook, void* context) {
+    m_interval_hook = hook;
+    m_interval_hook_context = context;
+  }
+
+ private:
+  std::pair<uint64_t, int64_t> rank(int64_t row);
+  uint64_t sample_slot(const std::string& sample_name, int64_t row);
+  PyObject* gt_object(const std::string& gt);
+  std::vector<uint64_t> ordered_slots();
+  bool m_is_initialized = false;
+  uint64_t m_num_calls = 0;
+  uint64_t m_num_intervals = 0;
+  std::chrono::duration<double> m_process_time{0};
+  interval_hook_t m_interval_hook = NULL;
+  void* m_interval_hook_context = NULL;
+  genomicsdb_ranges_t m_row_ranges;
+  std::vector<std::string> m_field_names;
+  // Sample slots by row, with the rank of each slot given by the index of its row range and its row
+  std::unordered_map<int64_t, uint64_t> m_slots;
+  std::vector<std::pair<uint64_t, int64_t>> m_sample_ranks;
+  std::vector<PyObject *> m_sample_names;
+  SiteIndex m_sites;
+  std::unordered_map<std::string, PyObject *> m_gt_cache;
+  // Columns over the sites for each field and sample slot
+  std::map<std::string, std::vector<std::vector<PyObject *>>> m_string_fields;
+  std::map<std::string, std::vector<std::vector<int>>> m_int_fields;
+  std::map<std::string, std::vector<std::vector<float>>> m_float_fields;
+};
+
+PyObject* wrap_field(genomic_field_t field, genomic_field_type_t field_type, uint64_t offset);
+
+// Base for the views over results queried from GenomicsDB without a processor. GenomicsDB only hands the genomic field
+// types to processors, so they are initialized with a query_variant_calls() over a single column before the results
+// are queried.
+class ResultsProcessor : public GenomicsDBVariantCallProcessor {
+ public:
+  ResultsProcessor() {
+    _import_array();
+  }
+  void process(const interval_t& interval) {}
+  void process(const std::string& sample_name,
+               const int64_t* coordinates,
+               const genomic_interval_t& genomic_interval,
+               const std::vector<genomic_field_t>& genomic_fields) {}
+
+ protected:
+  void initialize_field_types(GenomicsDB* genomicsdb, const std::string& array,
+                              genomicsdb_ranges_t& column_ranges, genomicsdb_ranges_t& row_ranges);
+  PyObject* wrap(const genomic_field_t& field);
+  // Dictionary with ROW, CHR, POS, END and the fields of the call. ROW is the row of the sample as the results do not
+  // resolve sample names
+  PyObject* wrap_call(const genomicsdb_variant_call_t* call);
+  GenomicsDB* m_genomicsdb = NULL;
+  std::string m_array;
+};
+
+// Site level view over the variants from GenomicsDB::query_variants(). The calls at a site are only materialized on
+// request by construct_calls().
+class VariantProcessor : public ResultsProcessor {
+ public:
+  ~VariantProcessor();
+  void query_variants(GenomicsDB* genomicsdb, const std::string& array,
+                      genomicsdb_ranges_t column_ranges, genomicsdb_ranges_t row_ranges);
+  uint64_t num_variants() { return m_variants ? m_variants->size() : 0; }
+  // CHR, POS, END, REF, ALT and NUM_CALLS per site along with the fields GenomicsDB returns for the variants
+  PyObject* construct_sites();
+  PyObject* construct_calls(uint64_t index);
+
+ private:
+  GenomicsDBVariants* m_variants = NULL;
+};
+
+// Random access to the variant calls from the processor-less GenomicsDB::query_variant_calls(). The calls are only
+// materialized on request, one at a time by construct_call() or as blocks of columns by construct_block().
+class VariantCallCursorProcessor : public ResultsProcessor {
+ public:
+  ~VariantCallCursorProcessor() {
+    release();
+  }
+  void query_variant_calls(GenomicsDB* genomicsdb, const std::string& array,
+                           genomicsdb_ranges_t column_ranges, genomicsdb_ranges_t row_ranges);
+  uint64_t num_calls() { return m_calls ? m_calls->size() : 0; }
+  PyObject* construct_call(uint64_t index);
+  // ROW, POS and END as int64 numpy arrays and CHR and the requested fields as lists for the calls in [start, stop).
+  // All the fields of the calls are output if no fields are requested.
+  PyObject* construct_block(uint64_t start, uint64_t stop, const std::vector<std::string>& field_names);
+  void release() {
+    if (m_calls) {
+      delete m_calls;
+      m_calls = NULL;
+    }
+  }
+
+ private:
+  GenomicsDBVariantCalls* m_calls = NULL;
+};
+
 // Forward declarations for Arrow types
 //struct ArrowSchema;
 //struct ArrowArray;
@@ -35,6 +35,11 @@
 #include "genomicsdb_processor.h"
 
 void ColumnarVariantCallProcessor::process(const interval_t& interval) {
+  m_num_intervals++;
+  m_interval_begin = interval.first;
+  if (m_interval_hook) {
+    m_interval_hook(m_interval_hook_context, interval.first, interval.second, num_calls());
+  }
   if (!m_is_initialized) {
     m_is_initialized = true;
     auto& genomic_field_types = get_genomic_field_types();
@@ -45,7 +50,9 @@ void ColumnarVariantCallProcessor::process(const interval_t& interval) {
         continue;
       }
       m_field_names.push_back(field_name);
-      if (STRING_FIELD(field_name, field_type)) {
+      if (m_encode_gt && field_name == "GT") {
+        continue;
+      } else if (STRING_FIELD(field_name, field_type)) {
         std::vector<PyObject *> str_vector;
         m_string_fields.emplace(std::make_pair(field_name, std::move(str_vector))) ;
       } else if (INT_FIELD(field_type)) {
@@ -65,22 +72,35 @@ void ColumnarVariantCallProcessor::process(const interval_t& interval) {
 void ColumnarVariantCallProcessor::process_fields(const std::vector<genomic_field_t>& genomic_fields) {
   for (auto field_name: m_field_names) {
     auto field_type = get_genomic_field_types()->at(field_name);
+
+    if (m_normalize_sites && (field_name == "REF" || field_name == "ALT")) {
+      continue;
+    }
+
+    if (m_encode_gt && field_name == "GT") {
+      auto gt = std::find_if(genomic_fields.begin(), genomic_fields.end(),
+                             [](const genomic_field_t& field) { return field.name == "GT"; });
+      encode_gt(gt == genomic_fields.end() ? NULL : &(*gt), field_type);
+      continue;
+    }
       
     bool found = false;
     for (auto genomic_field: genomic_fields) {
       if (genomic_field.name.compare(field_name) == 0) {
         if (STRING_FIELD(field_name, field_type)) {
           if (field_name == "GT") {
-            m_string_fields[field_name].push_back(PyUnicode_FromString(
-                resolve_gt(genomic_fields).c_str()));
+            m_string_fields[field_name].push_back(buffered(PyUnicode_FromString(
+                resolve_gt(genomic_fields).c_str())));
           } else {
-            m_string_fields[field_name].push_back(PyUnicode_FromString(
-                genomic_field.to_string(field_type).c_str()));
+            m_string_fields[field_name].push_back(buffered(PyUnicode_FromString(
+                genomic_field.to_string(field_type).c_str())));
           }
         } else if (INT_FIELD(field_type)) {
           m_int_fields[field_name].push_back(genomic_field.int_value_at(0));
+          m_buffered_bytes += sizeof(int);
         } else if (FLOAT_FIELD(field_type)) {
           m_float_fields[field_name].push_back( genomic_field.float_value_at(0));
+          m_buffered_bytes += sizeof(float);
         } else {
           std::string msg = "Genomic field type for " + field_name + " not supported";
           THROW_GENOMICSDB_EXCEPTION(msg.c_str());
@@ -92,11 +112,13 @@ void ColumnarVariantCallProcessor::process_fields(const std::vector<genomic_fiel
       
     if (!found) {
       if (STRING_FIELD(field_name, field_type)) {
-        m_string_fields[field_name].push_back(PyUnicode_FromString(""));
+        m_string_fields[field_name].push_back(buffered(PyUnicode_FromString("")));
       } else if (INT_FIELD(field_type)) {
         m_int_fields[field_name].push_back(-99999);
+        m_buffered_bytes += sizeof(int);
       } else if (FLOAT_FIELD(field_type)) {
         m_float_fields[field_name].push_back(std::nanf(""));
+        m_buffered_bytes += sizeof(float);
       } else {
         std::string msg = "Genomic field type for " + field_name + " not supported";
         THROW_GENOMICSDB_EXCEPTION(msg.c_str());
@@ -105,13 +127,144 @@ void ColumnarVariantCallProcessor::process_fields(const std::vector<genomic_fiel
   }
 }
   
+void ColumnarVariantCallProcessor::encode_gt(const genomic_field_t* gt, const genomic_field_type_t& gt_type) {
+  // With phase information, the GT vector interleaves the allele indices with the phase of the following allele,
+  // e.g. 0,1,1 for 0|1
+  bool has_phase = gt_type.contains_phase_information();
+  uint8_t ploidy = 0;
+  npy_bool phased = NPY_FALSE;
+  if (gt) {
+    for (auto i=0ul; i<gt->num_elements; i++) {
+      if (has_phase && i%2) {
+        if (gt->int_value_at(i) > 0) phased = NPY_TRUE;
+      } else {
+        auto allele = gt->int_value_at(i);
+        m_gt_alleles.push_back(allele < 0 ? GT_MISSING_ALLELE : allele);
+        ploidy++;
+      }
+    }
+  }
+  m_gt_ploidy.push_back(ploidy);
+  m_gt_phased.push_back(phased);
+  m_max_ploidy = std::max(m_max_ploidy, ploidy);
+  m_buffered_bytes += ploidy*sizeof(int16_t) + sizeof(uint8_t) + sizeof(npy_bool);
+}
+
+PyObject* ColumnarVariantCallProcessor::sample_object(const std::string& sample_name) {
+  auto found = m_sample_cache.find(sample_name);
+  if (found == m_sample_cache.end()) {
+    found = m_sample_cache.emplace(sample_name, PyUnicode_FromString(sample_name.c_str())).first;
+  }
+  // Every reference in the Sample column is owned by the column
+  Py_INCREF(found->second);
+  return found->second;
+}
+
+int64_t SiteIndex::site_id(const genomic_interval_t& genomic_interval,
+                           const std::vector<genomic_field_t>& genomic_fields,
+                           const std::map<std::string, genomic_field_type_t>& genomic_field_types) {
+  std::string ref, alt;
+  for (auto& genomic_field: genomic_fields) {
+    if (genomic_field.name == "REF") {
+      ref = genomic_field.to_string(genomic_field_types.at("REF"));
+    } else if (genomic_field.name == "ALT") {
+      alt = genomic_field.to_string(genomic_field_types.at("ALT"));
+    }
+  }
+  std::string key = genomic_interval.contig_name + ":" + std::to_string(genomic_interval.interval.first) + "-"
+      + std::to_string(genomic_interval.interval.second) + ":" + ref + ":" + alt;
+  auto found = m_ids.find(key);
+  if (found != m_ids.end()) {
+    return found->second;
+  }
+  int64_t id = m_pos.size();
+  m_ids.emplace(std::move(key), id);
+  m_chrom.push_back(PyUnicode_FromString(genomic_interval.contig_name.c_str()));
+  m_pos.push_back(genomic_interval.interval.first);
+  m_end.push_back(genomic_interval.interval.second);
+  m_ref.push_back(PyUnicode_FromString(ref.c_str()));
+  m_alt.push_back(PyUnicode_FromString(alt.c_str()));
+  return id;
+}
+
+PyObject* SiteIndex::construct_sites() {
+  int dims = 1;
+  npy_intp sizes[1] = { static_cast<npy_intp>(size()) };
+  PyObject *sites = PyDict_New();
+  if (!sites) {
+    THROW_GENOMICSDB_EXCEPTION("Could not instantiate Python Dictionary for sites");
+  }
+  ColumnarVariantCallProcessor::set_column(sites, "CHR", PyArray_SimpleNewFromData(dims, sizes, NPY_OBJECT, m_chrom.data()));
+  ColumnarVariantCallProcessor::set_column(sites, "POS", PyArray_SimpleNewFromData(dims, sizes, NPY_INT64, m_pos.data()));
+  ColumnarVariantCallProcessor::set_column(sites, "END", PyArray_SimpleNewFromData(dims, sizes, NPY_INT64, m_end.data()));
+  ColumnarVariantCallProcessor::set_column(sites, "REF", PyArray_SimpleNewFromData(dims, sizes, NPY_OBJECT, m_ref.data()));
+  ColumnarVariantCallProcessor::set_column(sites, "ALT", PyArray_SimpleNewFromData(dims, sizes, NPY_OBJECT, m_alt.data()));
+  return sites;
+}
+
+void SiteIndex::release() {
+  for (auto objects: {&m_chrom, &m_ref, &m_alt}) {
+    for (auto obj: *objects) {
+      Py_XDECREF(obj);
+    }
+    objects->clear();
+  }
+  m_ids.clear();
+  m_pos.clear();
+  m_end.clear();
+}
+
 void ColumnarVariantCallProcessor::process(const std::string& sample_name,
                                            const int64_t* coordinates,
                                            const genomic_interval_t& genomic_interval,
                                            const std::vector<genomic_field_t>& genomic_fields) {
-  m_sample_names.push_back(PyUnicode_FromString(sample_name.c_str()));
-  m_chrom.push_back(PyUnicode_FromString(genomic_interval.contig_name.c_str()));
-  m_pos.push_back(genomic_interval.interval.first);
+  auto start = std::chrono::steady_clock::now();
+  if (m_interval_columns) {
+    m_interval_column.push_back(m_interval_begin);
+    m_buffered_bytes += sizeof(int64_t);
+  }
+  if (m_normalize_sites) {
+    m_sample_names.push_back(sample_object(sample_name));
+    m_site.push_back(m_sites.site_id(genomic_interval, genomic_fields, *get_genomic_field_types()));
+    m_buffered_bytes += sizeof(PyObject *) + sizeof(int64_t);
+  } else {
+    m_sample_names.push_back(buffered(PyUnicode_FromString(sample_name.c_str())));
+    m_chrom.push_back(buffered(PyUnicode_FromString(genomic_interval.contig_name.c_str())));
+    m_pos.push_back(genomic_interval.interval.first);
+    m_buffered_bytes += sizeof(uint64_t);
+  }
   process_fields(genomic_fields);
+  m_process_time += std::chrono::steady_clock::now() - start;
+  if (m_memory_limit && m_buffered_bytes >= m_memory_limit) {
+    spill();
+  }
+}
+
+void ColumnarVariantCallProcessor::release_columns() {
+  auto release = [](std::vector<PyObject *>& column) {
+    for (auto obj: column) {
+      Py_DECREF(obj);
+    }
+    column.clear();
+  };
+  m_num_spilled_calls += m_sample_names.size();
+  release(m_sample_names);
+  release(m_chrom);
+  m_pos.clear();
+  m_site.clear();
+  m_interval_column.clear();
+  for (auto& field: m_string_fields) {
+    release(field.second);
+  }
+  for (auto& field: m_int_fields) {
+    field.second.clear();
+  }
+  for (auto& field: m_float_fields) {
+    field.second.clear();
+  }
+  m_gt_alleles.clear();
+  m_gt_ploidy.clear();
+  m_gt_phased.clear();
+  m_buffered_bytes = 0;
 }
 
@@ -0,0 +1,260 @@
+/**
+ * @file genomicsdb_processor_variants.cc
+ *
+ * @section LICENSE
+ *
+ * The MIT License (MIT)
+ *
+ * Copyright (c) 2025 dātma, inc™
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy of
+ * this software and associated documentation files (the "Software"), to deal in
+ * the Software without restriction, including without limitation the rights to
+ * use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+ * the Software, and to permit persons to whom the Software is furnished to do so,
+ * subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in all
+ * copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+ * FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+ * COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+ * IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+ * CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+ *
+ * @section DESCRIPTION
+ *
+ * Views over the results of GenomicsDB::query_variants() and the processor-less
+ * GenomicsDB::query_variant_calls(), materializing python objects only on request
+ *
+ **/
+
+#include "genomicsdb.h"
+#include "genomicsdb_processor.h"
+
+static void set_item(PyObject *dict, const std::string& name, PyObject *value) {
+  PyObject *key = PyUnicode_FromString(name.c_str());
+  PyDict_SetItem(dict, key, value);
+  Py_DECREF(key);
+  Py_DECREF(value);
+}
+
+static PyObject* new_list_of_none(uint64_t size) {
+  PyObject *list = PyList_New(size);
+  for (auto i=0ul; i<size; i++) {
+    Py_INCREF(Py_None);
+    PyList_SET_ITEM(list, i, Py_None);
+  }
+  return list;
+}
+
+static PyObject* new_int64_array(const std::vector<int64_t>& values) {
+  npy_intp sizes[1] = { static_cast<npy_intp>(values.size()) };
+  PyObject *array = PyArray_SimpleNew(1, sizes, NPY_INT64);
+  std::copy(values.begin(), values.end(), static_cast<int64_t*>(PyArray_DATA(reinterpret_cast<PyArrayObject*>(array))));
+  return array;
+}
+
+void ResultsProcessor::initialize_field_types(GenomicsDB* genomicsdb, const std::string& array,
+                                              genomicsdb_ranges_t& column_ranges, genomicsdb_ranges_t& row_ranges) {
+  errno = 0;
+  if (column_ranges.empty()) {
+    THROW_GENOMICSDB_EXCEPTION("Column ranges are required to query without a processor");
+  }
+  m_genomicsdb = genomicsdb;
+  m_array = array;
+  // The calls returned for the single column are dropped by process(), only the field types are of interest
+  genomicsdb_ranges_t type_ranges = { std::make_pair(column_ranges[0].first, column_ranges[0].first) };
+  genomicsdb->query_variant_calls(*this, array, type_ranges, row_ranges);
+}
+
+PyObject* ResultsProcessor::wrap(const genomic_field_t& field) {
+  auto field_type = get_genomic_field_type(field.name);
+  if (field.name == "REF" || field.name == "ALT" || field.name == "GT") {
+    return PyUnicode_FromString(field.to_string(field_type).c_str());
+  } else if (field.num_elements == 1 || field_type.is_string()) {
+    return wrap_field(field, field_type, 0);
+  } else {
+    PyObject *list = PyList_New(field.num_elements);
+    for (auto i=0ul; i<field.num_elements; i++) {
+      PyList_SET_ITEM(list, i, wrap_field(field, field_type, i));
+    }
+    return list;
+  }
+}
+
+PyObject* ResultsProcessor::wrap_call(const genomicsdb_variant_call_t* call) {
+  auto genomic_interval = m_genomicsdb->get_genomic_interval(call);
+  PyObject *call_dict = PyDict_New();
+  if (!call_dict) {
+    THROW_GENOMICSDB_EXCEPTION("Could not instantiate Python Dictionary for calls");
+  }
+  set_item(call_dict, "ROW", PyLong_FromLongLong(m_genomicsdb->get_row(call)));
+  set_item(call_dict, "CHR", PyUnicode_FromString(genomic_interval.contig_name.c_str()));
+  set_item(call_dict, "POS", PyLong_FromLong(genomic_interval.interval.first));
+  set_item(call_dict, "END", PyLong_FromLong(genomic_interval.interval.second));
+  for (auto& field: m_genomicsdb->get_genomic_fields(m_array, call)) {
+    set_item(call_dict, field.name, wrap(field));
+  }
+  return call_dict;
+}
+
+VariantProcessor::~VariantProcessor() {
+  if (m_variants) {
+    delete m_variants;
+  }
+}
+
+void VariantProcessor::query_variants(GenomicsDB* genomicsdb, const std::string& array,
+                                      genomicsdb_ranges_t column_ranges, genomicsdb_ranges_t row_ranges) {
+  initialize_field_types(genomicsdb, array, column_ranges, row_ranges);
+  // GenomicsDBResults frees the results on destruction, so construct them in place instead of copying
+  m_variants = new GenomicsDBVariants(genomicsdb->query_variants(array, column_ranges, row_ranges));
+}
+
+PyObject* VariantProcessor::construct_sites() {
+  errno = 0;
+  auto size = num_variants();
+  std::vector<int64_t> pos(size), end(size), num_calls(size);
+  PyObject *chrom = new_list_of_none(size);
+  std::map<std::string, PyObject*> fields = { {"REF", new_list_of_none(size)}, {"ALT", new_list_of_none(size)} };
+  PyObject *contig = NULL;
+  for (auto i=0ul; i<size; i++) {
+    auto variant = m_variants->at(i);
+    auto genomic_interval = m_genomicsdb->get_genomic_interval(variant);
+    // Sites are ordered by position, so consecutive sites share the python string for their contig
+    if (!contig || genomic_interval.contig_name != PyUnicode_AsUTF8(contig)) {
+      contig = PyUnicode_FromString(genomic_interval.contig_name.c_str());
+    } else {
+      Py_INCREF(contig);
+    }
+    PyList_SetItem(chrom, i, contig);
+    pos[i] = genomic_interval.interval.first;
+    end[i] = genomic_interval.interval.second;
+    for (auto& field: m_genomicsdb->get_genomic_fields(m_array, variant)) {
+      auto found = fields.find(field.name);
+      if (found == fields.end()) {
+        found = fields.emplace(field.name, new_list_of_none(size)).first;
+      }
+      PyList_SetItem(found->second, i, wrap(field));
+    }
+    auto calls = m_genomicsdb->get_variant_calls(m_array, variant);
+    num_calls[i] = calls.size();
+    // REF and ALT are taken from the first call at the site if not available with the variant
+    if (calls.size() && (PyList_GET_ITEM(fields["REF"], i) == Py_None || PyList_GET_ITEM(fields["ALT"], i) == Py_None)) {
+      for (auto& field: m_genomicsdb->get_genomic_fields(m_array, calls.at(0))) {
+        if ((field.name == "REF" || field.name == "ALT") && PyList_GET_ITEM(fields[field.name], i) == Py_None) {
+          PyList_SetItem(fields[field.name], i, wrap(field));
+        }
+      }
+    }
+  }
+
+  PyObject *sites = PyDict_New();
+  if (!sites) {
+    THROW_GENOMICSDB_EXCEPTION("Could not instantiate Python Dictionary for sites");
+  }
+  set_item(sites, "CHR", chrom);
+  set_item(sites, "POS", new_int64_array(pos));
+  set_item(sites, "END", new_int64_array(end));
+  set_item(sites, "REF", fields["REF"]);
+  set_item(sites, "ALT", fields["ALT"]);
+  set_item(sites, "NUM_CALLS", new_int64_array(num_calls));
+  for (auto& field: fields) {
+    if (field.first != "REF" && field.first != "ALT") {
+      set_item(sites, field.first, field.second);
+    }
+  }
+  return sites;
+}
+
+PyObject* VariantProcessor::construct_calls(uint64_t index) {
+  errno = 0;
+  if (index >= num_variants()) {
+    THROW_GENOMICSDB_EXCEPTION("Site index " + std::to_string(index) + " out of range");
+  }
+  auto calls = m_genomicsdb->get_variant_calls(m_array, m_variants->at(index));
+  PyObject *calls_list = PyList_New(0);
+  if (!calls_list) {
+    THROW_GENOMICSDB_EXCEPTION("Could not instantiate python list");
+  }
+  for (auto i=0ul; i<calls.size(); i++) {
+    PyObject *call = wrap_call(calls.at(i));
+    if (PyList_Append(calls_list, call)) {
+      THROW_GENOMICSDB_EXCEPTION("Failed to append to python list");
+    }
+    Py_DECREF(call);
+  }
+  return calls_list;
+}
+
+void VariantCallCursorProcessor::query_variant_calls(GenomicsDB* genomicsdb, const std::string& array,
+                                                     genomicsdb_ranges_t column_ranges,
+                                                     genomicsdb_ranges_t row_ranges) {
+  initialize_field_types(genomicsdb, array, column_ranges, row_ranges);
+  release();
+  m_calls = new GenomicsDBVariantCalls(genomicsdb->query_variant_calls(array, column_ranges, row_ranges));
+}
+
+PyObject* VariantCallCursorProcessor::construct_call(uint64_t index) {
+  errno = 0;
+  if (index >= num_calls()) {
+    THROW_GENOMICSDB_EXCEPTION("Call index " + std::to_string(index) + " out of range");
+  }
+  return wrap_call(m_calls->at(index));
+}
+
+PyObject* VariantCallCursorProcessor::construct_block(uint64_t start, uint64_t stop,
+                                                      const std::vector<std::string>& field_names) {
+  errno = 0;
+  stop = std::min(stop, num_calls());
+  start = std::min(start, stop);
+  auto size = stop - start;
+  std::vector<int64_t> row(size), pos(size), end(size);
+  PyObject *chrom = new_list_of_none(size);
+  std::map<std::string, PyObject*> fields;
+  std::vector<std::string> names = field_names;
+  for (auto& name: field_names) {
+    fields[name] = new_list_of_none(size);
+  }
+  PyObject *contig = NULL;
+  for (auto i=0ul; i<size; i++) {
+    auto call = m_calls->at(start+i);
+    auto genomic_interval = m_genomicsdb->get_genomic_interval(call);
+    if (!contig || genomic_interval.contig_name != PyUnicode_AsUTF8(contig)) {
+      contig = PyUnicode_FromString(genomic_interval.contig_name.c_str());
+    } else {
+      Py_INCREF(contig);
+    }
+    PyList_SetItem(chrom, i, contig);
+    row[i] = m_genomicsdb->get_row(call);
+    pos[i] = genomic_interval.interval.first;
+    end[i] = genomic_interval.interval.second;
+    for (auto& field: m_genomicsdb->get_genomic_fields(m_array, call)) {
+      auto found = fields.find(field.name);
+      if (found == fields.end()) {
+        if (!field_names.empty()) {
+          continue;
+        }
+        found = fields.emplace(field.name, new_list_of_none(size)).first;
+        names.push_back(field.name);
+      }
+      PyList_SetItem(found->second, i, wrap(field));
+    }
+  }
+
+  PyObject *block = PyDict_New();
+  if (!block) {
+    THROW_GENOMICSDB_EXCEPTION("Could not instantiate Python Dictionary for calls");
+  }
+  set_item(block, "ROW", new_int64_array(row));
+  set_item(block, "CHR", chrom);
+  set_item(block, "POS", new_int64_array(pos));
+  set_item(block, "END", new_int64_array(end));
+  for (auto& name: names) {
+    set_item(block, name, fields[name]);
+  }
+  return block;
+}
@@ -0,0 +1,244 @@
+/**
+ * @file genomicsdb_processor_wide.cc
+ *
+ * @section LICENSE
+ *
+ * The MIT License (MIT)
+ *
+ * Copyright (c) 2025 dātma, inc™
+ *
+ * Permission is hereby granted, free of charge, to any person obtaining a copy of
+ * this software and associated documentation files (the "Software"), to deal in
+ * the Software without restriction, including without limitation the rights to
+ * use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+ * the Software, and to permit persons to whom the Software is furnished to do so,
+ * subject to the following conditions:
+ *
+ * The above copyright notice and this permission notice shall be included in all
+ * copies or substantial portions of the Software.
+ *
+ * THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+ * IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+ * FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+ * COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+ * IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+ * CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+ *
+ * @section DESCRIPTION
+ *
+ * Implementation of GenomicsDBVariantCallProcessor whose output is site-major(wide),
+ * with a row per site and numpy columns per sample for each of the requested fields
+ *
+ **/
+
+#include "genomicsdb.h"
+#include "genomicsdb_processor.h"
+
+// Columns are padded with the missing value up to the site before it is set, so the calls are written in place
+template<typename T>
+static void set_value(std::vector<T>& column, uint64_t site, T missing, T value) {
+  if (column.size() <= site) {
+    column.resize(site+1, missing);
+  }
+  column[site] = value;
+}
+
+// The sample columns hold a single value per site for int and float fields
+static void multi_valued_field(const std::string& field_name) {
+  std::string msg = "Field " + field_name + " is multi-valued, only single valued int and float fields can be output as wide columns";
+  THROW_GENOMICSDB_EXCEPTION(msg.c_str());
+}
+
+WideVariantCallProcessor::~WideVariantCallProcessor() {
+  auto release = [](std::vector<PyObject *>& objects) {
+    for (auto obj: objects) {
+      Py_XDECREF(obj);
+    }
+    objects.clear();
+  };
+  release(m_sample_names);
+  m_sites.release();
+  for (auto& field: m_string_fields) {
+    for (auto& column: field.second) {
+      release(column);
+    }
+  }
+  for (auto& gt: m_gt_cache) {
+    Py_DECREF(gt.second);
+  }
+}
+
+void WideVariantCallProcessor::process(const interval_t& interval) {
+  m_num_intervals++;
+  if (m_interval_hook) {
+    m_interval_hook(m_interval_hook_context, interval.first, interval.second, num_calls());
+  }
+  if (!m_is_initialized) {
+    m_is_initialized = true;
+    auto& genomic_field_types = get_genomic_field_types();
+    if (m_field_names.empty()) {
+      m_field_names.push_back("GT");
+    }
+    for (auto& field_name: m_field_names) {
+      auto found = genomic_field_types->find(field_name);
+      if (found == genomic_field_types->end()) {
+        std::string msg = "Field " + field_name + " is not one of the queried attributes";
+        THROW_GENOMICSDB_EXCEPTION(msg.c_str());
+      }
+      auto field_type = found->second;
+      // Multi-valued int and float fields are classified as string fields
+      if (field_name != "GT" && (field_type.is_int() || field_type.is_float())
+          && STRING_FIELD(field_name, field_type)) {
+        multi_valued_field(field_name);
+      } else if (STRING_FIELD(field_name, field_type)) {
+        m_string_fields[field_name];
+      } else if (INT_FIELD(field_type)) {
+        m_int_fields[field_name];
+      } else if (FLOAT_FIELD(field_type)) {
+        m_float_fields[field_name];
+      } else {
+        std::string msg = "Genomic field type for " + field_name + " not supported";
+        THROW_GENOMICSDB_EXCEPTION(msg.c_str());
+      }
+    }
+  }
+}
+
+std::pair<uint64_t, int64_t> WideVariantCallProcessor::rank(int64_t row) {
+  for (auto i=0ul; i<m_row_ranges.size(); i++) {
+    if (row >= m_row_ranges[i].first && row <= m_row_ranges[i].second) {
+      return std::make_pair(i, row);
+    }
+  }
+  return std::make_pair(m_row_ranges.size(), row);
+}
+
+uint64_t WideVariantCallProcessor::sample_slot(const std::string& sample_name, int64_t row) {
+  auto found = m_slots.find(row);
+  if (found != m_slots.end()) {
+    return found->second;
+  }
+  uint64_t slot = m_sample_names.size();
+  m_slots.emplace(row, slot);
+  m_sample_names.push_back(PyUnicode_FromString(sample_name.c_str()));
+  m_sample_ranks.push_back(rank(row));
+  for (auto& field: m_string_fields) {
+    field.second.emplace_back();
+  }
+  for (auto& field: m_int_fields) {
+    field.second.emplace_back();
+  }
+  for (auto& field: m_float_fields) {
+    field.second.emplace_back();
+  }
+  return slot;
+}
+
+PyObject* WideVariantCallProcessor::gt_object(const std::string& gt) {
+  // Genotypes take few distinct values, so the cells share the python string for each of them
+  auto found = m_gt_cache.find(gt);
+  if (found == m_gt_cache.end()) {
+    found = m_gt_cache.emplace(gt, PyUnicode_FromString(gt.c_str())).first;
+  }
+  Py_INCREF(found->second);
+  return found->second;
+}
+
+void WideVariantCallProcessor::process(const std::string& sample_name,
+                                       const int64_t* coordinates,
+                                       const genomic_interval_t& genomic_interval,
+                                       const std::vector<genomic_field_t>& genomic_fields) {
+  auto start = std::chrono::steady_clock::now();
+  auto slot = sample_slot(sample_name, coordinates[0]);
+  uint64_t site = m_sites.site_id(genomic_interval, genomic_fields, *get_genomic_field_types());
+  for (auto& field_name: m_field_names) {
+    auto genomic_field = std::find_if(genomic_fields.begin(), genomic_fields.end(),
+                                      [&field_name](const genomic_field_t& field) { return field.name == field_name; });
+    if (genomic_field == genomic_fields.end()) {
+      continue;
+    }
+    auto field_type = get_genomic_field_types()->at(field_name);
+    if (STRING_FIELD(field_name, field_type)) {
+      auto& column = m_string_fields[field_name][slot];
+      PyObject *value = field_name == "GT" ? gt_object(resolve_gt(genomic_fields))
+          : PyUnicode_FromString(genomic_field->to_string(field_type).c_str());
+      if (site < column.size()) {
+        Py_XDECREF(column[site]);
+      }
+      set_value<PyObject *>(column, site, NULL, value);
+    } else if (genomic_field->num_elements != 1) {
+      multi_valued_field(field_name);
+    } else if (INT_FIELD(field_type)) {
+      set_value<int>(m_int_fields[field_name][slot], site, -99999, genomic_field->int_value_at(0));
+    } else if (FLOAT_FIELD(field_type)) {
+      set_value<float>(m_float_fields[field_name][slot], site, std::nanf(""), genomic_field->float_value_at(0));
+    }
+  }
+  m_num_calls++;
+  m_process_time += std::chrono::steady_clock::now() - start;
+}
+
+std::vector<uint64_t> WideVariantCallProcessor::ordered_slots() {
+  std::vector<uint64_t> slots(m_sample_names.size());
+  for (auto i=0ul; i<slots.size(); i++) {
+    slots[i] = i;
+  }
+  std::sort(slots.begin(), slots.end(), [this](uint64_t a, uint64_t b) {
+    return m_sample_ranks[a] < m_sample_ranks[b];
+  });
+  return slots;
+}
+
+PyObject* WideVariantCallProcessor::construct_samples() {
+  errno = 0;
+  PyObject *samples = PyList_New(0);
+  if (!samples) {
+    THROW_GENOMICSDB_EXCEPTION("Could not instantiate python list");
+  }
+  for (auto slot: ordered_slots()) {
+    if (PyList_Append(samples, m_sample_names[slot])) {
+      THROW_GENOMICSDB_EXCEPTION("Failed to append to python list");
+    }
+  }
+  return samples;
+}
+
+PyObject* WideVariantCallProcessor::construct_field(const std::string& field_name) {
+  errno = 0;
+  int dims = 1;
+  npy_intp sizes[1] = { static_cast<npy_intp>(num_sites()) };
+  PyObject *columns = PyList_New(0);
+  if (!columns) {
+    THROW_GENOMICSDB_EXCEPTION("Could not instantiate python list");
+  }
+  // The numpy arrays are views over the sample columns, padded to all the sites, and are only valid for as long as
+  // the processor
+  for (auto slot: ordered_slots()) {
+    PyObject *column = NULL;
+    if (m_string_fields.find(field_name) != m_string_fields.end()) {
+      auto& values = m_string_fields[field_name][slot];
+      values.resize(num_sites(), NULL);
+      for (auto& value: values) {
+        if (!value) {
+          Py_INCREF(Py_None);
+          value = Py_None;
+        }
+      }
+      column = PyArray_SimpleNewFromData(dims, sizes, NPY_OBJECT, values.data());
+    } else if (m_int_fields.find(field_name) != m_int_fields.end()) {
+      auto& values = m_int_fields[field_name][slot];
+      values.resize(num_sites(), -99999);
+      column = PyArray_SimpleNewFromData(dims, sizes, NPY_INT, values.data());
+    } else if (m_float_fields.find(field_name) != m_float_fields.end()) {
+      auto& values = m_float_fields[field_name][slot];
+      values.resize(num_sites(), std::nanf(""));
+      column = PyArray_SimpleNewFromData(dims, sizes, NPY_FLOAT, values.data());
+    } else {
+      std::string msg = "Field " + field_name + " was not output by the query";
+      THROW_GENOMICSDB_EXCEPTION(msg.c_str());
+    }
+    PyList_Append(columns, column);
+    Py_DECREF(column);
+  }
+  return columns;
+}
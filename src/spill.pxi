@@ -0,0 +1,173 @@
+#
+# spill.pxi
+#
+# The MIT License
+#
+# Copyright (c) 2025 dātma, inc™
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Description: Spilling of query results to temporary arrow ipc files for queries with a memory_limit
+#
+
+import bisect
+import os
+import pickle
+import tempfile
+
+
+class _SpillFiles:
+    """Temporary arrow ipc files with the results spilled by the processors. Spill hooks are invoked from native
+    code and cannot raise, so the first exception is saved and raised by raise_if_failed() after the query.
+    """
+
+    def __init__(self, spill_dir):
+        self.spill_dir = spill_dir
+        self.files = []
+        self.error = None
+
+    def write_table(self, table):
+        import pyarrow as pa
+
+        fd, path = tempfile.mkstemp(prefix="genomicsdb_spill_", suffix=".arrow", dir=self.spill_dir)
+        os.close(fd)
+        self.files.append(path)
+        with pa.OSFile(path, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+    def spill_columns(self, calls):
+        import pyarrow as pa
+
+        try:
+            # The numpy arrays are views over the native columns that are released once the spill hook returns, so
+            # the table has to be written out before returning
+            columns = {name: _as_arrow_column(column, mask_missing=name != "POS") for name, column in calls.items()}
+            self.write_table(pa.table(columns))
+        except Exception as e:
+            # Do not hold on to the frames referencing the native columns
+            self.error = self.error or e.with_traceback(None)
+
+    def spill_intervals(self, intervals):
+        import pyarrow as pa
+
+        try:
+            # Calls are free form dictionaries, so they are spilled pickled per interval
+            table = pa.table({
+                "begin": pa.array([interval[0] for interval in intervals], type=pa.uint64()),
+                "end": pa.array([interval[1] for interval in intervals], type=pa.uint64()),
+                "calls": pa.array([pickle.dumps(interval[2], protocol=pickle.HIGHEST_PROTOCOL)
+                                   for interval in intervals], type=pa.binary()),
+            })
+            self.write_table(table)
+            del intervals[:]
+        except Exception as e:
+            self.error = self.error or e
+
+    def raise_if_failed(self):
+        if self.error:
+            self.remove()
+            raise GenomicsDBException("Failed to spill query results to disk", self.error)
+
+    def load(self):
+        """Memory map the spilled tables. The files are unlinked right away, the mappings stay valid for as long as
+        the tables are referenced.
+        """
+        import pyarrow as pa
+
+        tables = []
+        for path in self.files:
+            with pa.memory_map(path) as source:
+                tables.append(pa.ipc.open_file(source).read_all())
+            os.remove(path)
+        self.files = []
+        return tables
+
+    def remove(self):
+        for path in self.files:
+            if os.path.exists(path):
+                os.remove(path)
+        self.files = []
+
+
+# Allele index padding calls of a lower ploidy in the encoded genotype columns, see GT_PADDING of the processors
+_GT_PADDING = -2
+
+
+def _concat_spilled_columns(tables):
+    """Concatenates the tables spilled by the columnar processor. The GT_<k> columns of encoded genotypes of a higher
+    ploidy only show up in the spills from the first call of that ploidy on, so they are added to the earlier spills
+    filled with _GT_PADDING as they are in memory, instead of nulls"""
+    import pyarrow as pa
+
+    gt_fields = {}
+    for table in tables:
+        for field in table.schema:
+            if field.name.startswith("GT_") and field.name[3:].isdigit():
+                gt_fields.setdefault(field.name, field)
+    padded = []
+    for table in tables:
+        for name, field in gt_fields.items():
+            if name not in table.column_names:
+                table = table.append_column(field, pa.repeat(pa.scalar(_GT_PADDING, type=field.type), table.num_rows))
+        padded.append(table)
+    return pa.concat_tables(padded, promote_options="default")
+
+
+cdef void _spill_columns(void* context, PyObject* calls) noexcept with gil:
+    (<object>context).spill_columns(<object>calls)
+
+
+cdef void _spill_intervals(void* context, PyObject* intervals) noexcept with gil:
+    (<object>context).spill_intervals(<object>intervals)
+
+
+class SpilledIntervals:
+    """Results of query_variant_calls_by_interval() spilled to disk with memory_limit. Behaves like the list of
+    (begin, end, calls) tuples otherwise returned, with the calls for each interval loaded lazily from the memory
+    mapped spill files.
+    """
+
+    def __init__(self, tables):
+        self._tables = tables
+        self._offsets = [0]
+        for table in tables:
+            self._offsets.append(self._offsets[-1] + table.num_rows)
+
+    def __len__(self):
+        return self._offsets[-1]
+
+    def _interval(self, table, row):
+        calls = pickle.loads(table.column("calls")[row].as_buffer())
+        return (table.column("begin")[row].as_py(), table.column("end")[row].as_py(), calls)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError("SpilledIntervals index out of range")
+        table_idx = bisect.bisect_right(self._offsets, index) - 1
+        return self._interval(self._tables[table_idx], index - self._offsets[table_idx])
+
+    def __iter__(self):
+        for table in self._tables:
+            for row in range(table.num_rows):
+                yield self._interval(table, row)
@@ -30,13 +30,16 @@
 # cython: language_level=3
 
 cimport cython
+from cython.operator cimport dereference as deref
 
 from libcpp.utility cimport pair
 from libcpp.string cimport string
 from libcpp.vector cimport vector
-from libc.stdint cimport (int64_t, uint64_t, uintptr_t)
+from libc.stdint cimport (int32_t, int64_t, uint64_t, uintptr_t)
+from libc.string cimport memcpy
 
 from cpython.version cimport PY_MAJOR_VERSION
+from cpython.buffer cimport PyBuffer_FillInfo
 
 from cpython.bytes cimport (PyBytes_GET_SIZE,
                             PyBytes_AS_STRING,
@@ -89,6 +92,33 @@ cdef genomicsdb_ranges_t scan_full():
     ranges.push_back(pair[int64_t, int64_t](0, INT64_MAX-1))
     return ranges
 
+cdef as_query_protobuf(array, column_ranges, row_ranges, query_protobuf, attributes):
+    # Query configuration protobuf equivalent to array/column_ranges/row_ranges with the attributes
+    # overridden, so attributes can be projected per query over an existing GenomicsDB instance
+    query_config = query_pb.QueryConfiguration()
+    if query_protobuf:
+        query_config.CopyFrom(query_protobuf)
+    elif array is not None:
+        query_config.array_name = array
+        if column_ranges is None:
+            column_ranges = [(0, INT64_MAX-1)]
+        column_list = query_pb.GenomicsDBColumnOrIntervalList()
+        for low, high in column_ranges:
+            column_interval = column_list.column_or_interval_list.add()
+            column_interval.column_interval.tiledb_column_interval.begin = low
+            column_interval.column_interval.tiledb_column_interval.end = high
+        query_config.query_column_ranges.extend([column_list])
+        if row_ranges:
+            row_range_list = query_pb.RowRangeList()
+            for low, high in row_ranges:
+                row_range = row_range_list.range_list.add()
+                row_range.low = low
+                row_range.high = high
+            query_config.query_row_ranges.extend([row_range_list])
+    del query_config.attributes[:]
+    query_config.attributes.extend(attributes)
+    return query_config
+
 
 # Arrow based Utilities that use PyCapsule for interoperabilty with the (Nano)Arrow C Interface
 # See https://arrow.apache.org/docs/format/CDataInterface/PyCapsuleInterface.html
@@ -105,18 +135,69 @@ cdef object pycapsule_get_arrow_schema(void *schema):
 cdef object pycapsule_get_arrow_array(void *array):
   return PyCapsule_New(<ArrowArray*>array, "arrow_array", &pycapsule_delete_arrow_array);
 
-def c_arrow_type_from_format(format):
-  # schema format types supported by GenomicsDB
-  if format == b'u':
-    return pa.string()
-  elif format == b'L':
-    return pa.uint64()
-  elif format == b'i':
-    return pa.int32()
-  elif format == b'f':
-    return pa.float32()
-  else:
-    return pa.null()
+# ArrowSchema flags
+_ARROW_FLAG_DICTIONARY_ORDERED = 1
+_ARROW_FLAG_NULLABLE = 2
+_ARROW_FLAG_MAP_KEYS_SORTED = 4
+
+_ARROW_TIME_UNITS = {"s": "s", "m": "ms", "u": "us", "n": "ns"}
+
+def c_arrow_type_from_format(format, children=(), dictionary=None, flags=0):
+  """Returns the pyarrow type for the Arrow C data interface format string. children are the pyarrow fields of the
+  children for nested formats(+l, +L, +w, +s, +m and unions) and dictionary the value type for dictionary encoded
+  columns, whose format is that of the indices.
+  See https://arrow.apache.org/docs/format/CDataInterface.html#data-type-description-format-strings
+  """
+  import pyarrow as pa
+  if isinstance(format, bytes):
+    format = format.decode("UTF-8")
+  children = list(children)
+  if dictionary is not None:
+    index_type = c_arrow_type_from_format(format)
+    return pa.dictionary(index_type, dictionary, ordered=bool(flags & _ARROW_FLAG_DICTIONARY_ORDERED))
+  primitives = {
+    "n": pa.null, "b": pa.bool_, "c": pa.int8, "C": pa.uint8, "s": pa.int16, "S": pa.uint16,
+    "i": pa.int32, "I": pa.uint32, "l": pa.int64, "L": pa.uint64, "e": pa.float16, "f": pa.float32,
+    "g": pa.float64, "z": pa.binary, "Z": pa.large_binary, "u": pa.string, "U": pa.large_string,
+    "vz": getattr(pa, "binary_view", None), "vu": getattr(pa, "string_view", None),
+    "tdD": pa.date32, "tdm": pa.date64, "tin": pa.month_day_nano_interval,
+  }
+  if primitives.get(format):
+    return primitives[format]()
+  kind, _, parameters = format.partition(":")
+  if kind == "w" and parameters:
+    return pa.binary(int(parameters))
+  if kind == "d" and parameters:
+    precision, scale, *bit_width = [int(parameter) for parameter in parameters.split(",")]
+    if bit_width and bit_width[0] == 256:
+      return pa.decimal256(precision, scale)
+    return pa.decimal128(precision, scale)
+  if len(kind) == 3 and kind[:2] in ("tt", "ts", "tD") and kind[2] in _ARROW_TIME_UNITS:
+    unit = _ARROW_TIME_UNITS[kind[2]]
+    if kind[:2] == "tt":
+      return pa.time32(unit) if unit in ("s", "ms") else pa.time64(unit)
+    if kind[:2] == "ts":
+      return pa.timestamp(unit, tz=parameters or None)
+    return pa.duration(unit)
+  if kind == "+l" and len(children) == 1:
+    return pa.list_(children[0])
+  if kind == "+L" and len(children) == 1:
+    return pa.large_list(children[0])
+  if kind == "+w" and parameters and len(children) == 1:
+    return pa.list_(children[0], int(parameters))
+  if kind == "+vl" and len(children) == 1 and hasattr(pa, "list_view"):
+    return pa.list_view(children[0])
+  if kind == "+vL" and len(children) == 1 and hasattr(pa, "large_list_view"):
+    return pa.large_list_view(children[0])
+  if kind == "+s":
+    return pa.struct(children)
+  if kind == "+m" and len(children) == 1 and children[0].type.num_fields == 2:
+    entries = children[0].type
+    return pa.map_(entries.field(0).type, entries.field(1), keys_sorted=bool(flags & _ARROW_FLAG_MAP_KEYS_SORTED))
+  if kind in ("+ud", "+us"):
+    type_codes = [int(code) for code in parameters.split(",")] if parameters else None
+    return pa.union(children, "dense" if kind == "+ud" else "sparse", type_codes)
+  raise GenomicsDBException(f"Unsupported arrow format({format})")
 
 cdef class _ArrowSchemaWrapper:
   cdef object _base
@@ -131,11 +212,42 @@ cdef class _ArrowSchemaWrapper:
     return _ArrowSchemaWrapper(schema_capsule,
                               <uintptr_t>PyCapsule_GetPointer(schema_capsule, 'arrow_schema'))
 
-  cdef __arrow_c_schema__(self):
+  def __arrow_c_schema__(self):
     cdef ArrowSchema* arrow_schema
     genomicsdb_allocate_arrow_schema(&arrow_schema, self._schema_ptr)
     return PyCapsule_New(arrow_schema, 'arrow_schema', &pycapsule_delete_arrow_schema)
 
+  @property
+  def format(self):
+    return self._schema_ptr.format.decode("UTF-8")
+
+  @property
+  def name(self):
+    return self._schema_ptr.name.decode("UTF-8") if self._schema_ptr.name else ""
+
+  @property
+  def flags(self):
+    return self._schema_ptr.flags
+
+  @property
+  def metadata(self):
+    # Encoded as the number of key/value pairs followed by the length prefixed keys and values, all int32
+    cdef const char* ptr = self._schema_ptr.metadata
+    cdef int32_t n, length
+    if ptr == NULL:
+      return None
+    memcpy(&n, ptr, sizeof(int32_t))
+    ptr += sizeof(int32_t)
+    metadata = {}
+    for _ in range(n):
+      memcpy(&length, ptr, sizeof(int32_t))
+      key = ptr[sizeof(int32_t):sizeof(int32_t) + length]
+      ptr += sizeof(int32_t) + length
+      memcpy(&length, ptr, sizeof(int32_t))
+      metadata[key] = ptr[sizeof(int32_t):sizeof(int32_t) + length]
+      ptr += sizeof(int32_t) + length
+    return metadata
+
   @property
   def n_children(self):
     return self._schema_ptr.n_children
@@ -144,11 +256,36 @@ cdef class _ArrowSchemaWrapper:
     return _ArrowSchemaWrapper(self._base,
                                <uintptr_t>self._schema_ptr.children[i])
 
+  @property
+  def dictionary(self):
+    if self._schema_ptr.dictionary == NULL:
+      return None
+    return _ArrowSchemaWrapper(self._base, <uintptr_t>self._schema_ptr.dictionary)
+
+  @property
+  def type(self):
+    dictionary = self.dictionary
+    return c_arrow_type_from_format(self.format,
+                                    [self.child(i).field for i in range(self.n_children)],
+                                    dictionary.type if dictionary is not None else None,
+                                    self.flags)
+
+  @property
+  def field(self):
+    import pyarrow as pa
+    return pa.field(self.name, self.type, nullable=bool(self.flags & _ARROW_FLAG_NULLABLE), metadata=self.metadata)
+
+  @property
+  def arrow_schema(self):
+    """The pyarrow schema for the children, imported as is with __arrow_c_schema__ for struct schemas"""
+    import pyarrow as pa
+    if self.format == "+s":
+      return pa.schema(self)
+    return pa.schema(self.children_schema)
+
   @property
   def children_schema(self):
-    return list((self._schema_ptr.children[i].name.decode("UTF-8"),
-                 c_arrow_type_from_format(self._schema_ptr.children[i].format))
-                for i in range(self.n_children))
+    return [self.child(i).field for i in range(self.n_children)]
   
 
 cdef class _ArrowArrayWrapper:
@@ -171,20 +308,31 @@ cdef class _ArrowArrayWrapper:
   def __arrow_c_array__(self, requested_schema=None):
     #if requested_schema is not None:
     #  raise NotImplementedError("requested_schema as an argument not supported in _import_from_c_capsule")
-    return self._schema.__arrow_c_schema__(), self._base
+    if self._array_ptr == <ArrowArray*>PyCapsule_GetPointer(self._base, 'arrow_array'):
+      array_capsule = self._base
+    else:
+      # Children are owned and released by their parent, so the capsule does not release them
+      array_capsule = PyCapsule_New(self._array_ptr, 'arrow_array', NULL)
+    return self._schema.__arrow_c_schema__(), array_capsule
   
   @property
   def n_children(self):
     return self._array_ptr.n_children
 
   def child(self, int64_t i):
-    schema_capsule = self._schema.child(i)
-    array_capsule = pycapsule_get_arrow_array(self._array_ptr.children[i])
-    return _ArrowArrayWrapper(array_capsule,
+    return _ArrowArrayWrapper(self._base,
                               <uintptr_t>self._array_ptr.children[i],
                               self._schema.child(i))
 
   @property
   def children(self):
     for i in range(self.n_children):
-      yield self.child[i]
+      yield self.child(i)
+
+  def record_batch(self, schema=None):
+    """Imports the array as a pyarrow RecordBatch, moving struct arrays as a whole without copying"""
+    import pyarrow as pa
+    if self._schema.format == "+s":
+      return pa.record_batch(self)
+    arrays = [pa.array(self.child(i)) for i in range(self.n_children)]
+    return pa.RecordBatch.from_arrays(arrays, schema=schema or self._schema.arrow_schema)
@@ -0,0 +1,54 @@
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import synthetic_workspace  # noqa
+
+
+def pytest_collection_modifyitems(config, items):
+    if os.environ.get("GENOMICSDB_BENCHMARK"):
+        return
+    skip = pytest.mark.skip(reason="Set GENOMICSDB_BENCHMARK=1 or use `make benchmark` to run benchmarks")
+    for item in items:
+        item.add_marker(skip)
+
+
+@pytest.fixture(scope="session")
+def workspace():
+    missing = synthetic_workspace.missing_tools()
+    if missing:
+        pytest.skip(f"Tools{missing} needed to generate synthetic workspaces not found")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        yield synthetic_workspace.generate(tmp_dir)
+
+
+def _run_in_child(fn, conn):
+    fn()
+    conn.send(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    conn.close()
+
+
+def peak_rss(fn):
+    # Peak resident set size in KB of fn run in a forked child, so native allocations are accounted for
+    parent, child = multiprocessing.get_context("fork").Pipe()
+    process = multiprocessing.get_context("fork").Process(target=_run_in_child, args=(fn, child))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise RuntimeError(f"Benchmark child process exited with {process.exitcode}")
+    return parent.recv()
+
+
+@pytest.fixture
+def run_benchmark(benchmark):
+    def run(fn, rounds=3):
+        benchmark.extra_info["peak_rss_kb"] = peak_rss(fn)
+        return benchmark.pedantic(fn, rounds=rounds, iterations=1)
+
+    return run
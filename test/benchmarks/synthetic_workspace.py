@@ -0,0 +1,186 @@
+#
+# synthetic_workspace.py
+#
+# The MIT License
+#
+# Copyright (c) 2025 dātma, inc™
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Description : Generate reproducible synthetic GenomicsDB workspaces for benchmarking.
+#               Single sample VCFs are generated from a seeded random generator, compressed
+#               and indexed with bgzip/tabix and imported with vcf2genomicsdb_init/vcf2genomicsdb
+#               from $GENOMICSDB_HOME/bin or PATH.
+#
+
+import json
+import os
+import random
+import shutil
+import subprocess
+from typing import NamedTuple
+
+BASES = "ACGT"
+# Optional FORMAT fields in the order they are added to the synthetic VCFs, GT is always present
+FORMAT_FIELDS = [
+    ("DP", "1", "Integer", "Read depth"),
+    ("GQ", "1", "Integer", "Genotype quality"),
+    ("AD", "R", "Integer", "Allelic depths"),
+    ("PL", "G", "Integer", "Phred-scaled genotype likelihoods"),
+]
+
+
+class WorkspaceSpec(NamedTuple):
+    samples: int = 100
+    sites: int = 10000
+    fields: int = 2
+    partitions: int = 2
+    density: float = 0.5
+    seed: int = 42
+
+    @classmethod
+    def from_env(cls):
+        def get(name, default, type=int):
+            return type(os.environ.get("GENOMICSDB_BENCHMARK_" + name.upper(), default))
+
+        default = cls()
+        return cls(
+            samples=get("samples", default.samples),
+            sites=get("sites", default.sites),
+            fields=get("fields", default.fields),
+            partitions=get("partitions", default.partitions),
+            density=get("density", default.density, float),
+            seed=get("seed", default.seed),
+        )
+
+
+class SyntheticWorkspace(NamedTuple):
+    workspace: str
+    reference: str
+    vcf_header: str
+    contigs: list
+    samples: list
+    arrays: list
+    attributes: list
+
+
+def find_tool(name):
+    genomicsdb_home = os.environ.get("GENOMICSDB_HOME")
+    if genomicsdb_home and os.path.isfile(os.path.join(genomicsdb_home, "bin", name)):
+        return os.path.join(genomicsdb_home, "bin", name)
+    return shutil.which(name)
+
+
+def missing_tools():
+    return [tool for tool in ["vcf2genomicsdb_init", "vcf2genomicsdb", "bgzip", "tabix"] if not find_tool(tool)]
+
+
+def format_fields(spec):
+    fields = FORMAT_FIELDS[: spec.fields]
+    fields += [(f"X{i}", "1", "Integer", "Synthetic field") for i in range(spec.fields - len(FORMAT_FIELDS))]
+    return fields
+
+
+def generate_reference(dirname, contigs, rng):
+    reference = os.path.join(dirname, "reference.fa")
+    sequences = {}
+    with open(reference, "w") as fasta, open(reference + ".fai", "w") as fai:
+        for contig, length in contigs:
+            sequence = "".join(rng.choice(BASES) for _ in range(length))
+            sequences[contig] = sequence
+            fasta.write(f">{contig}\n")
+            offset = fasta.tell()
+            for i in range(0, length, 60):
+                fasta.write(sequence[i : i + 60] + "\n")
+            fai.write(f"{contig}\t{length}\t{offset}\t60\t61\n")
+    return reference, sequences
+
+
+def generate_value(field, rng):
+    number = field[1]
+    if number == "R":
+        return f"{rng.randint(0, 50)},{rng.randint(0, 50)}"
+    elif number == "G":
+        return f"{rng.randint(0, 99)},0,{rng.randint(0, 99)}"
+    return str(rng.randint(0, 99))
+
+
+def generate_vcfs(dirname, spec, contigs, sites, rng):
+    fields = format_fields(spec)
+    header = ["##fileformat=VCFv4.2"]
+    header += [f"##contig=<ID={contig},length={length}>" for contig, length in contigs]
+    header.append('##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">')
+    header += [f'##FORMAT=<ID={id},Number={n},Type={t},Description="{d}">' for id, n, t, d in fields]
+    format = ":".join(["GT"] + [field[0] for field in fields])
+    samples = [f"SAMPLE{i:06d}" for i in range(spec.samples)]
+    for sample in samples:
+        vcf = os.path.join(dirname, sample + ".vcf")
+        with open(vcf, "w") as f:
+            f.write("\n".join(header) + "\n")
+            f.write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t" + sample + "\n")
+            for contig, pos, ref, alt in sites:
+                if rng.random() >= spec.density:
+                    continue
+                gt = rng.choice(["0/1", "1/1", "0|1", "1|0"])
+                values = ":".join([gt] + [generate_value(field, rng) for field in fields])
+                f.write(f"{contig}\t{pos}\t.\t{ref}\t{alt}\t.\tPASS\t.\t{format}\t{values}\n")
+        subprocess.run([find_tool("bgzip"), "-f", vcf], check=True)
+        subprocess.run([find_tool("tabix"), "-f", "-p", "vcf", vcf + ".gz"], check=True)
+    return samples, ["GT"] + [field[0] for field in fields]
+
+
+def generate(dirname, spec=None):
+    """Generate a synthetic workspace in dirname as described by spec(defaults from GENOMICSDB_BENCHMARK_* env)"""
+    if spec is None:
+        spec = WorkspaceSpec.from_env()
+    rng = random.Random(spec.seed)
+    os.makedirs(dirname, exist_ok=True)
+
+    # One contig per partition, vcf2genomicsdb_init generates a column partition per contig
+    sites_per_contig = max(1, spec.sites // spec.partitions)
+    contigs = [(f"chr{i + 1}", sites_per_contig * 10 + 100) for i in range(spec.partitions)]
+    reference, sequences = generate_reference(dirname, contigs, rng)
+    sites = []
+    for contig, length in contigs:
+        for pos in sorted(rng.sample(range(1, length - 1), sites_per_contig)):
+            ref = sequences[contig][pos - 1]
+            sites.append((contig, pos, ref, rng.choice([base for base in BASES if base != ref])))
+
+    vcf_dir = os.path.join(dirname, "vcfs")
+    os.makedirs(vcf_dir, exist_ok=True)
+    samples, attributes = generate_vcfs(vcf_dir, spec, contigs, sites, rng)
+
+    workspace = os.path.join(dirname, "ws")
+    subprocess.run([find_tool("vcf2genomicsdb_init"), "-w", workspace, "-S", vcf_dir, "-o"], check=True)
+    with open(os.path.join(workspace, "loader.json")) as f:
+        partitions = json.load(f)["column_partitions"]
+    for rank in range(len(partitions)):
+        subprocess.run(
+            [find_tool("vcf2genomicsdb"), "-r", str(rank), os.path.join(workspace, "loader.json")], check=True
+        )
+    arrays = [partition["array_name"] if "array_name" in partition else partition["array"] for partition in partitions]
+    return SyntheticWorkspace(
+        workspace,
+        reference,
+        os.path.join(workspace, "vcfheader.vcf"),
+        [contig for contig, _ in contigs],
+        samples,
+        arrays,
+        attributes,
+    )
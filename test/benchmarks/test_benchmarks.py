@@ -0,0 +1,90 @@
+import os
+import subprocess
+import sys
+
+import pyarrow as pa
+import pytest
+
+import genomicsdb
+from genomicsdb import json_output_mode
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.fixture(scope="module")
+def gdb(workspace):
+    return genomicsdb.connect(
+        workspace.workspace,
+        os.path.join(workspace.workspace, "callset.json"),
+        os.path.join(workspace.workspace, "vidmap.json"),
+        workspace.attributes,
+    )
+
+
+def test_query_variant_calls_by_interval(gdb, workspace, run_benchmark):
+    def query():
+        for array in workspace.arrays:
+            gdb.query_variant_calls_by_interval(array=array)
+
+    run_benchmark(query)
+
+
+def test_query_variant_calls_columnar(gdb, workspace, run_benchmark):
+    def query():
+        for array in workspace.arrays:
+            gdb.query_variant_calls_columnar(array=array)
+
+    run_benchmark(query)
+
+
+@pytest.mark.parametrize("json_output", list(json_output_mode), ids=lambda mode: mode.name)
+def test_query_variant_calls_json(gdb, workspace, run_benchmark, json_output):
+    def query():
+        for array in workspace.arrays:
+            gdb.query_variant_calls_json(array=array, json_output=json_output)
+
+    run_benchmark(query)
+
+
+@pytest.mark.parametrize("batching", [False, True])
+@pytest.mark.parametrize("compress", [None, "lz4", "zstd"])
+def test_query_variant_calls_arrow(gdb, workspace, run_benchmark, batching, compress):
+    def query():
+        for array in workspace.arrays:
+            for output in gdb.query_variant_calls_arrow(array=array, batching=batching, compress=compress):
+                pa.ipc.open_stream(output).read_all()
+
+    run_benchmark(query)
+
+
+def test_to_vcf(gdb, workspace, run_benchmark, tmp_path):
+    def export():
+        for array in workspace.arrays:
+            gdb.to_vcf(
+                array,
+                [(0, 1000000000)],
+                [(0, len(workspace.samples) - 1)],
+                workspace.reference,
+                workspace.vcf_header,
+                output=str(tmp_path / f"{array}.vcf.gz"),
+                output_format="z",
+                overwrite=True,
+            )
+
+    run_benchmark(export)
+
+
+@pytest.mark.parametrize("nproc", [1, 2, 4, 8])
+@pytest.mark.parametrize("output_type", ["csv", "json", "arrow"])
+def test_genomicsdb_query(workspace, run_benchmark, tmp_path, nproc, output_type):
+    if nproc > os.cpu_count():
+        pytest.skip(f"nproc({nproc}) exceeds available processing units")
+    command = [sys.executable, "-m", "genomicsdb.scripts.genomicsdb_query", "-w", workspace.workspace]
+    command += [arg for contig in workspace.contigs for arg in ["-i", contig]]
+    command += ["-a", ",".join(workspace.attributes), "-n", str(nproc), "-t", output_type]
+    command += ["-o", str(tmp_path / "out")]
+
+    def query():
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    run_benchmark(query, rounds=1)
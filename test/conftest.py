@@ -0,0 +1,20 @@
+import os
+import tarfile
+
+import pytest
+
+INPUTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "inputs")
+
+
+@pytest.fixture()
+def setup(tmp_path):
+    """Runs the test from a temporary directory with the sanity workspace extracted, restoring the working directory
+    afterwards even if the test fails, so that tests using the fixture do not depend on their order"""
+    with tarfile.open(os.path.join(INPUTS_DIR, "sanity.test.tgz")) as tar:
+        tar.extractall(tmp_path)
+    cwd = os.getcwd()
+    os.chdir(tmp_path)
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
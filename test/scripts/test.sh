@@ -155,6 +155,30 @@ do
     exit 1
   fi
 done
+if [[ ! -f ${OUTPUT}.manifest.json || ! -f ${OUTPUT}_${FILES[0]}.csv.done ]]; then
+  echo "Could not find manifest=${OUTPUT}.manifest.json or done marker=${OUTPUT}_${FILES[0]}.csv.done"
+  exit 1
+fi
+# run_command removes ${OUTPUT}*, so outputs spanning several commands are kept in their own directories
+mkdir -p $TEMP_DIR/resumed $TEMP_DIR/sharded
+RESUMED_OUTPUT=$TEMP_DIR/resumed/out
+run_command "genomicsdb_query -w $WORKSPACE $INTERVAL_ARGS -o $RESUMED_OUTPUT"
+rm ${RESUMED_OUTPUT}_${FILES[0]}.csv.done
+run_command "genomicsdb_query -w $WORKSPACE $INTERVAL_ARGS -o $RESUMED_OUTPUT --resume --retries 2 --retry-backoff 0.1"
+if [[ ! -f ${RESUMED_OUTPUT}_${FILES[0]}.csv.done ]]; then
+  die "Query with a missing done marker was not rerun with --resume"
+fi
+run_command "genomicsdb_query -w $WORKSPACE -i 1 -o $RESUMED_OUTPUT --resume" 1
+SHARDED_OUTPUT=$TEMP_DIR/sharded/out
+run_command "genomicsdb_query -w $WORKSPACE $INTERVAL_ARGS -o $SHARDED_OUTPUT --plan-out $TEMP_DIR/sharded/plan.json"
+run_command "genomicsdb_query -w $WORKSPACE --plan-in $TEMP_DIR/sharded/plan.json --merge" 1
+run_command "genomicsdb_query -w $WORKSPACE --plan-in $TEMP_DIR/sharded/plan.json --shard 1/2"
+run_command "genomicsdb_query -w $WORKSPACE --plan-in $TEMP_DIR/sharded/plan.json --shard 2/2"
+run_command "genomicsdb_query -w $WORKSPACE --plan-in $TEMP_DIR/sharded/plan.json --merge"
+if [[ ! -f ${SHARDED_OUTPUT}.csv || -f ${SHARDED_OUTPUT}_${FILES[0]}.csv ]]; then
+  die "Could not find merged file=${SHARDED_OUTPUT}.csv or the merged outputs were not deleted"
+fi
+run_command "genomicsdb_query -w $WORKSPACE $INTERVAL_ARGS -o $OUTPUT --shard 3/2" 2
 run_command "genomicsdb_query -w $WORKSPACE $INTERVAL_ARGS -o $OUTPUT --output-type json" 
 for FILE in "${FILES[@]}"
 do
@@ -171,7 +195,25 @@ do
     exit 1
   fi
 done
+run_command "genomicsdb_query -w $WORKSPACE $INTERVAL_ARGS -o $OUTPUT --output-type arrow -z 1KB"
+for FILE in "${FILES[@]}"
+do
+  if [[ ! -f ${OUTPUT}/${FILE}__0.parquet ]]; then
+    echo "Could not find parquet file=${OUTPUT}/${FILE}__0.parquet"
+    exit 1
+  fi
+done
+run_command "genomicsdb_query -w $WORKSPACE $INTERVAL_ARGS -o $OUTPUT --output-type vcf" 1
 
+# Batched lookups of positions, in both the <CONTIG>:<POS> and the whitespace separated forms
+printf "1:12141\n1 17385\n2:3000\nNON_EXISTENT_CONTIG:1\n1:12141\n" > $TEMP_DIR/positions.list
+run_command "genomicsdb_query -w $WORKSPACE -P $TEMP_DIR/positions.list -o $OUTPUT"
+[[ -f ${OUTPUT}.csv ]] || die "Could not find file=${OUTPUT}.csv from genomicsdb_query -P"
+run_command "genomicsdb_query -w $WORKSPACE -P $TEMP_DIR/positions.list -s HG00096 -a $FIELDS -o $OUTPUT"
+run_command "genomicsdb_query -w $WORKSPACE -P $TEMP_DIR/positions.list -o $OUTPUT -t json" 1
+# Variant ids with alleles are rejected as the calls are not filtered by REF/ALT
+printf "1:12141\n2:3000:A:G\n" > $TEMP_DIR/variant_ids.list
+run_command "genomicsdb_query -w $WORKSPACE -P $TEMP_DIR/variant_ids.list -o $OUTPUT" 1
 run_command "genomicsdb_query -w $WORKSPACE -I $TEMP_DIR/contigs.list -s HG00096 -o $OUTPUT"
 run_command "genomicsdb_query -w ${WORKSPACE}/ -I $TEMP_DIR/contigs.list -s HG00096 -o $OUTPUT"
 run_command "genomicsdb_query -w $WORKSPACE -I $TEMP_DIR/contigs.list -s HG00097 -s HG00100 -s HG00096 -o $OUTPUT"
@@ -183,6 +225,40 @@ run_command "genomicsdb_query -w $WORKSPACE -I $TEMP_DIR/contigs.list -S $TEMP_D
 run_command "genomicsdb_query -w $WORKSPACE $INTERVAL_ARGS -S $TEMP_DIR/samples.list -o $OUTPUT"
 run_command "genomicsdb_query -w $WORKSPACE $INTERVAL_ARGS -S $TEMP_DIR/samples.list -f $FILTER -o $OUTPUT"
 run_command "genomicsdb_query -w $WORKSPACE $INTERVAL_ARGS -a $FIELDS  -o $OUTPUT"
+run_command "genomicsdb_query -w $WORKSPACE $INTERVAL_ARGS -o $OUTPUT --stats"
+run_command "genomicsdb_query -w $WORKSPACE $INTERVAL_ARGS -o $OUTPUT --prefetch-depth 2"
+run_command "genomicsdb_query -w $WORKSPACE $INTERVAL_ARGS -o $OUTPUT --output-type arrow --stats $TEMP_DIR/stats.json"
+python -c "import json,sys; stats=json.load(open(sys.argv[1])); assert stats['totals']['num_tasks'] == 4" $TEMP_DIR/stats.json || die "Could not validate stats from genomicsdb_query --stats"
+
+# Queries submitted to a warm genomicsdb_query_daemon
+DAEMON_SOCKET=$TEMP_DIR/genomicsdb_query.sock
+run_command "genomicsdb_query_daemon -s $DAEMON_SOCKET --ping" 1
+genomicsdb_query_daemon -s $DAEMON_SOCKET -n 2 &> $TEMP_DIR/daemon.log &
+for i in {1..50}; do genomicsdb_query_daemon -s $DAEMON_SOCKET --ping &> /dev/null && break; sleep 0.2; done
+run_command "genomicsdb_query_daemon -s $DAEMON_SOCKET --ping"
+run_command "genomicsdb_query -w $WORKSPACE $INTERVAL_ARGS -o $OUTPUT --daemon $DAEMON_SOCKET"
+for FILE in "${FILES[@]}"
+do
+  if [[ ! -f ${OUTPUT}_${FILE}.csv ]]; then
+    die "Could not find file=${OUTPUT}_${FILE}.csv from genomicsdb_query --daemon"
+  fi
+done
+run_command "genomicsdb_query -w $WORKSPACE $INTERVAL_ARGS -o $OUTPUT --output-type json --daemon $DAEMON_SOCKET --stats"
+run_command "genomicsdb_query_daemon -s $DAEMON_SOCKET --shutdown"
+wait
+[[ ! -e $DAEMON_SOCKET ]] || die "genomicsdb_query_daemon did not clean up $DAEMON_SOCKET on shutdown"
+
+# Federated queries over the workspace under two names, so that every sample is qualified by its workspace
+FEDERATED_ARGS="-w $WORKSPACE -w $WORKSPACE -n cohort1 -n cohort2"
+run_command "genomicsdb_federated_query" 2
+run_command "genomicsdb_federated_query $FEDERATED_ARGS --list-samples"
+run_command "genomicsdb_federated_query $FEDERATED_ARGS -n cohort3 --list-samples" 1
+run_command "genomicsdb_federated_query $FEDERATED_ARGS -a NON_EXISTENT_FIELD -o $OUTPUT" 1
+run_command "genomicsdb_federated_query $FEDERATED_ARGS $INTERVAL_ARGS -a $FIELDS -s HG00096 -s cohort2:HG00097 -o $OUTPUT"
+[[ -f ${OUTPUT}.csv ]] || die "Could not find file=${OUTPUT}.csv from genomicsdb_federated_query"
+run_command "genomicsdb_federated_query $FEDERATED_ARGS $INTERVAL_ARGS -o $OUTPUT --output-type arrow"
+[[ -f ${OUTPUT}.parquet ]] || die "Could not find file=${OUTPUT}.parquet from genomicsdb_federated_query"
+
 run_command "genomicsdb_query -w $WORKSPACE $INTERVAL_ARGS -a NON_EXISTENT_FIELD,$FIELDS -o $OUTPUT" 1
 run_command "genomicsdb_query -w $WORKSPACE $INTERVAL_ARGS -o NON_EXISTENT_DIR/output" 1
 run_command "genomicsdb_query -w $WORKSPACE $INTERVAL_ARGS -o NON_EXISTENT_DIR/" 1
@@ -244,6 +320,21 @@ check_command_with_duplicates "genomicsdb_query -w $WORKSPACE -i 1 -i 1 --chunk-
 check_command_with_duplicates "genomicsdb_query -w $WORKSPACE -i 1 -i 1 --chunk-size=2 -s HG00141 -s HG00141 -o $OUTPUT" 1 "1"
 run_command "genomicsdb_query -w $WORKSPACE -i 4 --chunk-size=4 -b -o $OUTPUT --no-cache"
 
+# vcf exports split into shards, here cut at 1:12278 where the call of HG01958 spanning the middle of the interval
+# ends, have to match the unsplit export with a single header
+VCF_ARGS="-w $WORKSPACE -i 1:12100-12299 -t vcf -r $OLDSTYLE_DIR/chr1_10MB.fasta.gz"
+VCF_ARGS="$VCF_ARGS --vcf-header $OLDSTYLE_DIR/template_vcf_header.vcf"
+mkdir -p $TEMP_DIR/unsplit
+run_command "genomicsdb_query $VCF_ARGS -n 1 -o $TEMP_DIR/unsplit/out"
+run_command "genomicsdb_query $VCF_ARGS -n 2 -o $OUTPUT"
+python - ${OUTPUT}.vcf.gz $TEMP_DIR/unsplit/out.vcf.gz <<'EOF' || die "Split vcf export does not match the unsplit one"
+import gzip, sys
+split, unsplit = [gzip.open(vcf, "rt").read().splitlines() for vcf in sys.argv[1:]]
+records = [line for line in split if not line.startswith("#")]
+assert sum(line.startswith("#CHROM") for line in split) == 1
+assert len(records) > 0 and records == [line for line in unsplit if not line.startswith("#")]
+EOF
+
 OLDSTYLE_JSONS="-l $OLDSTYLE_DIR/loader.json -c $OLDSTYLE_DIR/callset_t0_1_2.json -v $OLDSTYLE_DIR/vid.json"
 run_command "genomicsdb_cache -w $WORKSPACE $OLDSTYLE_JSONS $INTERVAL_ARGS"
 run_command "genomicsdb_query -w $WORKSPACE $OLDSTYLE_JSONS --list-samples"
@@ -0,0 +1,49 @@
+import gzip
+
+import pytest
+
+from genomicsdb import bgzf
+
+HEADER = b"##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+
+
+def write_bgzf(path, *chunks):
+    with open(path, "wb") as f:
+        for chunk in chunks:
+            f.write(bgzf.compress_block(chunk))
+        f.write(bgzf.BGZF_EOF)
+    return str(path)
+
+
+def test_concatenate(tmp_path):
+    records = [f"1\t{pos}\t.\tA\tT\t.\tPASS\t.\n".encode() for pos in range(1, 7)]
+    shards = [
+        write_bgzf(tmp_path / "shard0.vcf.gz", HEADER + records[0], records[1]),
+        # Header split across blocks, ending in the middle of a block
+        write_bgzf(tmp_path / "shard1.vcf.gz", HEADER[:10], HEADER[10:] + records[2] + records[3]),
+        # Only the header, e.g. a shard for a range without any variants
+        write_bgzf(tmp_path / "shard2.vcf.gz", HEADER),
+        # Header ending at a block boundary
+        write_bgzf(tmp_path / "shard3.vcf.gz", HEADER, records[4], records[5]),
+    ]
+    output = str(tmp_path / "output.vcf.gz")
+    bgzf.concatenate(shards, output)
+
+    with gzip.open(output, "rb") as f:
+        assert f.read() == HEADER + b"".join(records)
+    with open(output, "rb") as f:
+        contents = f.read()
+    assert contents.endswith(bgzf.BGZF_EOF)
+    assert contents.count(bgzf.BGZF_EOF) == 1
+
+    with open(output, "rb") as f:
+        blocks = list(bgzf.read_blocks(f))
+    assert b"".join(bgzf.decompress_block(block) for block in blocks) == HEADER + b"".join(records)
+
+
+def test_concatenate_not_bgzf(tmp_path):
+    not_bgzf = tmp_path / "not_bgzf.vcf.gz"
+    with gzip.open(not_bgzf, "wb") as f:
+        f.write(HEADER)
+    with pytest.raises(bgzf.BGZFError):
+        bgzf.concatenate([str(not_bgzf)], str(tmp_path / "output.vcf.gz"))
@@ -0,0 +1,93 @@
+import pytest
+
+from genomicsdb import federated
+
+
+def load(name):
+    return federated.load_workspace("ws", name, "callset_t0_1_2.json", "vid.json", "loader.json")
+
+
+def workspace(name, samples, contigs=None, fields=None):
+    return federated.Workspace(
+        name,
+        name,
+        "callset.json",
+        "vidmap.json",
+        "loader.json",
+        samples,
+        contigs or {"1": {"length": 100, "tiledb_column_offset": 0}},
+        fields or {"GT": ("int", "P")},
+        [],
+    )
+
+
+def test_reconcile():
+    a = workspace("a", {"S1": 0, "S2": 1})
+    b = workspace(
+        "b",
+        {"S2": 0, "S3": 1},
+        contigs={"2": {"length": 50, "tiledb_column_offset": 0}, "1": {"length": 100, "tiledb_column_offset": 50}},
+        fields={"GT": ("int", "P"), "DP": ("int", 1)},
+    )
+    assert federated.reconcile_fields([a, b]) == ["REF", "GT"]
+    assert federated.reconcile_fields([a, b], ["ALT", "GT"]) == ["ALT", "GT"]
+    with pytest.raises(ValueError):
+        federated.reconcile_fields([a, b], ["GT", "DP"])
+    with pytest.raises(ValueError):
+        federated.reconcile_fields([a, workspace("c", {}, fields={"GT": ("char", "VAR")})])
+
+    assert federated.reconcile_contigs([a, b]) == ["1", "2"]
+    assert federated.reconcile_contigs([b, a]) == ["2", "1"]
+    with pytest.raises(ValueError):
+        federated.reconcile_contigs([a, workspace("c", {}, contigs={"1": {"length": 99, "tiledb_column_offset": 0}})])
+
+    assert federated.sample_ids([a, b]) == [{"S1": "S1", "S2": "a:S2"}, {"S2": "b:S2", "S3": "S3"}]
+    assert federated.sample_ids([a, b], prefix_samples=True) == [
+        {"S1": "a:S1", "S2": "a:S2"},
+        {"S2": "b:S2", "S3": "b:S3"},
+    ]
+    with pytest.raises(ValueError):
+        federated.sample_ids([a, workspace("a", {})])
+    with pytest.raises(ValueError):
+        federated.sample_ids([a, b, workspace("c", {"a:S2": 0})])
+
+
+def test_federated_query(setup):
+    a = load("a")
+    b = load("b")
+    assert a.samples == {"HG00141": 0, "HG01958": 1, "HG01530": 2}
+
+    queries = federated.plan([a, b], ["1:17000-18000", "1:1-13000"], samples=["HG00141", "b:HG01530"])
+    assert [[query.column_range for query in workspace_queries] for workspace_queries in queries] == [
+        [(0, 12999), (16999, 17999)],
+        [(0, 12999), (16999, 17999)],
+    ]
+    assert [workspace_queries[0].row_ranges for workspace_queries in queries] == [[(0, 0)], [(0, 0), (2, 2)]]
+    assert federated.plan([a, b], ["1:1-13000"], samples=["b:HG01530"])[0] == []
+
+    calls = [table.to_pydict() for table in federated.query([a, b], ["1:1-20000"], ["GT", "DP"])]
+    samples = [sample for table in calls for sample in table["SAMPLE_NAME"]]
+    positions = [position for table in calls for position in table["POS"]]
+    assert positions == [12141, 12141, 12145, 12145] + [17385] * 6
+    assert samples == [
+        "a:HG00141",
+        "b:HG00141",
+        "a:HG01958",
+        "b:HG01958",
+        "a:HG00141",
+        "a:HG01530",
+        "a:HG01958",
+        "b:HG00141",
+        "b:HG01530",
+        "b:HG01958",
+    ]
+
+    calls = federated.query([a, b], ["1:1-20000"], samples=["HG00141", "b:HG01530"], batch_bytes=1024)
+    assert sum(table.num_rows for table in calls) == 5
+
+    # The samples are only qualified when found in more than one workspace
+    calls = list(federated.query([a], ["1:1-20000"]))
+    assert calls[0]["SAMPLE_NAME"][0].as_py() == "HG00141"
+
+    with pytest.raises(ValueError):
+        next(federated.query([a, b], ["1:1-20000"], ["NON_EXISTENT_FIELD"]))
@@ -0,0 +1,47 @@
+import os
+
+import pyarrow as pa
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+import pytest
+
+from genomicsdb import filesystem
+
+
+def test_filesystem(tmpdir):
+    hello_file = os.path.join(tmpdir, "hello.txt")
+    with open(hello_file, "w") as fh:
+        fh.write("Hello World!")
+
+    fs = filesystem.filesystem(buffer_size=4)
+    info = fs.get_file_info([hello_file, os.path.join(tmpdir, "missing.txt")])
+    assert info[0].type == pafs.FileType.File
+    assert info[0].size == 12
+    assert info[1].type == pafs.FileType.NotFound
+
+    with fs.open_input_stream(hello_file) as f:
+        assert f.read() == b"Hello World!"
+    with fs.open_input_file(hello_file) as f:
+        assert f.size() == 12
+        f.seek(6)
+        assert f.read(5) == b"World"
+        assert f.read_at(5, 0) == b"Hello"
+
+    assert [bytes(contents) for contents in filesystem.read_ranges(hello_file, [(0, 5), (6, 5), (11, 10)])] == [
+        b"Hello",
+        b"World",
+        b"!",
+    ]
+    with filesystem.open_file(hello_file) as f:
+        f.seek(-6, os.SEEK_END)
+        assert f.read() == b"World!"
+
+    with pytest.raises(NotImplementedError):
+        fs.open_output_stream(os.path.join(tmpdir, "out.txt"))
+
+
+def test_filesystem_parquet(tmpdir):
+    parquet_file = os.path.join(tmpdir, "calls.parquet")
+    table = pa.table({"POS": [1, 2, 3], "REF": ["A", "C", "G"]})
+    pq.write_table(table, parquet_file)
+    assert pq.read_table(parquet_file, filesystem=filesystem.filesystem()).equals(table)
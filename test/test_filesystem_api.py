@@ -1,5 +1,7 @@
 import os
 
+import pytest
+
 import genomicsdb
 
 
@@ -27,3 +29,35 @@ def test_filesystem_api(tmpdir):
     assert not genomicsdb.array_exists("non-existent-ws", "non-existent-array")
     assert not genomicsdb.array_exists("az://non-existent-container/ws", "non-existent-array")
     assert not genomicsdb.array_exists("az://non-existent-container@non-existent-account.blob/ws", "non-existent-array")
+
+
+def test_batched_filesystem_api(tmpdir):
+    hello_file = os.path.join(tmpdir, "hello.txt")
+    with open(hello_file, "w") as fh:
+        fh.write("Hello World!")
+    missing_file = os.path.join(tmpdir, "missing.txt")
+
+    assert genomicsdb.is_files([hello_file, missing_file, hello_file]) == [True, False, True]
+    assert genomicsdb.is_files([]) == []
+    assert genomicsdb.file_sizes([hello_file, missing_file], max_workers=1) == [12, -1]
+    assert genomicsdb.read_entire_files([hello_file, missing_file]) == ["Hello World!", None]
+    assert genomicsdb.read_entire_files([hello_file], decode=False) == [b"Hello World!"]
+    assert genomicsdb.read_entire_file(hello_file, decode=False) == b"Hello World!"
+
+    assert genomicsdb.workspaces_exist(["non-existent-ws", "non-existent-ws-1"]) == [False, False]
+    assert genomicsdb.arrays_exist("non-existent-ws", ["array-1", "array-2"]) == [False, False]
+
+
+def test_read_range(tmpdir):
+    hello_file = os.path.join(tmpdir, "hello.txt")
+    with open(hello_file, "w") as fh:
+        fh.write("Hello World!")
+
+    assert bytes(genomicsdb.read_range(hello_file, 6, 5)) == b"World"
+    assert bytes(genomicsdb.read_range(hello_file, 6)) == b"World!"
+    assert bytes(genomicsdb.read_range("file://" + hello_file, 0, 5)) == b"Hello"
+    assert bytes(genomicsdb.read_range(hello_file, 10, 100)) == b"d!"
+    assert bytes(genomicsdb.read_range(hello_file, 100, 5)) == b""
+    assert genomicsdb.read_range(os.path.join(tmpdir, "missing.txt"), 0, 5) is None
+    with pytest.raises(ValueError):
+        genomicsdb.read_range(hello_file, -1, 5)
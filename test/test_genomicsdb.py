@@ -1,8 +1,7 @@
+import gzip
 import os
-import shutil
+import subprocess
 import sys
-import tarfile
-import tempfile
 
 import pyarrow as pa
 import pytest
@@ -12,21 +11,6 @@ from genomicsdb.protobuf import genomicsdb_coordinates_pb2 as query_coords
 from genomicsdb.protobuf import genomicsdb_export_config_pb2 as query_pb
 
 
-@pytest.fixture()
-def setup():
-    tmp_dir = tempfile.TemporaryDirectory().name
-    print("tmp_dir")
-    if not os.path.exists(tmp_dir):
-        os.makedirs(tmp_dir)
-    else:
-        sys.exit("Aborting as temporary directory seems to exist!")
-    tar = tarfile.open("test/inputs/sanity.test.tgz")
-    tar.extractall(tmp_dir)
-    os.chdir(tmp_dir)
-    yield
-    shutil.rmtree(tmp_dir)
-
-
 def test_version():
     version = genomicsdb.version()
     assert len(version) > 0
@@ -37,6 +21,14 @@ def test_version():
     assert int(version_components[1]) >= 0
 
 
+def test_lazy_imports():
+    # numpy, pandas and pyarrow should only be imported by the query paths that need them
+    check = "import sys, genomicsdb; sys.exit(len({'numpy', 'pandas', 'pyarrow'} & set(sys.modules)))"
+    assert subprocess.run([sys.executable, "-c", check]).returncode == 0
+    check = "import sys, genomicsdb.scripts.genomicsdb_query; sys.exit(len({'pandas', 'pyarrow'} & set(sys.modules)))"
+    assert subprocess.run([sys.executable, "-c", check]).returncode == 0
+
+
 def test_connect_and_query_with_protobuf(setup):
     export_config = query_pb.ExportConfiguration()
     export_config.workspace = "ws"
@@ -178,3 +170,398 @@ def test_connect_and_query_with_protobuf(setup):
     query_config = query_pb.QueryConfiguration()
     with pytest.raises(Exception):
         gdb.query_variant_calls(query_protobuf=query_config, array="t0_1_2", column_ranges=[], row_ranges=[])
+
+
+def test_query_with_attributes(setup):
+    export_config = query_pb.ExportConfiguration()
+    export_config.workspace = "ws"
+    export_config.segment_size = 40
+    export_config.callset_mapping_file = "callset_t0_1_2.json"
+    export_config.vid_mapping_file = "vid.json"
+    export_config.attributes.extend(["GT", "DP"])
+    gdb = genomicsdb.connect_with_protobuf(export_config)
+
+    list = gdb.query_variant_calls(array="t0_1_2", row_ranges=[(0, 3)])
+    x, y, calls = zip(*list)
+    assert "DP" in calls[0][0]
+
+    # attributes are projected for the query only
+    list = gdb.query_variant_calls(array="t0_1_2", row_ranges=[(0, 3)], attributes=["GT"])
+    x, y, calls = zip(*list)
+    assert len(calls[0]) == 5
+    assert "GT" in calls[0][0]
+    assert "DP" not in calls[0][0]
+
+    df = gdb.query_variant_calls(flatten_intervals=True, attributes=["DP"])
+    assert len(df) == 5
+    assert "DP" in df.columns
+    assert "GT" not in df.columns
+
+    query_config = query_pb.QueryConfiguration()
+    df = gdb.query_variant_calls(query_protobuf=query_config, flatten_intervals=True, attributes=["GT"])
+    assert len(df) == 5
+    assert "DP" not in df.columns
+
+    # the connection's attributes are still in effect for subsequent queries
+    df = gdb.query_variant_calls(query_protobuf=query_config, flatten_intervals=True)
+    assert "GT" in df.columns
+    assert "DP" in df.columns
+
+
+def test_query_stats(setup):
+    gdb = genomicsdb.connect("ws", "callset_t0_1_2.json", "vid.json", ["GT", "DP"])
+    assert gdb.last_query_stats is None
+
+    gdb.query_variant_calls(array="t0_1_2", row_ranges=[(0, 3)])
+    stats = gdb.last_query_stats
+    assert stats.query_type == "by_interval"
+    assert stats.num_calls == 5
+    assert stats.num_intervals == 1
+    assert stats.timings["query"] >= stats.timings["processor"]
+
+    gdb.query_variant_calls(array="t0_1_2", row_ranges=[(0, 3)], flatten_intervals=True)
+    stats = gdb.last_query_stats
+    assert stats.query_type == "columnar"
+    assert stats.num_calls == 5
+    assert stats.bytes_produced > 0
+    assert "construct" in stats.timings
+
+    from genomicsdb import json_output_mode
+
+    output = gdb.query_variant_calls(array="t0_1_2", json_output=json_output_mode.NUM_CALLS)
+    assert gdb.last_query_stats.query_type == "json"
+    assert gdb.last_query_stats.bytes_produced == len(output)
+
+    for output in gdb.query_variant_calls(row_ranges=[(0, 3)], array="t0_1_2", arrow_output=True, batching=True):
+        pass
+    stats = gdb.last_query_stats
+    assert stats.query_type == "arrow"
+    assert stats.num_calls == 5
+    assert stats.num_batches > 0
+    assert stats.peak_buffered_bytes > 0
+    assert "ipc_serialization" in stats.timings
+    assert stats.as_dict()["num_calls"] == 5
+
+
+def test_query_variant_calls_arrow_batches(setup):
+    gdb = genomicsdb.connect("ws", "callset_t0_1_2.json", "vid.json", ["GT", "DP"])
+
+    def batches(**kwargs):
+        outputs = gdb.query_variant_calls(row_ranges=[(0, 3)], array="t0_1_2", arrow_output=True, **kwargs)
+        return [batch for output in outputs for batch in pa.ipc.open_stream(output)]
+
+    expected = pa.Table.from_batches(batches(batching=True))
+    for kwargs in [{"batch_rows": 2}, {"batch_rows": 100}, {"batch_bytes": 1}, {"max_inflight_batches": 1}]:
+        for batching in [False, True]:
+            results = batches(batching=batching, **kwargs)
+            assert pa.Table.from_batches(results).equals(expected)
+            assert gdb.last_query_stats.num_batches == len(results)
+            if "batch_rows" in kwargs:
+                assert [batch.num_rows for batch in results[:-1]] == [kwargs["batch_rows"]] * (len(results) - 1)
+                assert 0 < results[-1].num_rows <= kwargs["batch_rows"]
+            elif "batch_bytes" in kwargs:
+                assert all(batch.num_rows == 1 for batch in results)
+
+    results = batches(batching=True, batch_rows=2, max_inflight_batches=1, compress="lz4")
+    assert pa.Table.from_batches(results).equals(expected)
+
+    # The query runs to completion when the consumer stops early
+    outputs = gdb.query_variant_calls(
+        row_ranges=[(0, 3)], array="t0_1_2", arrow_output=True, batching=True, batch_rows=1, max_inflight_batches=1
+    )
+    next(outputs)
+    outputs.close()
+    assert pa.Table.from_batches(batches(batching=True)).equals(expected)
+
+    with pytest.raises(genomicsdb.GenomicsDBException):
+        batches(batch_rows=0)
+
+
+def test_arrow_type_from_format():
+    assert genomicsdb.c_arrow_type_from_format(b"u") == pa.string()
+    assert genomicsdb.c_arrow_type_from_format("U") == pa.large_string()
+    assert genomicsdb.c_arrow_type_from_format("L") == pa.uint64()
+    assert genomicsdb.c_arrow_type_from_format("d:10,2") == pa.decimal128(10, 2)
+    assert genomicsdb.c_arrow_type_from_format("tss:UTC") == pa.timestamp("s", tz="UTC")
+    item = pa.field("item", pa.int32())
+    assert genomicsdb.c_arrow_type_from_format("+l", [item]) == pa.list_(item)
+    assert genomicsdb.c_arrow_type_from_format("+L", [item]) == pa.large_list(item)
+    assert genomicsdb.c_arrow_type_from_format("+w:2", [item]) == pa.list_(item, 2)
+    fields = [pa.field("PL", pa.list_(pa.int32())), pa.field("GT", pa.string())]
+    assert genomicsdb.c_arrow_type_from_format("+s", fields) == pa.struct(fields)
+    assert genomicsdb.c_arrow_type_from_format("i", dictionary=pa.string()) == pa.dictionary(pa.int32(), pa.string())
+    with pytest.raises(genomicsdb.GenomicsDBException):
+        genomicsdb.c_arrow_type_from_format("?")
+
+
+def test_hooks(setup):
+    events = []
+
+    def hook(event, **info):
+        events.append((event, info))
+
+    for event in genomicsdb.hook_event:
+        genomicsdb.register_hook(event, hook)
+    assert genomicsdb.has_hooks()
+    try:
+        gdb = genomicsdb.connect("ws", "callset_t0_1_2.json", "vid.json", ["GT", "DP"])
+        assert events[0][0] == genomicsdb.hook_event.CONNECT
+        assert events[0][1]["instance"] is gdb
+        assert events[0][1]["duration"] >= 0
+
+        events.clear()
+        gdb.query_variant_calls(array="t0_1_2", row_ranges=[(0, 3)])
+        assert events[0][0] == genomicsdb.hook_event.QUERY_START
+        assert events[-1][0] == genomicsdb.hook_event.QUERY_END
+        assert events[-1][1]["stats"] is gdb.last_query_stats
+        intervals = [info for event, info in events if event == genomicsdb.hook_event.INTERVAL]
+        assert len(intervals) == gdb.last_query_stats.num_intervals
+        assert intervals[0]["query_type"] == "by_interval"
+
+        events.clear()
+        gdb.query_variant_calls(array="t0_1_2", row_ranges=[(0, 3)], flatten_intervals=True)
+        assert any(event == genomicsdb.hook_event.INTERVAL for event, _ in events)
+
+        events.clear()
+        for _ in gdb.query_variant_calls(row_ranges=[(0, 3)], array="t0_1_2", arrow_output=True, batching=True):
+            pass
+        batches = [info for event, info in events if event == genomicsdb.hook_event.BATCH]
+        assert len(batches) == gdb.last_query_stats.num_batches
+        assert sum(info["num_rows"] for info in batches) == 5
+
+        # Exceptions from hooks do not interrupt queries
+        def bad_hook(event, **info):
+            raise RuntimeError("bad hook")
+
+        genomicsdb.register_hook(genomicsdb.hook_event.QUERY_START, bad_hook)
+        with pytest.warns(RuntimeWarning):
+            gdb.query_variant_calls(array="t0_1_2", json_output=genomicsdb.json_output_mode.NUM_CALLS)
+        genomicsdb.unregister_hook(genomicsdb.hook_event.QUERY_START, bad_hook)
+
+        with pytest.raises(genomicsdb.GenomicsDBException):
+            genomicsdb.register_hook("QUERY_START", hook)
+    finally:
+        genomicsdb.clear_hooks()
+    assert not genomicsdb.has_hooks()
+
+    events.clear()
+    gdb.query_variant_calls(array="t0_1_2", row_ranges=[(0, 3)])
+    assert not events
+
+
+def test_query_with_memory_limit(setup, tmpdir):
+    gdb = genomicsdb.connect("ws", "callset_t0_1_2.json", "vid.json", ["GT", "DP"])
+
+    # Memory limit not exceeded
+    df = gdb.query_variant_calls(array="t0_1_2", flatten_intervals=True, memory_limit=1024 * 1024 * 1024)
+    assert len(df) == 5
+    list = gdb.query_variant_calls(array="t0_1_2", memory_limit=1024 * 1024 * 1024)
+    assert len(list) == 1
+
+    # Every call spilled
+    table = gdb.query_variant_calls(array="t0_1_2", flatten_intervals=True, memory_limit=1, spill_dir=str(tmpdir))
+    assert isinstance(table, pa.Table)
+    assert table.num_rows == 5
+    assert table.column_names == df.columns.tolist()
+    assert table.column("Sample").to_pylist() == df["Sample"].tolist()
+    assert table.column("POS").to_pylist() == df["POS"].tolist()
+    assert gdb.last_query_stats.num_calls == 5
+    # Spill files are removed once memory mapped
+    assert len(os.listdir(tmpdir)) == 0
+
+    intervals = gdb.query_variant_calls(array="t0_1_2", row_ranges=[(0, 3)], memory_limit=1, spill_dir=str(tmpdir))
+    expected = gdb.query_variant_calls(array="t0_1_2", row_ranges=[(0, 3)])
+    assert len(intervals) == len(expected)
+    assert intervals[0] == expected[0]
+    assert intervals[-1] == expected[-1]
+    assert [interval for interval in intervals] == expected
+    assert len(os.listdir(tmpdir)) == 0
+
+
+def test_query_with_encoded_gt(setup):
+    gdb = genomicsdb.connect("ws", "callset_t0_1_2.json", "vid.json", ["GT", "DP"])
+    df = gdb.query_variant_calls(array="t0_1_2", flatten_intervals=True)
+    encoded = gdb.query_variant_calls(array="t0_1_2", flatten_intervals=True, encode_gt=True)
+    assert len(encoded) == len(df)
+    assert "GT" not in encoded.columns
+    assert "GT_PHASED" in encoded.columns
+    gt_columns = [column for column in encoded.columns if column.startswith("GT_") and column != "GT_PHASED"]
+    assert gt_columns == [f"GT_{i}" for i in range(len(gt_columns))]
+    alleles = encoded[gt_columns].to_numpy()
+    assert alleles.dtype.name == "int16"
+    assert (alleles >= -2).all()
+    assert encoded["GT_PHASED"].dtype == bool
+    # The other columns are unchanged
+    assert encoded["REF"].tolist() == df["REF"].tolist()
+    assert encoded["ALT"].tolist() == df["ALT"].tolist()
+    assert encoded["DP"].tolist() == df["DP"].tolist()
+
+    # Separator and ploidy from the encoded genotypes match the resolved GT strings
+    for gt, phased, row in zip(df["GT"], encoded["GT_PHASED"], alleles):
+        if gt:
+            assert ("|" in gt) == phased
+            assert len(gt.replace("|", "/").split("/")) == (row != -2).sum()
+
+    table = gdb.query_variant_calls(array="t0_1_2", flatten_intervals=True, encode_gt=True, memory_limit=1)
+    assert table.column("GT_0").to_pylist() == encoded["GT_0"].tolist()
+
+    # Encoded genotypes of a higher ploidy in a later spill are padded in the earlier ones as in memory
+    spills = [pa.table({"GT_0": [0], "GT_1": [1]}), pa.table({"GT_0": [1], "GT_1": [1], "GT_2": [0]})]
+    table = genomicsdb.genomicsdb._concat_spilled_columns(spills)
+    assert table.column("GT_2").to_pylist() == [-2, 0]
+
+
+def test_query_with_normalized_sites(setup):
+    gdb = genomicsdb.connect("ws", "callset_t0_1_2.json", "vid.json", ["GT", "DP"])
+    df = gdb.query_variant_calls(array="t0_1_2", flatten_intervals=True)
+    normalized = gdb.query_variant_calls(array="t0_1_2", flatten_intervals=True, normalize_sites=True)
+    assert isinstance(normalized, genomicsdb.NormalizedVariantCalls)
+    assert normalized.sites.columns.tolist() == ["CHR", "POS", "END", "REF", "ALT"]
+    assert len(normalized.sites) <= len(df)
+    assert len(normalized.sites) == len(df.drop_duplicates(["CHR", "POS", "REF", "ALT"]))
+    assert normalized.calls.columns.tolist()[:2] == ["Sample", "SITE"]
+    assert "REF" not in normalized.calls.columns
+    assert len(normalized.calls) == len(df)
+
+    wide = normalized.wide()
+    assert wide.drop(columns="END").columns.tolist() == df.columns.tolist()
+    for column in df.columns:
+        assert wide[column].tolist() == df[column].tolist()
+
+    spilled = gdb.query_variant_calls(array="t0_1_2", flatten_intervals=True, normalize_sites=True, memory_limit=1)
+    assert spilled.calls.num_rows == len(df)
+    assert spilled.wide()["ALT"].tolist() == df["ALT"].tolist()
+
+
+def test_query_variant_calls_wide(setup):
+    gdb = genomicsdb.connect("ws", "callset_t0_1_2.json", "vid.json", ["GT", "DP"])
+    df = gdb.query_variant_calls(array="t0_1_2", flatten_intervals=True)
+    table = gdb.query_variant_calls_wide(array="t0_1_2", row_ranges=[(2, 2), (0, 1)], fields=["GT", "DP"])
+    assert gdb.last_query_stats.query_type == "wide"
+    assert gdb.last_query_stats.num_calls == len(df)
+    samples = ["HG01530", "HG00141", "HG01958"]
+    assert table.column_names == ["CHR", "POS", "END", "REF", "ALT"] + [
+        f"{field}:{sample}" for field in ["GT", "DP"] for sample in samples
+    ]
+    assert table.num_rows == len(df.drop_duplicates(["CHR", "POS", "REF", "ALT"]))
+    assert table.column("POS").to_pylist() == [12141, 12145, 17385, 17385]
+    assert table.column("GT:HG00141").to_pylist() == ["C/C", None, "G/A", None]
+    assert table.column("GT:HG01958").to_pylist() == [None, "C/C", None, "T/T"]
+    assert table.column("GT:HG01530").to_pylist() == [None, None, "G/A", None]
+    assert table.column("DP:HG01958").to_pylist() == [None, None, None, 120]
+
+    # The table outlives the buffers of the processor it was constructed from
+    allocations = [bytearray(b"\xff" * 1024 * 1024) for _ in range(64)]
+    allocations += [gdb.query_variant_calls_wide(array="t0_1_2", fields=["DP"]) for _ in range(8)]
+    assert table.column("POS").to_pylist() == [12141, 12145, 17385, 17385]
+    assert table.column("END").to_pylist() == [12295, 12277, 17385, 17385]
+    assert table.column("DP:HG01958").to_pylist() == [None, None, None, 120]
+    del allocations
+
+    wide = gdb.query_variant_calls_wide(array="t0_1_2", output="numpy")
+    assert isinstance(wide, genomicsdb.WideVariantCalls)
+    assert wide.samples == ["HG00141", "HG01958", "HG01530"]
+    assert wide.sites["POS"].tolist() == table.column("POS").to_pylist()
+    assert list(wide.fields) == ["GT"]
+    assert wide.fields["GT"].dtype.names == tuple(wide.samples)
+    assert wide.fields["GT"]["HG01958"].tolist() == table.column("GT:HG01958").to_pylist()
+
+    with pytest.raises(genomicsdb.GenomicsDBException):
+        gdb.query_variant_calls_wide(array="t0_1_2", output="pandas")
+    with pytest.raises(Exception):
+        gdb.query_variant_calls_wide(array="t0_1_2", fields=["PL"])
+
+    # Multi-valued fields are rejected instead of keeping only their first values
+    gdb = genomicsdb.connect("ws", "callset_t0_1_2.json", "vid.json", ["GT", "DP", "AD", "PL"])
+    for field in ["AD", "PL"]:
+        with pytest.raises(Exception):
+            gdb.query_variant_calls_wide(array="t0_1_2", fields=["DP", field])
+    table = gdb.query_variant_calls_wide(array="t0_1_2", fields=["DP"])
+    assert table.column("DP:HG01958").to_pylist() == [None, None, None, 120]
+
+
+def test_query_variants(setup):
+    gdb = genomicsdb.connect("ws", "callset_t0_1_2.json", "vid.json", ["GT", "DP"])
+    df = gdb.query_variant_calls(array="t0_1_2", flatten_intervals=True)
+    variants = gdb.query_variants(array="t0_1_2")
+    assert isinstance(variants, genomicsdb.VariantSites)
+    assert variants.sites.columns.tolist()[:6] == ["CHR", "POS", "END", "REF", "ALT", "NUM_CALLS"]
+    assert len(variants) == len(variants.sites)
+    assert 0 < len(variants) <= len(df)
+    assert variants.sites["NUM_CALLS"].sum() == len(df)
+    assert gdb.last_query_stats.query_type == "variants"
+    assert gdb.last_query_stats.num_calls == len(df)
+
+    calls = variants.calls(0)
+    assert len(calls) == variants.sites["NUM_CALLS"][0]
+    assert "GT" in calls[0]
+    assert "ROW" in calls[0]
+    assert len(variants.calls(-1)) == variants.sites["NUM_CALLS"].iloc[-1]
+    with pytest.raises(IndexError):
+        variants.calls(len(variants))
+
+    table = gdb.query_variants(array="t0_1_2", arrow_output=True).sites
+    assert table.num_rows == len(variants)
+    assert table.column("POS").to_pylist() == variants.sites["POS"].tolist()
+
+
+def test_query_variant_calls_cursor(setup):
+    gdb = genomicsdb.connect("ws", "callset_t0_1_2.json", "vid.json", ["GT", "DP"])
+    df = gdb.query_variant_calls(array="t0_1_2", flatten_intervals=True)
+    with gdb.query_variant_calls_cursor(array="t0_1_2") as cursor:
+        assert isinstance(cursor, genomicsdb.VariantCallCursor)
+        assert len(cursor) == len(df)
+        assert gdb.last_query_stats.query_type == "cursor"
+        assert gdb.last_query_stats.num_calls == len(df)
+
+        call = cursor[0]
+        assert call["POS"] == df["POS"][0]
+        assert "GT" in call
+        assert cursor[-1]["POS"] == df["POS"].iloc[-1]
+        with pytest.raises(IndexError):
+            cursor[len(cursor)]
+
+        block = cursor[1:3]
+        assert block["POS"].tolist() == df["POS"][1:3].tolist()
+        assert len(block["GT"]) == 2
+        with pytest.raises(ValueError):
+            cursor[::2]
+
+        block = cursor.fetch(0, len(cursor), fields=["DP"])
+        assert list(block.keys()) == ["ROW", "CHR", "POS", "END", "DP"]
+        assert len(block["DP"]) == len(df)
+    assert len(cursor) == 0
+
+
+def test_to_vcf_stream(setup):
+    gdb = genomicsdb.connect("ws", "callset_t0_1_2.json", "vid.json", ["GT", "DP"])
+    vcf_args = ("t0_1_2", [(0, 15000)], [(0, 3)], "chr1_10MB.fasta.gz", "template_vcf_header.vcf")
+    gdb.to_vcf(*vcf_args, output="out.vcf", overwrite=True)
+    with open("out.vcf", "rb") as f:
+        records = [line for line in f.read().splitlines() if not line.startswith(b"#")]
+    assert len(records) > 0
+
+    chunks = list(gdb.to_vcf_stream(*vcf_args, chunk_size=128))
+    assert all(len(chunk) <= 128 for chunk in chunks)
+    vcf = b"".join(chunks)
+    assert vcf.startswith(b"##fileformat=VCF")
+    assert [line for line in vcf.splitlines() if not line.startswith(b"#")] == records
+
+    bgzipped = b"".join(gdb.to_vcf_stream(*vcf_args, output_format="z"))
+    assert [line for line in gzip.decompress(bgzipped).splitlines() if not line.startswith(b"#")] == records
+
+    # Abandoning the stream early stops the export
+    stream = gdb.to_vcf_stream(*vcf_args, chunk_size=16)
+    assert len(next(stream)) > 0
+    stream.close()
+
+
+def test_prefetch_arrays(setup):
+    gdb = genomicsdb.connect("ws", "callset_t0_1_2.json", "vid.json", ["GT"])
+    arrays = ["t0_1_2", "t0_1_2"]
+    for array in genomicsdb.prefetch_arrays("ws", arrays, depth=2):
+        assert len(gdb.query_variant_calls(array=array)) > 0
+    with genomicsdb.ArrayPrefetcher("ws") as prefetcher:
+        prefetcher.prefetch(arrays)
+        assert isinstance(prefetcher.wait("t0_1_2"), bool)
+        assert not prefetcher.wait("non_existent_array")
@@ -0,0 +1,135 @@
+import os
+import shutil
+
+import pytest
+
+import genomicsdb
+from genomicsdb.scripts import genomicsdb_query
+
+
+def cloud_configs(arrays):
+    export_config = genomicsdb_query.GenomicsDBExportConfig(
+        "gs://bucket/ws", "gs://bucket/ws/vidmap.json", "gs://bucket/ws/callset.json", None, None, False
+    )
+    configs = []
+    for idx, array in enumerate(arrays):
+        interval = f"1:{idx * 1000 + 1}-{(idx + 1) * 1000}"
+        query_config = genomicsdb_query.GenomicsDBQueryConfig(
+            interval, "1", idx * 1000 + 1, (idx + 1) * 1000, array, None
+        )
+        output_config = genomicsdb_query.OutputConfig(f"out_{idx}.csv", "csv", None, -1)
+        configs.append(genomicsdb_query.Config(export_config, query_config, output_config))
+    return configs
+
+
+def test_pool_chunksize():
+    # Same chunks as multiprocessing.Pool.map() by default, i.e. about 4 per process
+    for num_configs, processes in [(1, 2), (8, 2), (10, 2), (64, 4), (65, 4), (1000, 8)]:
+        chunksize = genomicsdb_query.pool_chunksize(num_configs, processes)
+        assert chunksize == max(-(-num_configs // (processes * 4)), 1)
+    assert genomicsdb_query.pool_chunksize(10, 2) == 2
+    assert genomicsdb_query.pool_chunksize(64, 4) == 4
+    assert genomicsdb_query.pool_chunksize(65, 4) == 5
+
+
+def test_plan_prefetch():
+    arrays = ["1$1$100", "1$1$100", "1$101$200", "1$201$300", "1$201$300", "1$301$400", "1$401$500", "1$501$600"]
+    configs = cloud_configs(arrays)
+
+    planned = genomicsdb_query.plan_prefetch(configs, depth=2, chunksize=len(configs))
+    assert [config.prefetch_arrays for config in planned] == [
+        ("1$101$200", "1$201$300"),
+        ("1$101$200", "1$201$300"),
+        ("1$201$300", "1$301$400"),
+        ("1$301$400", "1$401$500"),
+        ("1$301$400", "1$401$500"),
+        ("1$401$500", "1$501$600"),
+        ("1$501$600",),
+        (),
+    ]
+    # Only the planned arrays change
+    assert [config._replace(prefetch_arrays=()) for config in planned] == configs
+    assert all(config.prefetch_arrays == () for config in configs)
+
+    # Prefetches do not cross into the chunks processed by other processes
+    planned = genomicsdb_query.plan_prefetch(configs, depth=2, chunksize=3)
+    assert [config.prefetch_arrays for config in planned] == [
+        ("1$101$200",),
+        ("1$101$200",),
+        (),
+        ("1$301$400",),
+        ("1$301$400",),
+        (),
+        ("1$501$600",),
+        (),
+    ]
+
+    # Bounded by the depth
+    for depth in range(1, 7):
+        planned = genomicsdb_query.plan_prefetch(configs, depth=depth, chunksize=len(configs))
+        assert all(len(config.prefetch_arrays) <= depth for config in planned)
+        assert len(planned[0].prefetch_arrays) == min(depth, 5)
+        assert planned[0].prefetch_arrays == tuple(
+            [array for array in dict.fromkeys(arrays) if array != arrays[0]][:depth]
+        )
+
+
+def test_save_plan(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    configs = cloud_configs(["1$1$100", "1$101$200"])
+    # Metadata of the cloud workspace cached locally
+    configs[1] = configs[1]._replace(
+        export_config=configs[1].export_config._replace(callset_file="callset.json", vidmap_file="vidmap.json")
+    )
+    genomicsdb_query.save_plan("plan.json", "out", "csv", configs, [1, 2])
+
+    monkeypatch.chdir(tmp_path.parent)
+    output, output_type, planned, costs = genomicsdb_query.load_plan(str(tmp_path / "plan.json"))
+    assert output == str(tmp_path / "out")
+    assert output_type == "csv"
+    assert costs == [1, 2]
+    assert planned[0].export_config == configs[0].export_config
+    assert planned[1].export_config.callset_file == str(tmp_path / "callset.json")
+    assert planned[1].export_config.vidmap_file == str(tmp_path / "vidmap.json")
+    assert [config.output_config.filename for config in planned] == [
+        str(tmp_path / "out_0.csv"),
+        str(tmp_path / "out_1.csv"),
+    ]
+    assert [config.query_config for config in planned] == [config.query_config for config in configs]
+
+
+def test_process_retries(setup):
+    export_config = genomicsdb_query.GenomicsDBExportConfig("ws", "vid.json", "callset_retry.json", ["GT"], None, False)
+    query_config = genomicsdb_query.GenomicsDBQueryConfig("1:1-20000", "1", 1, 20000, "t0_1_2", None)
+    output_config = genomicsdb_query.OutputConfig(os.path.abspath("out.csv"), "csv", None, -1)
+    config = genomicsdb_query.Config(export_config, query_config, output_config, retries=2, retry_backoff=0)
+
+    retries = []
+
+    def restore_callset(event, **info):
+        retries.append(info)
+        # The callset shows up before the first retry, e.g. written late to an eventually consistent store
+        shutil.copy("callset_t0_1_2.json", "callset_retry.json")
+
+    genomicsdb.register_hook(genomicsdb.hook_event.RETRY, restore_callset)
+    try:
+        # Fails to connect without the callset and succeeds when retried
+        assert genomicsdb_query.process(config) == 0
+        assert [(info["array"], info["interval"], info["attempt"]) for info in retries] == [("t0_1_2", "1:1-20000", 1)]
+        assert isinstance(retries[0]["exception"], genomicsdb.GenomicsDBException)
+        assert os.path.exists("out.csv")
+        assert os.path.exists(genomicsdb_query.done_marker(config))
+
+        # Gives up once the retries are exhausted
+        retries.clear()
+        config = config._replace(
+            export_config=export_config._replace(callset_file="callset_missing.json"),
+            output_config=output_config._replace(filename=os.path.abspath("failed.csv")),
+        )
+        with pytest.raises(genomicsdb.GenomicsDBException):
+            genomicsdb_query.process(config)
+        assert [info["attempt"] for info in retries] == [1, 2]
+        assert not os.path.exists(genomicsdb_query.done_marker(config))
+    finally:
+        genomicsdb.unregister_hook(genomicsdb.hook_event.RETRY, restore_callset)
+        genomicsdb_query.gdb_instances.clear()
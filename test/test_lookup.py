@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+import genomicsdb
+from genomicsdb import lookup
+
+
+def test_positions_to_columns():
+    contigs_map = {
+        "1": {"length": 100, "tiledb_column_offset": 0},
+        "2": {"length": 50, "tiledb_column_offset": 100},
+    }
+    columns = lookup.positions_to_columns(contigs_map, ["2", "1", "3", "1", "2", "2"], [1, 100, 5, 0, 50, 51])
+    assert columns.tolist() == [100, 99, -1, -1, 149, -1]
+    assert lookup.positions_to_columns(contigs_map, "2", [10, 20]).tolist() == [109, 119]
+    with pytest.raises(ValueError):
+        lookup.positions_to_columns(contigs_map, ["1"], [1, 2])
+
+
+def test_lookup_positions(setup):
+    gdb = genomicsdb.connect("ws", "callset_t0_1_2.json", "vid.json", ["GT"])
+    calls = gdb.query_variant_calls(
+        "t0_1_2", [(12140, 12140), (12144, 12144)], flatten_intervals=True, interval_columns=True
+    )
+    assert calls["COLUMN"].tolist() == [12140, 12144, 12144]
+
+    kwargs = {"callset_file": "callset_t0_1_2.json", "vidmap_file": "vid.json", "loader_file": "loader.json"}
+    contigs = ["1", "1", "2", "1", "X9", "1", "1"]
+    positions = [17385, 12141, 5, 12145, 3, 17385, 0]
+    result = lookup.lookup_positions("ws", contigs, positions, attributes=["GT", "DP"], **kwargs)
+    assert result.offsets.tolist() == [0, 3, 4, 4, 6, 6, 9, 9]
+    assert result.calls["LOOKUP"].tolist() == [0, 0, 0, 1, 3, 3, 5, 5, 5]
+    assert "COLUMN" not in result.calls.columns
+    for i, position in enumerate(positions):
+        calls = result.calls[result.offsets[i] : result.offsets[i + 1]]
+        assert (calls["POS"] <= position).all()
+    assert result.calls["Sample"][result.offsets[3] : result.offsets[4]].tolist() == ["HG00141", "HG01958"]
+
+    result = lookup.lookup_positions("ws", "1", np.array([12145, 17385]), row_ranges=[(1, 1)], **kwargs)
+    assert result.calls["Sample"].tolist() == ["HG01958", "HG01958"]
+    assert result.offsets.tolist() == [0, 1, 2]
+
+    result = lookup.lookup_positions("ws", "2", [1], **kwargs)
+    assert len(result.calls) == 0
+    assert result.offsets.tolist() == [0, 0]
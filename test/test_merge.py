@@ -0,0 +1,112 @@
+import csv
+import json
+
+import pytest
+
+from genomicsdb import json_output_mode, merge
+
+HEADER = ["Sample", "CHR", "POS", "REF", "GT"]
+
+
+def write_csv(path, rows):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerows(rows)
+    return str(path)
+
+
+def test_merge_csv(tmp_path):
+    inputs = [
+        write_csv(
+            tmp_path / "a.csv",
+            [["S2", "1", "10", "A", "0/1"], ["S1", "1", "10", "A", "1/1"], ["S1", "2", "5", "G", "0/1"]],
+        ),
+        write_csv(
+            tmp_path / "b.csv",
+            [["S3", "1", "9", "A", "0/1"], ["S0", "1", "10", "A", "1/1"], ["S3", "X", "2", "C", "0/1"]],
+        ),
+        write_csv(tmp_path / "c.csv", []),
+    ]
+    output = str(tmp_path / "merged.csv")
+    merge.merge_csv(inputs, output, contig_order=["1", "2", "X"])
+    with open(output, newline="") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == HEADER
+    assert [(row[1], row[2], row[0]) for row in rows[1:]] == [
+        ("1", "9", "S3"),
+        ("1", "10", "S0"),
+        ("1", "10", "S1"),
+        ("1", "10", "S2"),
+        ("2", "5", "S1"),
+        ("X", "2", "S3"),
+    ]
+
+    # Contigs are in natural order without contig_order
+    merge.merge_csv(inputs, output)
+    with open(output, newline="") as f:
+        assert [row[1] for row in list(csv.reader(f))[1:]] == ["1", "1", "1", "1", "2", "X"]
+
+    with open(tmp_path / "d.csv", "w") as f:
+        f.write("CHR,POS\n1,1\n")
+    with pytest.raises(ValueError):
+        merge.merge_csv(inputs + [str(tmp_path / "d.csv")], output)
+
+
+def test_merge_json(tmp_path):
+    def write_json(name, value):
+        with open(tmp_path / name, "w") as f:
+            json.dump(value, f)
+        return str(tmp_path / name)
+
+    output = str(tmp_path / "merged.json")
+    inputs = [write_json("a.json", ["HG3", "HG1"]), write_json("b.json", ["HG2", "HG1"])]
+    merge.merge_json(inputs, output, json_output_mode.SAMPLES)
+    with open(output) as f:
+        assert json.load(f) == ["HG1", "HG2", "HG3"]
+
+    inputs = [write_json("a.json", {"HG1": 2, "HG3": 1}), write_json("b.json", {"HG1": 1})]
+    merge.merge_json(inputs, output, json_output_mode.SAMPLES_WITH_NUM_CALLS)
+    with open(output) as f:
+        assert json.load(f) == {"HG1": 3, "HG3": 1}
+
+    # The per call lists are concatenated in order, duplicates included, so the fields stay aligned
+    inputs = [
+        write_json("a.json", {"CHR": ["1", "1"], "POS": [10, 20], "REF": ["A", "A"], "GT": ["0/1", "1/1"]}),
+        write_json("b.json", {"CHR": ["1"], "POS": [30], "REF": ["A"], "GT": ["0/1"]}),
+    ]
+    merge.merge_json(inputs, output, json_output_mode.ALL)
+    with open(output) as f:
+        merged = json.load(f)
+    assert {len(values) for values in merged.values()} == {3}
+    assert merged == {"CHR": ["1", "1", "1"], "POS": [10, 20, 30], "REF": ["A", "A", "A"], "GT": ["0/1", "1/1", "0/1"]}
+
+
+def test_merge_parquet(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    def write_parquet(name, samples, contigs, positions):
+        path = str(tmp_path / name)
+        pq.write_table(pa.table({"Sample": samples, "CHR": contigs, "POS": positions}), path)
+        return path
+
+    inputs = [
+        [
+            write_parquet("a__0.parquet", ["S2", "S1"], ["1", "1"], [10, 10]),
+            write_parquet("a__1.parquet", ["S1", "S1"], ["1", "2"], [10, 5]),
+        ],
+        write_parquet("b.parquet", ["S3", "S0", "S3"], ["1", "1", "X"], [9, 10, 2]),
+    ]
+    output = str(tmp_path / "merged.parquet")
+    merge.merge_parquet(inputs, output, contig_order=["1", "2", "X"], batch_size=1)
+    table = pq.read_table(output)
+    assert list(zip(table["CHR"].to_pylist(), table["POS"].to_pylist(), table["Sample"].to_pylist())) == [
+        ("1", 9, "S3"),
+        ("1", 10, "S0"),
+        ("1", 10, "S1"),
+        ("1", 10, "S1"),
+        ("1", 10, "S2"),
+        ("2", 5, "S1"),
+        ("X", 2, "S3"),
+    ]
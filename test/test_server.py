@@ -0,0 +1,86 @@
+import threading
+
+import pyarrow as pa
+import pytest
+
+flight = pytest.importorskip("pyarrow.flight")
+
+from genomicsdb import server  # noqa
+from genomicsdb.protobuf import genomicsdb_export_config_pb2 as query_pb  # noqa
+
+
+@pytest.fixture(params=[None, "zstd"])
+def flight_server(setup, request):
+    export_config = query_pb.ExportConfiguration()
+    export_config.workspace = "ws"
+    export_config.callset_mapping_file = "callset_t0_1_2.json"
+    export_config.vid_mapping_file = "vid.json"
+    export_config.attributes.extend(["GT", "DP"])
+    flight_server = server.GenomicsDBFlightServer(
+        export_config, "grpc://localhost:0", max_concurrent_queries=2, compress=request.param
+    )
+    thread = threading.Thread(target=flight_server.serve, daemon=True)
+    thread.start()
+    yield f"grpc://localhost:{flight_server.port}"
+    flight_server.shutdown()
+    thread.join()
+
+
+def test_flight_server(flight_server):
+    query_config = query_pb.QueryConfiguration()
+    query_config.array_name = "t0_1_2"
+    table = server.query(flight_server, query_config)
+    assert table.num_rows == 5
+    assert "GT" in table.column_names
+    assert "DP" in table.column_names
+
+    # Concurrent queries share the pooled connections
+    results = [None] * 4
+
+    def run_query(i):
+        results[i] = server.query(flight_server, query_config).num_rows
+
+    threads = [threading.Thread(target=run_query, args=(i,)) for i in range(len(results))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [5] * len(results)
+
+    with flight.connect(flight_server) as client:
+        with pytest.raises(flight.FlightServerError):
+            client.do_get(flight.Ticket(b"not a protobuf")).read_all()
+
+
+def test_flight_server_abandoned_stream():
+    # A stream abandoned midway, e.g. by a client disconnect, closes the query so its producer is stopped and joined
+    closed = threading.Event()
+
+    class CancelledContext:
+        def is_cancelled(self):
+            return True
+
+    class GenomicsDB:
+        def query_variant_calls(self, **kwargs):
+            try:
+                while True:
+                    yield pa.record_batch({"POS": [1, 2]})
+            finally:
+                closed.set()
+
+    flight_server = server.GenomicsDBFlightServer(query_pb.ExportConfiguration(), "grpc://localhost:0")
+    try:
+        for context in [None, CancelledContext()]:
+            closed.clear()
+            assert flight_server._slots.acquire(timeout=0)
+            batches = flight_server._stream_batches(GenomicsDB(), query_pb.QueryConfiguration(), context)
+            if context is None:
+                assert next(batches).num_rows == 2
+                batches.close()
+            else:
+                assert next(batches, None) is None
+            assert closed.is_set()
+        # The query slots were all released
+        assert flight_server._slots.acquire(timeout=0)
+    finally:
+        flight_server.shutdown()